@@ -34,7 +34,7 @@ def verify_user_permissions(fw_client, context, permitted_roles=["admin"]):
     Verify that the current user has permission in the project to run the gear.
 
     Args:
-        fw_client (flywheel.Client): Flywheel Client object
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
         context (gear_toolkit.GearToolkitContext): Context object to retrieve project
         permitted_roles (list, optional): Roles permitted to run this gear.
             Represented as a list of role names. Defaults to ["admin"].
@@ -44,9 +44,7 @@ def verify_user_permissions(fw_client, context, permitted_roles=["admin"]):
     """
     current_user = fw_client.get_current_user()
 
-    permitted = [
-        role.id for role in fw_client.get_all_roles() if role.label in permitted_roles
-    ]
+    permitted = fw_client.roles.role_ids(permitted_roles)
 
     destination_id = context.destination["id"]
     analysis = fw_client.get(destination_id)
@@ -0,0 +1,227 @@
+"""
+A write-behind buffer for the "Custom Information" (info) of Flywheel containers.
+
+Writes to the info of a container are staged in memory and merged with any other
+writes staged for the same container. Pending writes are sent to the instance when the
+buffer is flushed, each container receiving at most a single `update_info`. Writes that
+would not change the info of a container, as loaded from the instance, are skipped.
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+# Maximum number of concurrent update_info requests during a flush
+MAX_FLUSH_WORKERS = 4
+
+
+def canonical_hash(value):
+    """
+    Return a hash of the canonical JSON representation of a value.
+
+    Dictionaries are serialized with sorted keys, so that equal values produce the same
+    hash regardless of the order of their keys.
+
+    Args:
+        value (object): A JSON-serializable value (e.g. an info namespace)
+
+    Returns:
+        str: The hex digest of the canonical JSON representation of the value
+    """
+    canonical = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+class InfoWriteBuffer:
+    """
+    Collects `update_info` writes per container and flushes them in batches.
+
+    `update_info` replaces the top-level keys of a container's info. Merging the staged
+    writes of a container key-by-key, with the latest write to a key retained, results
+    in the same info on the instance as performing each of the writes in turn.
+
+    Staged writes are applied to the local container immediately. A container that is
+    retrieved again before the buffer is flushed must be passed to `apply_pending` to
+    reflect the pending writes.
+
+    A container passed to `track` when it is loaded has the hash of each of its info
+    namespaces recorded. On flush, the namespaces that hash the same as recorded are not
+    written, and a container with no changed namespaces is not written at all.
+
+    Args:
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        max_workers (int, optional): Maximum number of concurrent requests on flush.
+            Defaults to MAX_FLUSH_WORKERS.
+    """
+
+    def __init__(self, fw_client, max_workers=MAX_FLUSH_WORKERS):
+        self._fw_client = fw_client
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        # container id -> (container, merged info)
+        self._pending = {}
+        # container id -> {info namespace: canonical hash}
+        self._info_hashes = {}
+        self.staged_writes = 0
+        self.performed_writes = 0
+        self.failed_writes = 0
+        self.skipped_writes = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def track(self, container):
+        """
+        Record the hash of each info namespace of a container as loaded from the instance.
+
+        This must be called before the info of the container is modified in place.
+        Containers that are already tracked are not recorded again.
+
+        Args:
+            container (flywheel.container): A container loaded from the instance
+        """
+        hashes = {
+            key: canonical_hash(value) for key, value in (container.info or {}).items()
+        }
+        with self._lock:
+            self._info_hashes.setdefault(container.id, hashes)
+
+    def _changed_info(self, container_id, info):
+        """Return the namespaces of info that differ from the recorded hashes."""
+        with self._lock:
+            hashes = self._info_hashes.get(container_id)
+        if hashes is None:
+            return info
+        return {
+            key: value
+            for key, value in info.items()
+            if hashes.get(key) != canonical_hash(value)
+        }
+
+    def update_info(self, container, info):
+        """
+        Stage a write to the info of a container.
+
+        Args:
+            container (flywheel.container): The container to update
+            info (dict): The top-level info keys to set on the container
+        """
+        info = copy.deepcopy(info)
+        with self._lock:
+            self.staged_writes += 1
+            _, pending_info = self._pending.get(container.id, (None, {}))
+            pending_info.update(info)
+            # The most recent instance of the container performs the write
+            self._pending[container.id] = (container, pending_info)
+
+        if container.info is None:
+            container.info = {}
+        container.info.update(copy.deepcopy(info))
+
+    def apply_pending(self, container):
+        """
+        Apply the pending writes for a container to a newly retrieved copy of it.
+
+        Args:
+            container (flywheel.container): A container retrieved from the instance
+
+        Returns:
+            flywheel.container: The container with any pending writes applied
+        """
+        with self._lock:
+            pending = self._pending.get(container.id)
+        if pending:
+            if container.info is None:
+                container.info = {}
+            container.info.update(copy.deepcopy(pending[1]))
+        return container
+
+    def _write(self, container, info):
+        container.update_info(info)
+        self._fw_client.invalidate(container.id)
+        # The instance now holds the written values
+        hashes = {key: canonical_hash(value) for key, value in info.items()}
+        with self._lock:
+            if container.id in self._info_hashes:
+                self._info_hashes[container.id].update(hashes)
+
+    def flush(self):
+        """
+        Send all pending writes to the instance.
+
+        Each container with pending writes receives a single `update_info` containing
+        only the namespaces that changed. Requests are made concurrently by up to
+        `max_workers` threads. All writes are attempted; the first error encountered is
+        raised after the flush is complete.
+
+        Returns:
+            int: The number of writes performed
+        """
+        with self._lock:
+            staged = list(self._pending.values())
+            self._pending = {}
+
+        pending = []
+        for container, info in staged:
+            changed_info = self._changed_info(container.id, info)
+            if changed_info:
+                pending.append((container, changed_info))
+            else:
+                log.debug("Info of %s is unchanged. Skipping write.", container.id)
+        with self._lock:
+            self.skipped_writes += len(staged) - len(pending)
+
+        if not pending:
+            return 0
+
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [
+                (container, executor.submit(self._write, container, info))
+                for container, info in pending
+            ]
+            for container, future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    log.error("Could not update info of %s: %s", container.id, e)
+                    errors.append(e)
+
+        n_written = len(pending) - len(errors)
+        with self._lock:
+            self.performed_writes += n_written
+            self.failed_writes += len(errors)
+        log.debug("Flushed %i info writes.", n_written)
+
+        if errors:
+            raise errors[0]
+
+        return n_written
+
+    @property
+    def saved_writes(self):
+        """int: The number of writes avoided by merging staged writes."""
+        with self._lock:
+            n_pending = len(self._pending)
+        return (
+            self.staged_writes
+            - self.performed_writes
+            - self.failed_writes
+            - self.skipped_writes
+            - n_pending
+        )
+
+    def log_summary(self):
+        """Log the number of staged, performed, skipped, and saved writes."""
+        log.info(
+            "Info writes: %i staged, %i performed, %i skipped as unchanged, "
+            "%i saved by merging.",
+            self.staged_writes,
+            self.performed_writes,
+            self.skipped_writes,
+            self.saved_writes,
+        )
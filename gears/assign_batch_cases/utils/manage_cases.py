@@ -5,7 +5,9 @@ import pandas as pd
 
 import flywheel
 
-from .container_operations import export_session, find_or_create_group
+from .container_operations import export_session_to_projects, find_or_create_group
+from .info_buffer import InfoWriteBuffer
+from .session_loader import iter_project_sessions
 
 log = logging.getLogger(__name__)
 
@@ -138,7 +140,7 @@ def set_session_features(session, case_coverage):
     return session_features
 
 
-def find_readers_in_project_by_permission(project, reader_roles = None):
+def find_readers_in_project_by_permission(project, reader_roles):
     """ finds a user with a specific set of permissions on a flywheel project
 
     Given a project, this function looks for a user with the roles/permissions
@@ -146,19 +148,13 @@ def find_readers_in_project_by_permission(project, reader_roles = None):
 
     Args:
         project (flywheel.Project): a flywheel project to look for user roles on
+        reader_roles (set): the ids of the roles a reader can have (see
+            `RoleRegistry.reader_role_ids`)
 
     Returns:
         reader_ids (list): a list of
     """
 
-    if not reader_roles:
-
-        reader_roles = [
-            role.id
-            for role in fw_client.get_all_roles()
-            if role.label in ["read-write", "read-only"]
-        ]
-
     reader_ids = []
     for perm in project.permissions:
         log.debug(f"Found permission: {perm}")
@@ -170,7 +166,7 @@ def find_readers_in_project_by_permission(project, reader_roles = None):
     return reader_ids
 
 
-def find_and_add_readers_by_perm(project, reader_roles=None):
+def find_and_add_readers_by_perm(project, reader_roles):
     """ Finds a user with the correct flywheel roles/permissions on a given
 
     project, and adds that user ID to the projects metadata:
@@ -204,7 +200,7 @@ def find_and_add_readers_by_perm(project, reader_roles=None):
     return pf_reader
 
 
-def find_readers_in_projects(projects, reader_roles = None):
+def find_readers_in_projects(projects, reader_roles):
     """ Finds the reader ids on a set of projects
 
     Kind of an "interem" function...the old way of doing things was to always
@@ -255,54 +251,6 @@ def find_readers_in_projects(projects, reader_roles = None):
     return reader_ids
 
 
-def find_reader_project_from_id(projects, reader_id, reader_roles = None):
-    """ finds a reader's project given a reader ID.
-
-    Given a flywheel user id, find the project that they are a reader on.
-
-    This has legacy functionality.  Ideally reader projects have the reader id
-    stored in the metadata key:
-
-    `project.info.project_features.reader.id`
-
-    But if that's not there, we have to use the legacy method of finding the project,
-    based on role.  If we find it that way, populate the
-    `project.info.project_features.reader.id` metadata key
-
-    Args:
-        projects (list): a list of flywheel projects to search through for the reader
-        reader_id (string): the email of the reader to locate
-        reader_roles (list): a list of flywheel roles that are intended for readers,
-            usually read/write and read only
-
-    Returns:
-        reader_project (flywheel.Project): the project that the reader specified in
-            `reader_id` is assigned to
-
-    """
-
-    reader_project = []
-
-    for proj in projects:
-        proj_readers = find_readers_in_projects(proj, reader_roles)
-        if reader_id in proj_readers:
-            reader_project.append(proj)
-
-    if len(reader_project) > 1:
-        log.warning(f"WARNING {len(reader_project)} projects found for reader {reader_id}:")
-        log.warning([p.label for p in reader_project])
-        log.warning(f"Returning first project")
-
-    if len(reader_project) == 0:
-        log.warning(f"No projects found for reader {reader_id}")
-        reader_project = [None]
-
-    reader_project = reader_project[0]
-
-    return reader_project
-
-
-
 def set_project_session_attributes(session_features):
     """
     Return session attributes generated by assigning sessions to reader projects
@@ -351,50 +299,32 @@ def check_valid_reader(fw_client, reader_id, group_id):
     """
     Checks if a reader has a project created for them and returns it.
 
-    This is a very inefficient process since it calls all the projects in the reader group
-    every time.
-
-    TODO: revamp this gear to store all valid reader projects ahead of time and pass it in here
-    It could be something like:
-
-
-    .. code-block:: python
-
-        group_projects = list(fw_client.projects.iter_find(f"group={reader_group.id},label=~Reader [0-9][0-9]?[0-9]?", limit = 50))
-        group_projects = [p.reload() for p in group_projects]
-        matching_id = [p for p in group_projects if p.info.project_features.reader.id == reader_id]
-
-
+    The reader projects of the group are indexed once per run (see `ReaderIndex`), each
+    subsequent check is a lookup in that index.
 
     Args:
-        fw_client (flywheel.Client): Flywheel instance client for api calls.
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
         reader_id (str): The email of the reader to validate
         group_id (str): The id of the reader group
-        reader_project_id (str): Passes the reader's project id back if found.
-    Raises:
-        InvalidReaderError: If a project is not found assigned to reader, raised to exit
 
     Returns:
-        str: Returns reader's project id on success, `None` on failure
+        flywheel.Project: Returns reader's project on success, `None` on failure
     """
 
-    # first get all the projects in the reader group
     log.info(f"checking for reader {reader_id} in group {group_id}")
-    group_projects = list(fw_client.projects.iter_find(f"group={group_id},label=~Reader [0-9][0-9]?[0-9]?", limit=50))
-
-    valid_reader_ids = find_readers_in_projects(group_projects)
+    reader_index = fw_client.reader_index(group_id)
 
     log.debug('Valid reader ids')
-    log.debug(valid_reader_ids)
+    log.debug(reader_index.reader_ids)
 
     reader_project = None
 
-    if reader_id in valid_reader_ids:
+    if reader_id in reader_index:
         log.debug('ID found in valid readers')
-        reader_project = find_reader_project_from_id(group_projects, reader_id)
-        #if reader_id in [perm.id for perm in proj.permissions if set(perm.role_ids).intersection(proj_roles)]][0]
-
-    log.debug(f"Found Reader Project {reader_project.label} matching reader id {reader_id}")
+        reader_project = reader_index.get_project(reader_id)
+        log.debug(
+            f"Found Reader Project {reader_project.label} matching reader id {reader_id}"
+        )
 
     return reader_project
 
@@ -404,7 +334,7 @@ def initialize_dataframes(fw_client, reader_group):
     Initializes pandas DataFrames used to select sessions and reader projects
 
     Args:
-        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
         reader_group (flywheel.Group): The reader group
 
     Returns:
@@ -426,28 +356,18 @@ def initialize_dataframes(fw_client, reader_group):
         dtype="object",
     )
 
-    # Initialize destination projects dataframe
-    #for reader_proj in fw_client.projects.find(f'group="{reader_group.id}"'):
+    # Initialize destination projects dataframe from the indexed reader projects
     nread = 0
-    for reader_proj in fw_client.projects.iter_find(f"group={reader_group.id},label=~Reader [0-9][0-9]?[0-9]?"):
-
-        reader_proj = reader_proj.reload()
-        project_features = reader_proj.info["project_features"]
+    for reader_record in fw_client.reader_index(reader_group.id):
+        reader_proj = fw_client.get(reader_record["id"])
 
-        reader_id = find_readers_in_projects(reader_proj)
-
-        # for perm in reader_proj.permissions:
-        #     if set(perm.role_ids).intersection(proj_roles):
-        #         reader_id.append(perm.id)
-                
-        
         # Fill the dataframe with project data.
         dest_projects_df.loc[nread] = [
-            reader_proj.id,
-            reader_proj.label,
-            reader_id[0],
-            project_features["assignments"],
-            project_features["max_cases"],
+            reader_record["id"],
+            reader_record["label"],
+            reader_record["reader_id"],
+            reader_record["assignments"],
+            reader_record["max_cases"],
             len(reader_proj.sessions()),
         ]
         nread+=1
@@ -513,7 +433,7 @@ def check_valid_case_assignment(
         )
         return False, message
     else:
-        src_session = src_session.reload()
+        src_session = fw_client.reload(src_session)
 
     log.debug('found source session')
 
@@ -574,8 +494,32 @@ def check_valid_case_assignment(
     return True, "All validation checks, passed."
 
 
+def _remove_recorded_exports(journal, recorded_exports):
+    """
+    Remove the exports whose assignments have been written from the journal.
+
+    Args:
+        journal (ExportJournal): The journal of the session exports, or None
+        recorded_exports (list): The (source session id, reader project id) of each
+            recorded export
+    """
+    if journal is None:
+        return
+    for source_session_id, project_id in recorded_exports:
+        journal.remove(source_session_id, project_id)
+    # The recorded assignments must not be resumed again by the next run
+    journal.checkpoint(force=True)
+
+
 def distribute_batch_to_readers(
-    fw_client, source_project, reader_group_id, case_coverage, batch_csv_path
+    fw_client,
+    source_project,
+    reader_group_id,
+    case_coverage,
+    batch_csv_path,
+    transfer_engine=None,
+    journal=None,
+    cleanup_report=None,
 ):
     """
     Distribute batch of cases (sessions) from a source project to reader projects.
@@ -591,6 +535,12 @@ def distribute_batch_to_readers(
         reader_group_id (str): The Flywheel container id for the group in question
         case_coverage (int): The default number of readers assigned to each session
         batch_csv_path (str): Path to batch csv with case-reader assignments.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        journal (ExportJournal, optional): The journal of the session exports.
+            Defaults to None.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
     Returns:
         tuple: Pandas DataFrames recording source and destination for
             each session exported.
@@ -602,7 +552,11 @@ def distribute_batch_to_readers(
         if source_project.get("project_features")
         else {"case_coverage": case_coverage, "case_states": []}
     )
-    project_info = {}
+    # Stage the info writes to sessions and projects. Sessions and reader projects
+    # assigned in several rows of the batch are written once. Info is tracked as
+    # loaded so that unchanged info is not written.
+    info_buffer = InfoWriteBuffer(fw_client)
+    info_buffer.track(source_project)
     # Ensure a valid ohif_config.json file is present for the master project
     confirm_or_create_ohif_config(source_project)
 
@@ -647,117 +601,168 @@ def distribute_batch_to_readers(
     batch_df["passed"] = True
     batch_df["message"] = ""
 
-    # Loop through dataframe, check session_id, reader_email
+    # Rows assigning the same session are exported together, so that each file of the
+    # session is downloaded once for all of its readers. Sessions are assigned in the
+    # order in which they first appear in the batch.
+    session_rows = {}
     for i in batch_df.index:
-        # Check for valid session
-        session_id = batch_df.session_id[i]
-        reader_email = batch_df.reader_email[i]
-        src_session = fw_client.sessions.find_first(f"_id={session_id}")
-
-        if src_session:
-            src_session = src_session.reload()
-            session_features = set_session_features(src_session, case_coverage)
-        else:
-            session_features = {}
-
-        log.debug("dest project dataframe:")
-        log.debug(dest_projects_df)
-        # Locate Reader Project
-        if reader_email in dest_projects_df.reader_id.values:
-
-            
-            # Leaving this in until above is fully vetted:
-            # OLD WAY:
-            # indx = dest_projects_df[dest_projects_df.reader_id == reader_email].index[0]
-            # project_id = dest_projects_df.id[indx]
-            # reader_proj = fw_client.get(project_id).reload()
-            # force push
-
-            indx = dest_projects_df[dest_projects_df['reader_id'] == reader_email].index[0]
-            project_id = dest_projects_df.loc[indx, "id"]
-            reader_proj = fw_client.get(project_id).reload()
-            reader_row = dest_projects_df.loc[indx]
-
-
-
-            valid, message = check_valid_case_assignment(
-                fw_client,
-                session_id,
-                reader_email,
-                reader_group_id,
-                reader_row,
-                case_coverage,
-            )
-        # This will be caught as a non-valid reader,
-        # padding these variables to pass then to validation function.
-        else:
-            project_id = None
-            reader_proj = None
-            valid = False
-            message = f"reader {reader_email} does not exist"
-
-
-        if not valid:
-            batch_df.loc[i, "passed"] = False
-            batch_df.loc[i, "message"] = message
-            log.error(message)
-            continue
-
-        # With checks complete, assign indicated case to selected reader
-        try:
-            # export the session to the reader project
-            dest_session, _exported_data, _created_data = export_session(
-                fw_client, src_session, fw_client.get(project_id)
-            )
-
-            exported_data.extend(_exported_data)
-            created_data.extend(_created_data)
-
-        except Exception as e:
-            log.warning("Error while exporting a session, %s.", src_session.label)
-            log.exception(e)
-            log.warning("Examine the data and try again.")
-            continue
+        session_rows.setdefault(batch_df.session_id[i], []).append(i)
+
+    # The exports whose assignments are recorded, removed from the journal once the
+    # info is written
+    recorded_exports = []
+
+    # Loop through sessions, check session_id, reader_email of each row
+    try:
+        for session_id, rows in session_rows.items():
+            # Check for valid session
+            src_session = fw_client.sessions.find_first(f"_id={session_id}")
+
+            if src_session:
+                src_session = fw_client.reload(src_session)
+                info_buffer.track(src_session)
+                session_features = set_session_features(src_session, case_coverage)
+            else:
+                session_features = {}
+
+            # The valid assignments of the session: (row, reader index, reader project)
+            assignments = []
+            for i in rows:
+                reader_email = batch_df.reader_email[i]
+
+                log.debug("dest project dataframe:")
+                log.debug(dest_projects_df)
+                # Locate Reader Project
+                if reader_email in dest_projects_df.reader_id.values:
+                    indx = dest_projects_df[
+                        dest_projects_df["reader_id"] == reader_email
+                    ].index[0]
+                    project_id = dest_projects_df.loc[indx, "id"]
+                    reader_proj = fw_client.get(project_id)
+                    info_buffer.track(reader_proj)
+                    reader_row = dest_projects_df.loc[indx]
+
+                    valid, message = check_valid_case_assignment(
+                        fw_client,
+                        session_id,
+                        reader_email,
+                        reader_group_id,
+                        reader_row,
+                        case_coverage,
+                    )
+                # This will be caught as a non-valid reader,
+                # padding these variables to pass then to validation function.
+                else:
+                    valid = False
+                    message = f"reader {reader_email} does not exist"
+
+                # Assignments of this session in earlier rows are not yet recorded
+                if valid and indx in [assigned[1] for assigned in assignments]:
+                    valid = False
+                    message = (
+                        f"Selected session ({src_session.label}) has already been "
+                        f"assigned to reader ({reader_email})."
+                    )
+                elif valid and (
+                    session_features["assigned_count"] + len(assignments)
+                    >= session_features["case_coverage"]
+                ):
+                    valid = False
+                    message = (
+                        f"Assigning this case ({src_session.label}) exceeds "
+                        f"case_coverage ({session_features['case_coverage']}) for "
+                        "this case. Assignment will not proceed."
+                    )
+
+                if not valid:
+                    batch_df.loc[i, "passed"] = False
+                    batch_df.loc[i, "message"] = message
+                    log.error(message)
+                    continue
+
+                assignments.append((i, indx, reader_proj))
+
+            if not assignments:
+                continue
 
-        # record source and dest session ids in destination project dataframe
-        if not dest_projects_df.loc[indx, "assignments"]:
-            dest_projects_df.loc[indx, "assignments"] = [
-                {"source_session": src_session.id, "dest_session": dest_session.id}
-            ]
-        else:
-            dest_projects_df.loc[indx, "assignments"].append(
-                {"source_session": src_session.id, "dest_session": dest_session.id}
+            # With checks complete, export the session to the selected readers
+            exports = export_session_to_projects(
+                fw_client,
+                src_session,
+                [reader_proj for _, _, reader_proj in assignments],
+                transfer_engine=transfer_engine,
+                journal=journal,
+                cleanup_report=cleanup_report,
             )
 
-        dest_projects_df.loc[indx, "num_assignments"] += 1
-        session_features["assigned_count"] += 1
-        session_features["assignments"].append(
-            {
-                "project_id": project_id,
-                "reader_id": reader_email,
-                "session_id": dest_session.id,
-                "status": "Assigned",
-            }
-        )
-
-        # Record updates to the source session
-        session_info = {"session_features": session_features}
-        src_session.update_info(session_info)
-
-        # update reader project from updates to the dataframe
-        project_info = {
-            "project_features": {
-                "assignments": dest_projects_df.loc[indx, "assignments"],
-                "max_cases": dest_projects_df.loc[indx, "max_cases"],
-                "reader": {"id": reader_email}
-            }
-        }
-    if project_info:
-        reader_proj.update_info(project_info)
+            for (i, indx, reader_proj), export in zip(assignments, exports):
+                if isinstance(export, Exception):
+                    log.warning(
+                        "Error while exporting a session, %s.", src_session.label
+                    )
+                    log.error(export, exc_info=export)
+                    log.warning("Examine the data and try again.")
+                    continue
+
+                dest_session, _exported_data, _created_data = export
+                exported_data.extend(_exported_data)
+                created_data.extend(_created_data)
+
+                reader_email = batch_df.reader_email[i]
+                project_id = dest_projects_df.loc[indx, "id"]
+
+                # record source and dest session ids in destination project dataframe
+                if not dest_projects_df.loc[indx, "assignments"]:
+                    dest_projects_df.loc[indx, "assignments"] = [
+                        {
+                            "source_session": src_session.id,
+                            "dest_session": dest_session.id,
+                        }
+                    ]
+                else:
+                    dest_projects_df.loc[indx, "assignments"].append(
+                        {
+                            "source_session": src_session.id,
+                            "dest_session": dest_session.id,
+                        }
+                    )
+
+                dest_projects_df.loc[indx, "num_assignments"] += 1
+                session_features["assigned_count"] += 1
+                session_features["assignments"].append(
+                    {
+                        "project_id": project_id,
+                        "reader_id": reader_email,
+                        "session_id": dest_session.id,
+                        "status": "Assigned",
+                    }
+                )
+
+                # Record updates to the source session
+                session_info = {"session_features": session_features}
+                info_buffer.update_info(src_session, session_info)
+
+                # update reader project from updates to the dataframe
+                project_info = {
+                    "project_features": {
+                        "assignments": dest_projects_df.loc[indx, "assignments"],
+                        "max_cases": dest_projects_df.loc[indx, "max_cases"],
+                        "reader": {"id": reader_email},
+                    }
+                }
+                info_buffer.update_info(reader_proj, project_info)
+                recorded_exports.append((src_session.id, project_id))
+    except Exception:
+        # Record the assignments made before the failure
+        info_buffer.flush()
+        _remove_recorded_exports(journal, recorded_exports)
+        raise
 
     # Iterate through sessions to record system state of Assigned Sessions
-    for tmp_session in source_project.sessions():
-        tmp_session = tmp_session.reload()
+    for tmp_session in iter_project_sessions(fw_client, source_project.id):
+        # Updates to the assigned sessions have not been written yet
+        info_buffer.track(tmp_session)
+        tmp_session = info_buffer.apply_pending(tmp_session)
         session_features = set_session_features(tmp_session, 3)
         # always record the state in the dataframe.
         session_features["id"] = tmp_session.id
@@ -781,7 +786,13 @@ def distribute_batch_to_readers(
         # append new or updated case data to project_features
         project_features["case_states"].append(project_session_attributes)
 
-    source_project.update_info({"project_features": project_features})
+    info_buffer.update_info(source_project, {"project_features": project_features})
+
+    # All info writes are merged per container and made together
+    info_buffer.flush()
+    info_buffer.log_summary()
+    _remove_recorded_exports(journal, recorded_exports)
+
     # Create a DataFrame from exported_data and then export
     exported_data_df = pd.DataFrame(data=exported_data)
 
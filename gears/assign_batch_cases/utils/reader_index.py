@@ -0,0 +1,208 @@
+"""
+An index of the reader projects in a reader group.
+
+The reader projects ("Reader NN") of a group are listed once with a single paginated
+query. Each reader (identified by email) is mapped to their project id, label,
+max_cases, and assignments so that validating or locating a reader does not require
+listing the projects of the group again.
+"""
+import logging
+import re
+import threading
+
+log = logging.getLogger(__name__)
+
+# Reader projects are labeled "Reader 1" through "Reader 999"
+READER_PROJECT_LABEL = "Reader [0-9][0-9]?[0-9]?"
+
+
+class ReaderIndex:
+    """
+    Maps the readers of a reader group to their reader projects.
+
+    Each reader project is represented by a dictionary with keys "id", "label",
+    "reader_id", "assignments", "max_cases", and "num_assignments". Iterating over the
+    index yields these records in the order the projects were listed.
+
+    Args:
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        group_id (str): The id of the reader group
+    """
+
+    def __init__(self, fw_client, group_id):
+        self._fw_client = fw_client
+        self.group_id = group_id
+        self._lock = threading.Lock()
+        self._records = []
+        self._by_reader = {}
+        self._labels = set()
+        self._build()
+
+    def _build(self):
+        reader_roles = None
+        projects = self._fw_client.projects.iter_find(
+            f"group={self.group_id},label=~{READER_PROJECT_LABEL}",
+            limit=50,
+            include_all_info=True,
+        )
+        for project in projects:
+            self._labels.add(project.label)
+
+            if "project_features" not in (project.info or {}):
+                project = self._fw_client.reload(project)
+                if "project_features" not in project.info:
+                    log.debug(f"uninitialized project {project.label}. skipping.")
+                    continue
+
+            reader_id = (
+                project.info["project_features"].get("reader", {}).get("id")
+            )
+            # Legacy reader projects identify the reader by permission only. The
+            # reader id is recorded on the project, as `find_and_add_readers_by_perm`.
+            if reader_id is None:
+                if reader_roles is None:
+                    reader_roles = self._fw_client.roles.reader_role_ids
+                reader_id = self._add_reader_by_perm(project, reader_roles)
+
+            if reader_id is not None:
+                self._add_record(project, reader_id)
+
+        log.info(
+            "Indexed %i reader projects in group %s.", len(self._records), self.group_id
+        )
+
+    def _add_reader_by_perm(self, project, reader_roles):
+        proj_readers = [
+            perm.id
+            for perm in project.permissions
+            if set(perm.role_ids).intersection(reader_roles)
+        ]
+
+        if len(proj_readers) > 1:
+            log.warning("more than one possible reader found.  assuming first")
+
+        if len(proj_readers) == 0:
+            log.warning("No suitable reader found.")
+            return None
+
+        info = project.info
+        info["project_features"]["reader"] = {"id": proj_readers[0]}
+        project.update_info(info)
+        self._fw_client.invalidate(project.id)
+
+        return proj_readers[0]
+
+    @staticmethod
+    def _create_record(project, reader_id):
+        project_features = project.info["project_features"]
+        assignments = project_features.get("assignments", [])
+        return {
+            "id": project.id,
+            "label": project.label,
+            "reader_id": reader_id,
+            "assignments": assignments,
+            "max_cases": project_features.get("max_cases"),
+            "num_assignments": len(assignments),
+        }
+
+    def _add_record(self, project, reader_id):
+        record = self._create_record(project, reader_id)
+        self._records.append(record)
+        self._labels.add(project.label)
+
+        if reader_id in self._by_reader:
+            log.warning(
+                "WARNING multiple projects found for reader %s: %s and %s. "
+                "Using %s.",
+                reader_id,
+                self._by_reader[reader_id]["label"],
+                project.label,
+                self._by_reader[reader_id]["label"],
+            )
+        else:
+            self._by_reader[reader_id] = record
+
+        return record
+
+    def __contains__(self, reader_id):
+        return reader_id in self._by_reader
+
+    def __iter__(self):
+        return iter(list(self._records))
+
+    def __len__(self):
+        return len(self._records)
+
+    @property
+    def reader_ids(self):
+        """list: The ids (emails) of the indexed readers."""
+        return list(self._by_reader.keys())
+
+    def get(self, reader_id):
+        """
+        Return the reader project record of a reader.
+
+        Args:
+            reader_id (str): The id (email) of the reader
+
+        Returns:
+            dict: The reader project record, `None` if the reader has no project
+        """
+        return self._by_reader.get(reader_id)
+
+    def get_project(self, reader_id):
+        """
+        Return the reader project of a reader.
+
+        Args:
+            reader_id (str): The id (email) of the reader
+
+        Returns:
+            flywheel.Project: The reader project, `None` if the reader has no project
+        """
+        record = self.get(reader_id)
+        if record is None:
+            log.warning(f"No projects found for reader {reader_id}")
+            return None
+
+        return self._fw_client.get(record["id"])
+
+    def add(self, project, reader_id):
+        """
+        Add a newly created reader project to the index.
+
+        Args:
+            project (flywheel.Project): The reader project with populated info
+            reader_id (str): The id (email) of the reader of the project
+
+        Returns:
+            dict: The reader project record
+        """
+        with self._lock:
+            return self._add_record(project, reader_id)
+
+    def update(self, project):
+        """
+        Refresh the record of a reader project after its info has been updated.
+
+        Args:
+            project (flywheel.Project): The reader project with populated info
+        """
+        with self._lock:
+            for record in self._records:
+                if record["id"] == project.id:
+                    record.update(self._create_record(project, record["reader_id"]))
+
+    def next_reader_number(self):
+        """
+        Return the number of the next reader project label (e.g. 4 for "Reader 4").
+
+        Returns:
+            int: One more than the largest reader number in the group
+        """
+        numbers = [
+            int(label.split("Reader ")[-1])
+            for label in self._labels
+            if re.match(READER_PROJECT_LABEL, label)
+        ]
+        return max(numbers) + 1 if numbers else 1
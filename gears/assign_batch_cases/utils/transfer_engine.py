@@ -0,0 +1,596 @@
+"""
+A concurrent engine for the transfer of files between acquisitions.
+
+Each file of a source acquisition is downloaded and uploaded to the destination
+acquisition along with the metadata of the source file. A file exported to several
+destination acquisitions is downloaded once and uploaded to each of them. The files of
+an acquisition are transferred concurrently. The number of downloads and uploads in
+progress across all acquisitions of a run is bounded, as is the total number of bytes
+downloaded in a run.
+
+Files up to IN_MEMORY_THRESHOLD bytes are held in memory between their download and
+upload, as long as the files held in memory total no more than MAX_MEMORY_BYTES. Other
+files are spooled to a uniquely named local directory.
+"""
+import io
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import flywheel
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# Maximum number of downloads and uploads in progress at once
+MAX_DOWNLOADS = 4
+MAX_UPLOADS = 4
+
+# Maximum number of attempts to upload a file
+MAX_UPLOAD_ATTEMPTS = 5
+
+# Largest file (bytes) held in memory instead of spooled to disk
+IN_MEMORY_THRESHOLD = 64 * 1024 * 1024
+# Maximum number of bytes held in memory by all transfers in progress
+MAX_MEMORY_BYTES = 256 * 1024 * 1024
+
+# Describes the transfer of a single file
+TRANSFER_RECORD_TEMPLATE = {
+    "file": None,
+    "source_acquisition": None,
+    "dest_acquisition": None,
+    "size": 0,
+    "download_seconds": 0.0,
+    "upload_seconds": 0.0,
+    "throughput": 0.0,
+    "attempts": 0,
+    "downloaded": False,
+    "cached": False,
+    "uploaded": False,
+    "spooled": False,
+    "memory_bytes": 0,
+    "disk_bytes": 0,
+    "status": None,
+}
+
+
+class TransferBudgetExceededError(Exception):
+    """Exception raised when a transfer would exceed the byte budget of a run.
+
+    Attributes:
+        message -- explanation of the error
+    """
+
+    def __init__(self, message):
+        Exception.__init__(self)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class TransferUploadError(Exception):
+    """Exception raised when a file could not be uploaded in MAX_UPLOAD_ATTEMPTS.
+
+    Attributes:
+        message -- explanation of the error
+    """
+
+    def __init__(self, message):
+        Exception.__init__(self)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+def file_metadata(acq_file):
+    """
+    Gather the metadata of a file to be uploaded along with its copy.
+
+    Args:
+        acq_file (flywheel.FileEntry): The source file
+
+    Returns:
+        dict: The name, modality, type, classification, and info of the file
+    """
+    metadata = {"name": acq_file.name}
+    modality = acq_file.modality
+    if not modality and acq_file.name.endswith("mriqc.qa.html"):
+        # Special case - mriqc output files do not have modality set, so
+        # we must set the modality to allow the classification.
+        modality = "MR"
+    if modality:
+        metadata["modality"] = modality
+    if acq_file.type:
+        metadata["type"] = acq_file.type
+    if acq_file.classification:
+        metadata["classification"] = acq_file.classification
+    if acq_file.info:
+        metadata["info"] = acq_file.info
+    return metadata
+
+
+def uploaded_file_names(response):
+    """
+    List the names of the files stored by an upload.
+
+    Args:
+        response (list): The files returned by `upload_file`
+
+    Returns:
+        list: The names of the uploaded files
+    """
+    names = []
+    for uploaded_file in response or []:
+        if isinstance(uploaded_file, dict):
+            names.append(uploaded_file.get("name"))
+        else:
+            names.append(getattr(uploaded_file, "name", None))
+    return names
+
+
+def log_progress(transfer):
+    """
+    Log the completion of a single transfer. The default progress callback.
+
+    Args:
+        transfer (dict): The TRANSFER_RECORD_TEMPLATE of the completed transfer
+    """
+    log.info(
+        "Transferred %s (%i bytes) at %.1f bytes/s.",
+        transfer["file"],
+        transfer["size"],
+        transfer["throughput"],
+    )
+
+
+class TransferEngine:
+    """
+    Transfers the files of acquisitions with bounded download/upload concurrency.
+
+    Args:
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        max_downloads (int, optional): Maximum number of downloads in progress.
+            Defaults to MAX_DOWNLOADS.
+        max_uploads (int, optional): Maximum number of uploads in progress.
+            Defaults to MAX_UPLOADS.
+        byte_budget (int, optional): Maximum number of bytes downloaded over the run.
+            Defaults to None, no limit.
+        progress_callback (callable, optional): Called with the TRANSFER_RECORD_TEMPLATE
+            of each completed transfer. Defaults to log_progress.
+        memory_threshold (int, optional): Largest file held in memory.
+            Defaults to IN_MEMORY_THRESHOLD.
+        max_memory_bytes (int, optional): Maximum number of bytes held in memory.
+            Defaults to MAX_MEMORY_BYTES.
+        file_cache (FileCache, optional): Serves files downloaded earlier in the run.
+            Defaults to None, no cache.
+    """
+
+    def __init__(
+        self,
+        fw_client,
+        max_downloads=MAX_DOWNLOADS,
+        max_uploads=MAX_UPLOADS,
+        byte_budget=None,
+        progress_callback=log_progress,
+        memory_threshold=IN_MEMORY_THRESHOLD,
+        max_memory_bytes=MAX_MEMORY_BYTES,
+        file_cache=None,
+    ):
+        self._fw_client = fw_client
+        self.max_downloads = max_downloads
+        self.max_uploads = max_uploads
+        self.byte_budget = byte_budget
+        self.progress_callback = progress_callback
+        self._downloads = threading.Semaphore(max_downloads)
+        self._uploads = threading.Semaphore(max_uploads)
+        self._lock = threading.Lock()
+        self.memory_threshold = memory_threshold
+        self.max_memory_bytes = max_memory_bytes
+        self.file_cache = file_cache
+        self.bytes_reserved = 0
+        self.memory_in_use = 0
+        self.disk_in_use = 0
+        self.peak_memory_bytes = 0
+        self.peak_disk_bytes = 0
+        self.transfers = []
+
+    def _reserve(self, size):
+        """Reserve bytes of the budget for a transfer."""
+        with self._lock:
+            if (
+                self.byte_budget is not None
+                and self.bytes_reserved + size > self.byte_budget
+            ):
+                raise TransferBudgetExceededError(
+                    f"Transferring {size} bytes would exceed the budget of "
+                    f"{self.byte_budget} bytes ({self.bytes_reserved} bytes used)."
+                )
+            self.bytes_reserved += size
+
+    def _reserve_memory(self, size):
+        """Reserve memory for a transfer. Returns False if the file must be spooled."""
+        with self._lock:
+            if (
+                size is None
+                or size > self.memory_threshold
+                or self.memory_in_use + size > self.max_memory_bytes
+            ):
+                return False
+            self.memory_in_use += size
+            self.peak_memory_bytes = max(self.peak_memory_bytes, self.memory_in_use)
+            return True
+
+    def _reserve_disk(self, size):
+        """Record the disk used by a spooled transfer."""
+        with self._lock:
+            self.disk_in_use += size
+            self.peak_disk_bytes = max(self.peak_disk_bytes, self.disk_in_use)
+
+    def _release(self, transfer):
+        """Release the memory and disk used by a transfer."""
+        with self._lock:
+            self.memory_in_use -= transfer["memory_bytes"]
+            self.disk_in_use -= transfer["disk_bytes"]
+
+    def _download(self, acq_file, transfer):
+        """
+        Download a file into memory or, if too large, to a spool directory of its own.
+
+        Returns:
+            bytes/str: The contents of the file or the path of the spooled file
+        """
+        if self._reserve_memory(acq_file.size):
+            transfer["memory_bytes"] = acq_file.size
+            return self._download_to_memory(acq_file, transfer)
+
+        transfer["spooled"] = True
+        spool_dir = tempfile.mkdtemp(prefix="transfer-")
+        file_path = os.path.join(spool_dir, acq_file.name)
+        try:
+            self._download_to_disk(acq_file, file_path, transfer)
+        except Exception:
+            shutil.rmtree(spool_dir, ignore_errors=True)
+            raise
+        transfer["disk_bytes"] = transfer["size"]
+        self._reserve_disk(transfer["size"])
+        return file_path
+
+    def _download_to_memory(self, acq_file, transfer):
+        """Read a file from the file cache or, if not cached, from the instance."""
+        if self.file_cache is not None:
+            contents = self.file_cache.read(acq_file)
+            if contents is not None:
+                transfer["cached"] = True
+                transfer["size"] = len(contents)
+                return contents
+
+        self._reserve(acq_file.size or 0)
+        with self._downloads:
+            start = time.perf_counter()
+            contents = acq_file.read()
+            transfer["download_seconds"] = time.perf_counter() - start
+        transfer["size"] = len(contents)
+
+        if self.file_cache is not None:
+            self.file_cache.put(acq_file, contents)
+        return contents
+
+    def _download_to_disk(self, acq_file, file_path, transfer):
+        """Fetch a file from the file cache or, if not cached, from the instance."""
+        if self.file_cache is not None and self.file_cache.fetch(acq_file, file_path):
+            transfer["cached"] = True
+        else:
+            self._reserve(acq_file.size or 0)
+            with self._downloads:
+                start = time.perf_counter()
+                acq_file.download(file_path)
+                transfer["download_seconds"] = time.perf_counter() - start
+
+            if self.file_cache is not None:
+                self.file_cache.put(acq_file, file_path)
+        transfer["size"] = os.path.getsize(file_path)
+
+    def _upload(self, file_name, contents, dest_acquisition, metadata, transfer):
+        """Upload a file with its metadata, retrying until the upload is confirmed."""
+        with self._uploads:
+            start = time.perf_counter()
+            while transfer["attempts"] < MAX_UPLOAD_ATTEMPTS:
+                transfer["attempts"] += 1
+                if transfer["spooled"]:
+                    upload = contents
+                else:
+                    upload = flywheel.FileSpec(
+                        file_name, io.BytesIO(contents), size=len(contents)
+                    )
+                response = dest_acquisition.upload_file(upload, metadata=metadata)
+                # The response lists the files that were stored by the upload
+                if file_name not in uploaded_file_names(response):
+                    log.warning("Upload failed for %s - retrying...", file_name)
+                else:
+                    log.info("Successfully exported: %s", file_name)
+                    transfer["uploaded"] = True
+                    break
+            transfer["upload_seconds"] = time.perf_counter() - start
+
+        # The cached copy of the acquisition predates the upload
+        self._fw_client.invalidate(dest_acquisition.id)
+        if not transfer["uploaded"]:
+            raise TransferUploadError(
+                f"Upload of {file_name} failed after {transfer['attempts']} attempts."
+            )
+
+    def fan_out_file(self, acq_file, source_acquisition, dest_acquisitions):
+        """
+        Transfer a single file of source_acquisition to each of dest_acquisitions.
+
+        The file is downloaded once, or served from the file cache, and uploaded to the
+        destinations concurrently. A failed upload does not prevent the uploads to the
+        other destinations. A download that would exceed the byte budget fails the
+        transfers to all destinations with TransferBudgetExceededError.
+
+        Args:
+            acq_file (flywheel.FileEntry): The file to transfer
+            source_acquisition (flywheel.Acquisition): Source Acquisition of the file
+            dest_acquisitions (list): Destination Acquisitions (flywheel.Acquisition)
+                of the file
+
+        Returns:
+            tuple: The TRANSFER_RECORD_TEMPLATE of the transfer to each of
+                dest_acquisitions and the exception raised by each, or None
+        """
+        transfers = []
+        for dest_acquisition in dest_acquisitions:
+            transfer = TRANSFER_RECORD_TEMPLATE.copy()
+            transfer["file"] = acq_file.name
+            transfer["source_acquisition"] = source_acquisition.id
+            transfer["dest_acquisition"] = dest_acquisition.id
+            transfers.append(transfer)
+        errors = [None] * len(transfers)
+        if not transfers:
+            return transfers, errors
+
+        # The first transfer records the download shared by all of them
+        download = transfers[0]
+        download["downloaded"] = True
+        contents = None
+        try:
+            # The DICOM files are assumed to have been fully anonymized
+            contents = self._download(acq_file, download)
+        except Exception as e:
+            errors = [e] * len(transfers)
+
+        try:
+            if contents is not None:
+                metadata = file_metadata(acq_file)
+                for transfer in transfers[1:]:
+                    transfer["size"] = download["size"]
+                    transfer["spooled"] = download["spooled"]
+
+                def upload(transfer, dest_acquisition):
+                    log.debug(
+                        "Uploading %s to %s", acq_file.name, dest_acquisition.label
+                    )
+                    self._upload(
+                        acq_file.name, contents, dest_acquisition, metadata, transfer
+                    )
+
+                max_workers = min(len(transfers), self.max_uploads)
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    futures = [
+                        executor.submit(upload, transfer, dest_acquisition)
+                        for transfer, dest_acquisition in zip(
+                            transfers, dest_acquisitions
+                        )
+                    ]
+                    for index, future in enumerate(futures):
+                        try:
+                            future.result()
+                        except Exception as e:
+                            errors[index] = e
+        finally:
+            # Delete the uploaded file locally.
+            if download["spooled"] and contents:
+                log.debug("Removing local file: %s", contents)
+                shutil.rmtree(os.path.dirname(contents), ignore_errors=True)
+            contents = None
+            self._release(download)
+
+        for transfer, error in zip(transfers, errors):
+            transfer["status"] = "failed" if error else "transferred"
+            seconds = transfer["download_seconds"] + transfer["upload_seconds"]
+            if seconds > 0:
+                transfer["throughput"] = transfer["size"] / seconds
+            with self._lock:
+                self.transfers.append(transfer)
+            if self.progress_callback and not error:
+                self.progress_callback(transfer)
+
+        return transfers, errors
+
+    def transfer_file(self, acq_file, source_acquisition, dest_acquisition):
+        """
+        Transfer a single file of source_acquisition to dest_acquisition.
+
+        Args:
+            acq_file (flywheel.FileEntry): The file to transfer
+            source_acquisition (flywheel.Acquisition): Source Acquisition of the file
+            dest_acquisition (flywheel.Acquisition): Destination Acquisition of the file
+
+        Raises:
+            TransferBudgetExceededError: Raised if the file would exceed the budget.
+
+        Returns:
+            dict: The TRANSFER_RECORD_TEMPLATE of the transfer
+        """
+        transfers, errors = self.fan_out_file(
+            acq_file, source_acquisition, [dest_acquisition]
+        )
+        if errors[0]:
+            raise errors[0]
+
+        return transfers[0]
+
+    def fan_out_files(
+        self, source_acquisition, dest_acquisitions, completed=None, on_transfer=None
+    ):
+        """
+        Transfer all files of source_acquisition to each of dest_acquisitions.
+
+        Files are transferred concurrently, each downloaded once for all destinations.
+        All transfers are attempted; the error of a destination does not prevent the
+        transfers to the others.
+
+        Args:
+            source_acquisition (flywheel.Acquisition): Source Acquisition of files
+            dest_acquisitions (list): Destination Acquisitions (flywheel.Acquisition)
+                of files
+            completed (list, optional): For each of dest_acquisitions, the names of
+                the files already transferred to it, which are skipped. Defaults to
+                None, no files skipped.
+            on_transfer (callable, optional): Called with the index of the destination
+                and the TRANSFER_RECORD_TEMPLATE of each successful transfer, as it
+                completes. Defaults to None.
+
+        Returns:
+            tuple: For each of dest_acquisitions, the list of TRANSFER_RECORD_TEMPLATE
+                of its files, in the order of the files of source_acquisition, and the
+                first exception raised transferring to it, or None
+        """
+        fw = self._fw_client
+        # Get the source_acquisition so that the metadata are all there.
+        source_acquisition = fw.reload(source_acquisition)
+        source_session = fw.get(source_acquisition.parents["session"])
+        source_subject = fw.get(source_acquisition.parents["subject"])
+        source_project = fw.get(source_acquisition.parents["project"])
+
+        acq_files = source_acquisition.files or []
+        for acq_file in acq_files:
+            log.info(
+                "Exporting %s/%s/%s/%s/%s to %i destination(s)...",
+                source_project.label,
+                source_subject.label,
+                source_session.label,
+                source_acquisition.label,
+                acq_file.name,
+                len(dest_acquisitions),
+            )
+
+        transfers = [[] for _ in dest_acquisitions]
+        errors = [None] * len(dest_acquisitions)
+        if not acq_files or not dest_acquisitions:
+            return transfers, errors
+        if completed is None:
+            completed = [[] for _ in dest_acquisitions]
+
+        def transfer(acq_file, indices):
+            file_transfers, file_errors = self.fan_out_file(
+                acq_file,
+                source_acquisition,
+                [dest_acquisitions[index] for index in indices],
+            )
+            if on_transfer:
+                for index, file_transfer, error in zip(
+                    indices, file_transfers, file_errors
+                ):
+                    if error is None:
+                        on_transfer(index, file_transfer)
+            return file_transfers, file_errors
+
+        max_workers = min(len(acq_files), self.max_downloads + self.max_uploads)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = []
+            for acq_file in acq_files:
+                # The destinations that do not have the file yet
+                indices = [
+                    index
+                    for index in range(len(dest_acquisitions))
+                    if acq_file.name not in completed[index]
+                ]
+                if indices:
+                    futures.append(
+                        (acq_file, indices, executor.submit(transfer, acq_file, indices))
+                    )
+                else:
+                    log.info("%s was exported in an earlier run.", acq_file.name)
+            for acq_file, indices, future in futures:
+                try:
+                    file_transfers, file_errors = future.result()
+                except Exception as e:
+                    file_transfers, file_errors = [], [e] * len(indices)
+                for index, file_transfer in zip(indices, file_transfers):
+                    transfers[index].append(file_transfer)
+                for index, error in zip(indices, file_errors):
+                    if error is None:
+                        continue
+                    log.error("Could not transfer %s: %s", acq_file.name, error)
+                    if errors[index] is None:
+                        errors[index] = error
+
+        return transfers, errors
+
+    def transfer_files(self, source_acquisition, dest_acquisition):
+        """
+        Transfer all files of source_acquisition to dest_acquisition concurrently.
+
+        All transfers are attempted; the first error encountered is raised after all
+        transfers are complete.
+
+        Args:
+            source_acquisition (flywheel.Acquisition): Source Acquisition of files
+            dest_acquisition (flywheel.Acquisition): Destination Acquisition of files
+
+        Returns:
+            list: The TRANSFER_RECORD_TEMPLATE of each file, in the order of the
+                files of source_acquisition
+        """
+        transfers, errors = self.fan_out_files(source_acquisition, [dest_acquisition])
+        if errors[0]:
+            raise errors[0]
+
+        return transfers[0]
+
+    def report(self):
+        """
+        Return a report of the transfers of the run.
+
+        Returns:
+            pandas.DataFrame: One row for each transfer with the columns of
+                TRANSFER_RECORD_TEMPLATE
+        """
+        with self._lock:
+            transfers = list(self.transfers)
+        return pd.DataFrame(transfers, columns=TRANSFER_RECORD_TEMPLATE.keys())
+
+    def log_summary(self):
+        """Log the files and bytes transferred, throughput, and memory/disk/cache use."""
+        report_df = self.report()
+        transferred = report_df[report_df.status == "transferred"]
+        seconds = transferred.download_seconds.sum() + transferred.upload_seconds.sum()
+        log.info(
+            "File transfers: %i files (%i bytes) transferred, %i failed, "
+            "%.1f bytes/s per transfer.",
+            len(transferred),
+            transferred["size"].sum(),
+            (report_df.status == "failed").sum(),
+            transferred["size"].sum() / seconds if seconds else 0.0,
+        )
+        downloads = report_df[
+            report_df.downloaded.astype(bool) & ~report_df.cached.astype(bool)
+        ]
+        log.info(
+            "File transfers: %i files (%i bytes) downloaded, %i spooled to disk, peak "
+            "of %i bytes in memory and %i bytes on disk.",
+            len(downloads),
+            downloads["size"].sum(),
+            downloads.spooled.sum(),
+            self.peak_memory_bytes,
+            self.peak_disk_bytes,
+        )
+        if self.file_cache is not None:
+            self.file_cache.log_summary()
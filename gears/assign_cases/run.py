@@ -7,22 +7,78 @@ are created with the assign-readers gear.
 import logging
 import os
 
+import numpy as np
 from flywheel_gear_toolkit import GearToolkitContext
 
+from utils.api_profiler import ApiProfiler
 from utils.check_jobs import (
     DuplicateJobError,
     InsufficientPermissionsError,
     check_for_duplicate_execution,
     verify_user_permissions,
 )
-from utils.manage_cases import InvalidGroupError, distribute_cases_to_readers
+from utils.container_cache import ContainerCache
+from utils.container_operations import CleanupReport
+from utils.export_journal import ExportJournal
+from utils.file_cache import FileCache
+from utils.manage_cases import (
+    InvalidGroupError,
+    InvalidInputError,
+    distribute_cases_to_readers,
+)
+from utils.transfer_engine import TransferEngine
 
 log = logging.getLogger(__name__)
 
 
+def random_seed(context):
+    """
+    Return the seed of the random assignment of readers.
+
+    The seed is taken from the "random_seed" configuration when given. Otherwise, a
+    fresh 32-bit seed is drawn, which is logged and recorded so that the run can be
+    repeated.
+
+    Args:
+        context (GearToolkitContext): The gear context
+
+    Returns:
+        int: The seed of the run
+    """
+    seed = context.config.get("random_seed")
+    if seed is None:
+        # A 32-bit seed, which can be entered back into the configuration
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+    log.info("Assigning readers with random_seed %i.", seed)
+    return seed
+
+
 def main(context):
+    # Requests to the instance are profiled only when requested
+    api_profiler = None
+    if context.config.get("profile_api_calls"):
+        api_profiler = ApiProfiler()
+        api_profiler.install(context.client)
+
+    # The containers removed by the cleanup of failed exports are reported
+    cleanup_report = CleanupReport()
+    file_cache = None
+    journal = None
     try:
-        fw_client = context.client
+        fw_client = ContainerCache(context.client)
+        # Files downloaded earlier in the run are served from a local cache
+        file_cache = FileCache(
+            context.work_dir / "file_cache",
+            max_bytes=context.config.get("file_cache_size_mb", 2048) * 1024 * 1024,
+        )
+        # Transfers the files of all sessions exported in this run, within the
+        # optional budget of bytes downloaded
+        byte_budget = context.config.get("transfer_budget_mb")
+        if byte_budget is not None:
+            byte_budget *= 1024 * 1024
+        transfer_engine = TransferEngine(
+            fw_client, byte_budget=byte_budget, file_cache=file_cache
+        )
 
         verify_user_permissions(fw_client, context)
         check_for_duplicate_execution(fw_client)
@@ -35,6 +91,12 @@ def main(context):
         if reader_group_id is None:
             reader_group_id = source_group_id
 
+        # Exports interrupted in an earlier run are resumed from the journal
+        if context.config.get("resume_exports", True):
+            journal = ExportJournal.load(fw_client, source_project, context.output_dir)
+
+        # The same seed reproduces the assignments of a run
+        seed = random_seed(context)
 
         # TODO: Verify that this isn't RUSTLING ANYTONES JIMMIES.
         # # If gear is run within the Readers group, error and exit
@@ -43,14 +105,45 @@ def main(context):
         #         'This gear cannot be run from within the "Readers" group!'
         #     )
 
-        source_sess_df, dest_proj_df, exported_data_df = distribute_cases_to_readers(
-            fw_client, source_project, reader_group_id, context.config["case_coverage"],
+        (
+            source_sess_df,
+            dest_proj_df,
+            exported_data_df,
+            assignment_plan_df,
+        ) = distribute_cases_to_readers(
+            fw_client,
+            source_project,
+            reader_group_id,
+            context.config["case_coverage"],
+            transfer_engine=transfer_engine,
+            journal=journal,
+            assignment_solver=context.config.get("assignment_solver", "greedy"),
+            rng=np.random.default_rng(seed),
+            incremental=context.config.get("incremental", False),
+            cleanup_report=cleanup_report,
         )
 
+        source_sess_df["random_seed"] = seed
+        assignment_plan_df["random_seed"] = seed
+
         source_sess_df.to_csv(str(context.output_dir / "master_project_case_data.csv"))
         dest_proj_df.to_csv(str(context.output_dir / "reader_project_case_data.csv"))
         exported_data_df.to_csv(str(context.output_dir / "exported_data.csv"))
-    except (DuplicateJobError, InsufficientPermissionsError, InvalidGroupError,) as e:
+        assignment_plan_df.to_csv(
+            str(context.output_dir / "assignment_plan.csv"), index=False
+        )
+        transfer_engine.report().to_csv(
+            str(context.output_dir / "transfer_report.csv"), index=False
+        )
+        transfer_engine.log_summary()
+
+        fw_client.log_summary()
+    except (
+        DuplicateJobError,
+        InsufficientPermissionsError,
+        InvalidGroupError,
+        InvalidInputError,
+    ) as e:
         log.error(e.message)
         log.fatal("Error executing assign-readers.",)
         return 1
@@ -58,6 +151,16 @@ def main(context):
         log.exception(e,)
         log.fatal("Error executing assign-cases.",)
         return 1
+    finally:
+        if api_profiler:
+            api_profiler.write_reports(context.output_dir)
+        cleanup_report.report().to_csv(
+            str(context.output_dir / "cleanup_report.csv"), index=False
+        )
+        if file_cache is not None:
+            file_cache.clear()
+        if journal is not None:
+            journal.checkpoint(force=True)
 
     log.info("assign-cases completed Successfully!")
     return 0
@@ -0,0 +1,209 @@
+"""
+Planning of the assignment of sessions to reader projects.
+
+All of the assignments of a run are planned before any session is exported. Readers are
+selected for each session in turn, least-loaded first and without replacement, with the
+planned assignments counted against the capacity (max_cases) of each reader.
+Alternatively, the "flow" solver assigns all sessions at once (see assignment_solver).
+The plan can then be recorded, and carried out with several sessions exported
+concurrently.
+"""
+import logging
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+from .assignment_solver import solve_assignments
+from .reader_selector import ReaderSelector
+
+log = logging.getLogger(__name__)
+
+# Records the planned assignment of a session to a reader project
+PLANNED_ASSIGNMENT_TEMPLATE = {
+    "session_id": None,
+    "session_label": None,
+    "subject_id": None,
+    "project_id": None,
+    "project_label": None,
+    "reader_id": None,
+    "resumed": False,
+}
+
+
+class AssignmentPlan:
+    """
+    The reader projects each session of a run is to be exported to.
+
+    Each entry of the plan is a dictionary with keys "session", "session_features",
+    "project_ids", and "resumed". Iterating over the plan yields the entries in the
+    order the sessions were planned.
+
+    Args:
+        dest_projects_df (pandas.DataFrame): Dataframe recording the reader projects
+    """
+
+    def __init__(self, dest_projects_df):
+        self._projects = {
+            project_id: (label, reader_id)
+            for project_id, label, reader_id in zip(
+                dest_projects_df.id, dest_projects_df.label, dest_projects_df.reader_id
+            )
+        }
+        self.entries = []
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def num_assignments(self):
+        """int: The number of planned assignments."""
+        return sum(len(entry["project_ids"]) for entry in self.entries)
+
+    def add(self, session, session_features, project_ids, resumed=False):
+        """
+        Add the assignments of a session to the plan.
+
+        Args:
+            session (flywheel.Session): The session to export
+            session_features (dict): The session features of the session
+            project_ids (list): The ids of the reader projects to export the session to
+            resumed (bool, optional): Whether the assignments resume exports
+                interrupted in an earlier run. Defaults to False.
+        """
+        self.entries.append(
+            {
+                "session": session,
+                "session_features": session_features,
+                "project_ids": list(project_ids),
+                "resumed": resumed,
+            }
+        )
+
+    def subject_groups(self):
+        """
+        Return the entries of the plan grouped by the subject of their session.
+
+        Sessions of the same subject are exported one after the other, so that they
+        do not race to create the subject in a reader project.
+
+        Returns:
+            list: Lists of entries, in the order their subjects were first planned
+        """
+        groups = OrderedDict()
+        for entry in self.entries:
+            subject_id = entry["session"].parents["subject"]
+            groups.setdefault(subject_id, []).append(entry)
+        return list(groups.values())
+
+    def to_dataframe(self):
+        """
+        Return the planned assignments as a dataframe.
+
+        Returns:
+            pandas.DataFrame: A PLANNED_ASSIGNMENT_TEMPLATE record per assignment
+        """
+        records = []
+        for entry in self.entries:
+            session = entry["session"]
+            for project_id in entry["project_ids"]:
+                label, reader_id = self._projects.get(project_id, (None, None))
+                record = PLANNED_ASSIGNMENT_TEMPLATE.copy()
+                record["session_id"] = session.id
+                record["session_label"] = session.label
+                record["subject_id"] = session.parents["subject"]
+                record["project_id"] = project_id
+                record["project_label"] = label
+                record["reader_id"] = reader_id
+                record["resumed"] = entry["resumed"]
+                records.append(record)
+
+        return pd.DataFrame(records, columns=list(PLANNED_ASSIGNMENT_TEMPLATE))
+
+
+def plan_assignments(
+    sessions, dest_projects_df, journal=None, solver="greedy", rng=None
+):
+    """
+    Plan the assignment of sessions to reader projects.
+
+    Exports interrupted in an earlier run are planned to the same readers, unless the
+    session already records their assignment, in which case they are removed from the
+    journal. The remaining coverage of each session
+    is then selected from the other readers, without replacement and least-loaded
+    first, or by the flow solver.
+
+    Args:
+        sessions (iterable): The sessions (flywheel.Session) to plan, each with its
+            session features, as (session, session_features) pairs
+        dest_projects_df (pandas.DataFrame): Dataframe recording projects and their
+            assigned sessions
+        journal (ExportJournal, optional): The journal of the session exports.
+            Defaults to None.
+        solver (str, optional): One of ASSIGNMENT_SOLVERS. Defaults to "greedy".
+        rng (numpy.random.Generator, optional): The random number generator of the
+            plan. The same plan is produced from the same sessions, readers, and
+            generator state. Defaults to None, the global numpy.random state.
+
+    Returns:
+        AssignmentPlan: The planned assignments of each session
+    """
+    reader_selector = ReaderSelector(dest_projects_df, rng=rng)
+    project_ids = set(dest_projects_df.id)
+    plan = AssignmentPlan(dest_projects_df)
+
+    # The session features of each entry, with the resumed exports as assignments
+    selection_features = []
+    for session, session_features in sessions:
+        assigned_projs = {
+            assignment["project_id"] for assignment in session_features["assignments"]
+        }
+        pending_projs = []
+        if journal is not None:
+            for project_id in journal.pending_projects(session.id):
+                if project_id in assigned_projs:
+                    # The assignment was recorded before the journal was checkpointed
+                    journal.remove(session.id, project_id)
+                elif project_id in project_ids:
+                    pending_projs.append(project_id)
+        # The remaining coverage is selected from the other readers
+        features = dict(
+            session_features,
+            assignments=session_features["assignments"]
+            + [{"project_id": project_id} for project_id in pending_projs],
+        )
+        selection_features.append(features)
+
+        assign_reader_projs = list(pending_projs)
+        needs_readers = len(features["assignments"]) < features["case_coverage"]
+        if solver == "greedy" and needs_readers:
+            # select available readers to receive the session
+            assign_reader_projs.extend(reader_selector.select(features))
+
+        # Planned assignments count against the capacity of the readers
+        for project_id in assign_reader_projs:
+            reader_selector.record_assignment(project_id)
+        plan.add(
+            session, session_features, assign_reader_projs, resumed=bool(pending_projs)
+        )
+
+    if solver == "flow":
+        planned = Counter(
+            project_id for entry in plan for project_id in entry["project_ids"]
+        )
+        solved = solve_assignments(
+            selection_features, dest_projects_df, planned=planned, rng=rng
+        )
+        for entry, assign_reader_projs in zip(plan, solved):
+            entry["project_ids"].extend(assign_reader_projs)
+
+    log.info(
+        "Planned %i assignments of %i sessions to %i reader projects.",
+        plan.num_assignments,
+        len(plan),
+        len(project_ids),
+    )
+
+    return plan
@@ -0,0 +1,224 @@
+"""
+Assignment of sessions to reader projects as a flow problem.
+
+Each session needs case_coverage distinct readers and each reader can receive up to
+max_cases sessions. The greedy selection of readers, one session at a time, can strand
+sessions below their case_coverage when the capacities of the readers are uneven. The
+solver instead assigns all sessions at once by finding a maximum flow in a network:
+
+    source -> session class -> reader project -> sink
+
+Sessions with the same need and the same readers already assigned are interchangeable,
+and are represented by a single class node. A class of n sessions can send at most n
+assignments to each reader, which ensures that the flow can be split into sessions
+with distinct readers.
+
+The capacity of each reader to the sink is raised one assignment at a time, from the
+lowest level at which all assignments could fit. The resulting flow assigns as many
+sessions as possible, with the most loaded reader as lightly loaded as possible.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# The solvers used to assign sessions to reader projects
+ASSIGNMENT_SOLVERS = ["greedy", "flow"]
+
+_SOURCE = 0
+_SINK = 1
+
+
+class _FlowNetwork:
+    """A flow network with integer capacities, solved with Dinic's algorithm."""
+
+    def __init__(self, num_nodes):
+        self._edges = [[] for _ in range(num_nodes)]
+        self._to = []
+        self._capacity = []
+
+    def add_edge(self, u, v, capacity):
+        """Add an edge from u to v, returning its index."""
+        edge = len(self._to)
+        self._to.extend([v, u])
+        self._capacity.extend([capacity, 0])
+        self._edges[u].append(edge)
+        self._edges[v].append(edge + 1)
+        return edge
+
+    def add_capacity(self, edge, capacity):
+        self._capacity[edge] += capacity
+
+    def flow(self, edge):
+        """Return the flow through an edge."""
+        return self._capacity[edge ^ 1]
+
+    def _levels(self):
+        level = [-1] * len(self._edges)
+        level[_SOURCE] = 0
+        queue = [_SOURCE]
+        for node in queue:
+            for edge in self._edges[node]:
+                v = self._to[edge]
+                if self._capacity[edge] > 0 and level[v] < 0:
+                    level[v] = level[node] + 1
+                    queue.append(v)
+        return level
+
+    def _augment(self, level, next_edge):
+        """Push flow along a single path of the level graph."""
+        path = []
+        node = _SOURCE
+        while node != _SINK:
+            edges = self._edges[node]
+            while next_edge[node] < len(edges):
+                edge = edges[next_edge[node]]
+                if self._capacity[edge] > 0 and level[self._to[edge]] == level[node] + 1:
+                    break
+                next_edge[node] += 1
+            else:
+                # A dead end is removed from the level graph
+                if not path:
+                    return 0
+                level[node] = -1
+                node = self._to[path.pop() ^ 1]
+                next_edge[node] += 1
+                continue
+            path.append(edge)
+            node = self._to[edge]
+
+        pushed = min(self._capacity[edge] for edge in path)
+        for edge in path:
+            self._capacity[edge] -= pushed
+            self._capacity[edge ^ 1] += pushed
+        return pushed
+
+    def max_flow(self):
+        """Augment the current flow to a maximum flow, returning the flow added."""
+        total = 0
+        while True:
+            level = self._levels()
+            if level[_SINK] < 0:
+                return total
+            next_edge = [0] * len(self._edges)
+            pushed = self._augment(level, next_edge)
+            while pushed:
+                total += pushed
+                pushed = self._augment(level, next_edge)
+
+
+def _build_network(classes, readers, reader_capacities):
+    network = _FlowNetwork(2 + len(classes) + len(readers))
+    class_edges = []
+    for index, ((need, excluded), members) in enumerate(classes.items()):
+        class_node = 2 + index
+        network.add_edge(_SOURCE, class_node, need * len(members))
+        edges = {}
+        for position, (project_id, load, max_cases) in enumerate(readers):
+            if project_id not in excluded and load < max_cases:
+                edges[position] = network.add_edge(
+                    class_node, 2 + len(classes) + position, len(members)
+                )
+        class_edges.append(edges)
+    sink_edges = [
+        network.add_edge(2 + len(classes) + position, _SINK, capacity)
+        for position, capacity in enumerate(reader_capacities)
+    ]
+    return network, class_edges, sink_edges
+
+
+def solve_assignments(session_features, dest_projects_df, planned=None, rng=None):
+    """
+    Assign sessions to reader projects, covering as many sessions as possible.
+
+    Args:
+        session_features (list): The session features of each session to assign
+        dest_projects_df (pandas.DataFrame): Dataframe recording projects and their
+            assigned sessions
+        planned (dict, optional): The number of assignments already planned for each
+            reader project, by project id. Defaults to None.
+        rng (numpy.random.Generator, optional): The random number generator pairing
+            sessions with readers. Defaults to None, the global numpy.random state.
+
+    Returns:
+        list: For each session, a list of ids of the reader projects to populate with
+            the session
+    """
+    planned = planned or {}
+    rng = rng if rng is not None else np.random
+    readers = [
+        (
+            project_id,
+            int(num_assignments) + planned.get(project_id, 0),
+            0 if pd.isna(max_cases) else int(max_cases),
+        )
+        for project_id, num_assignments, max_cases in zip(
+            dest_projects_df.id,
+            dest_projects_df.num_assignments,
+            dest_projects_df.max_cases,
+        )
+    ]
+
+    # Interchangeable sessions are grouped in classes by need and readers assigned
+    classes = {}
+    for index, features in enumerate(session_features):
+        excluded = frozenset(
+            assignment["project_id"] for assignment in features["assignments"]
+        )
+        need = min(features["case_coverage"] - len(excluded), len(readers))
+        if need > 0:
+            classes.setdefault((need, excluded), []).append(index)
+
+    assignments = [[] for _ in session_features]
+    if not classes:
+        return assignments
+
+    # The maximum number of assignments, with every reader filled to capacity
+    network, _, _ = _build_network(
+        classes, readers, [max(max_cases - load, 0) for _, load, max_cases in readers]
+    )
+    max_assignments = network.max_flow()
+
+    # The lowest level of load at which all of the assignments could fit
+    level = min(load for _, load, _ in readers)
+    while (
+        sum(max(min(level, max_cases) - load, 0) for _, load, max_cases in readers)
+        < max_assignments
+    ):
+        level += 1
+
+    # Raise the capacity of the readers one level at a time
+    network, class_edges, sink_edges = _build_network(
+        classes,
+        readers,
+        [max(min(level, max_cases) - load, 0) for _, load, max_cases in readers],
+    )
+    num_assignments = network.max_flow()
+    while num_assignments < max_assignments:
+        level += 1
+        for position, (_, load, max_cases) in enumerate(readers):
+            if load < level <= max_cases:
+                network.add_capacity(sink_edges[position], 1)
+        num_assignments += network.max_flow()
+
+    log.info(
+        "Solved %i assignments of %i sessions, with at most %i sessions per reader.",
+        num_assignments,
+        len(session_features),
+        level,
+    )
+
+    # Split the flow of each class into sessions. The assignments to each reader are
+    # dealt to consecutive sessions, so that no session receives a reader twice.
+    for members, edges in zip(classes.values(), class_edges):
+        units = []
+        for position in rng.permutation(len(readers)):
+            if position in edges:
+                units.extend([readers[position][0]] * network.flow(edges[position]))
+        members = [members[i] for i in rng.permutation(len(members))]
+        for unit, project_id in enumerate(units):
+            assignments[members[unit % len(members)]].append(project_id)
+
+    return assignments
@@ -0,0 +1,197 @@
+"""
+A run-scoped cache of Flywheel containers.
+
+The gears in this suite retrieve the same projects, subjects, sessions, and
+acquisitions many times over a single run. The ContainerCache wraps the Flywheel client
+and serves repeated lookups of a container from memory until that container is
+explicitly invalidated.
+"""
+import logging
+import threading
+
+from .reader_index import ReaderIndex
+from .role_registry import RoleRegistry
+from .subject_index import SubjectIndex
+
+log = logging.getLogger(__name__)
+
+
+class ContainerCache:
+    """
+    Wraps a Flywheel client to serve repeated container lookups from memory.
+
+    Containers are keyed by their id and remain valid for the duration of a single gear
+    run. Any operation that modifies a container (e.g. `update_info`, `add_subject`,
+    `add_session`, `add_acquisition`, `upload_file`) must be followed by `invalidate`
+    so that the next lookup retrieves a fresh copy from the instance.
+
+    The roles of the instance are loaded once and served by `roles`, a RoleRegistry.
+    The reader projects of a reader group are indexed once by `reader_index`, and the
+    subjects of a project once by `subject_index`.
+
+    All attributes not defined here are forwarded to the wrapped client. Therefore, a
+    ContainerCache can be passed anywhere a `flywheel.Client` is expected.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+    """
+
+    def __init__(self, fw_client):
+        self._fw_client = fw_client
+        self._containers = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.roles = RoleRegistry(fw_client)
+        self._reader_indexes = {}
+        self._subject_indexes = {}
+
+    def __getattr__(self, name):
+        return getattr(self._fw_client, name)
+
+    @property
+    def client(self):
+        """flywheel.Client: The wrapped Flywheel client."""
+        return self._fw_client
+
+    def _get_cached(self, container_id, getter):
+        with self._lock:
+            container = self._containers.get(container_id)
+            if container is not None:
+                self.hits += 1
+                return container
+            self.misses += 1
+
+        container = getter(container_id)
+
+        with self._lock:
+            self._containers[container_id] = container
+
+        return container
+
+    def get(self, container_id):
+        """
+        Return the container with the given id, retrieving it only if not cached.
+
+        Args:
+            container_id (str): The id of any Flywheel container
+
+        Returns:
+            flywheel.container: The fully populated container
+        """
+        return self._get_cached(container_id, self._fw_client.get)
+
+    def get_group(self, group_id):
+        return self._get_cached(group_id, self._fw_client.get_group)
+
+    def get_project(self, project_id):
+        return self._get_cached(project_id, self._fw_client.get_project)
+
+    def get_subject(self, subject_id):
+        return self._get_cached(subject_id, self._fw_client.get_subject)
+
+    def get_session(self, session_id):
+        return self._get_cached(session_id, self._fw_client.get_session)
+
+    def get_acquisition(self, acquisition_id):
+        return self._get_cached(acquisition_id, self._fw_client.get_acquisition)
+
+    def get_all_roles(self):
+        """
+        Return all roles on the instance, retrieving them only once per run.
+
+        Returns:
+            list: All roles (flywheel.RoleOutput) defined on the instance
+        """
+        return self.roles.roles
+
+    def reader_index(self, group_id):
+        """
+        Return the index of the reader projects in a group, building it on first use.
+
+        Args:
+            group_id (str): The id of the reader group
+
+        Returns:
+            ReaderIndex: The index of the reader projects in the group
+        """
+        with self._lock:
+            reader_index = self._reader_indexes.get(group_id)
+        if reader_index is None:
+            reader_index = ReaderIndex(self, group_id)
+            with self._lock:
+                self._reader_indexes[group_id] = reader_index
+        return reader_index
+
+    def subject_index(self, project):
+        """
+        Return the index of the subjects in a project, building it on first use.
+
+        Args:
+            project (flywheel.Project): The project of the subjects
+
+        Returns:
+            SubjectIndex: The index of the subjects in the project
+        """
+        with self._lock:
+            subject_index = self._subject_indexes.get(project.id)
+        if subject_index is None:
+            subject_index = SubjectIndex(self, project)
+            with self._lock:
+                subject_index = self._subject_indexes.setdefault(
+                    project.id, subject_index
+                )
+        return subject_index
+
+    def delete_subject(self, subject_id):
+        """
+        Delete a subject, removing it from the cache and the subject indexes.
+
+        Args:
+            subject_id (str): The id of the subject to delete
+        """
+        self._fw_client.delete_subject(subject_id)
+        self.invalidate(subject_id)
+        with self._lock:
+            subject_indexes = list(self._subject_indexes.values())
+        for subject_index in subject_indexes:
+            subject_index.discard(subject_id)
+
+    def reload(self, container):
+        """
+        Return the fully populated version of a container (e.g. from a finder).
+
+        This replaces `container.reload()`, which always makes a round trip to the
+        instance.
+
+        Args:
+            container (flywheel.container): A container with at least an `id`
+
+        Returns:
+            flywheel.container: The fully populated container
+        """
+        return self.get(container.id)
+
+    def invalidate(self, *container_ids):
+        """
+        Remove containers from the cache so that they are retrieved again on next use.
+
+        Args:
+            *container_ids (str): The ids of the containers that have been modified
+        """
+        with self._lock:
+            for container_id in container_ids:
+                self._containers.pop(container_id, None)
+
+    def clear(self):
+        """Remove all containers from the cache."""
+        with self._lock:
+            self._containers.clear()
+
+    def log_summary(self):
+        """Log the cache hit/miss counts for this run."""
+        log.info(
+            "Container cache: %i lookups served from cache, %i retrieved from instance.",
+            self.hits,
+            self.misses,
+        )
@@ -4,11 +4,13 @@ groups, projects, sessions, and acquisitions. File operations are handled in a
 different module.
 """
 import logging
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import flywheel
+import pandas as pd
 
-from .file_operations import _export_files
+from .file_operations import _export_files, _fan_out_files
 
 log = logging.getLogger(__name__)
 
@@ -52,9 +54,49 @@ SESSION_KEYS = [
     "timezone",
     "weight",
     "uid",
+    "tags",
 ]
 
-ACQUISITION_KEYS = ["info", "label", "timestamp", "timezone", "uid"]
+ACQUISITION_KEYS = ["info", "label", "timestamp", "timezone", "uid", "tags"]
+
+# Maximum number of acquisitions of a session exported concurrently
+MAX_EXPORT_WORKERS = 4
+
+# Maximum number of containers deleted concurrently in a cleanup
+MAX_CLEANUP_WORKERS = 8
+
+# Records the outcome of deleting each created container in a cleanup
+CLEANUP_RECORD_TEMPLATE = {"container": None, "id": None, "status": None, "error": ""}
+
+
+class CleanupReport:
+    """Records the outcome of deleting each container cleaned up in a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def add(self, records):
+        """
+        Add the records of a cleanup to the report.
+
+        Args:
+            records (list): The CLEANUP_RECORD_TEMPLATE of each container
+        """
+        with self._lock:
+            self.records.extend(records)
+
+    def report(self):
+        """
+        Return a report of the cleanups of the run.
+
+        Returns:
+            pandas.DataFrame: One row for each container with the columns of
+                CLEANUP_RECORD_TEMPLATE
+        """
+        with self._lock:
+            records = list(self.records)
+        return pd.DataFrame(records, columns=CLEANUP_RECORD_TEMPLATE.keys())
 
 
 def define_export(fw_client, container, dest_project):
@@ -124,35 +166,96 @@ def define_created(container):
     return created_container
 
 
-def _cleanup(fw_client, created_data):
+def _delete_containers(fw_client, containers, delete, max_workers):
+    """
+    Delete containers of a single level concurrently, continuing past failures.
+
+    Args:
+        fw_client (flywheel.Client): The Flywheel Client
+        containers (list): The CREATED_CONTAINER_TEMPLATE instances to delete
+        delete (callable): Deletes a container, given its id
+        max_workers (int): Maximum number of containers deleted concurrently
+
+    Returns:
+        list: The CLEANUP_RECORD_TEMPLATE of each container
+    """
+
+    def delete_container(container):
+        log.debug(container)
+        record = CLEANUP_RECORD_TEMPLATE.copy()
+        record["container"] = container["container"]
+        record["id"] = container["id"]
+        try:
+            delete(container["id"])
+            fw_client.invalidate(container["id"])
+            record["status"] = "deleted"
+        except Exception as e:
+            log.warning(
+                "Could not delete %s %s: %s", container["container"], container["id"], e
+            )
+            record["status"] = "failed"
+            record["error"] = str(e)
+        return record
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        return list(executor.map(delete_container, containers))
+
+
+def _cleanup(
+    fw_client,
+    created_data,
+    max_workers=MAX_CLEANUP_WORKERS,
+    cleanup_report=None,
+):
     """
     In the case of a failure, cleanup all containers that were created.
 
+    Acquisitions, then sessions, then subjects are deleted, with the containers of each
+    level deleted concurrently. A container that cannot be deleted does not stop the
+    cleanup of the others. The outcome for each container is added to the cleanup
+    report.
+
     Args:
         fw_client (flywheel.Client): The Flywheel Client
         created_data (dict): A list of CREATED_CONTAINER_TEMPLATE instances
-    """
+        max_workers (int, optional): Maximum number of containers deleted
+            concurrently. Defaults to MAX_CLEANUP_WORKERS.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
 
-    acquisitions = [x for x in created_data if x["container"] == "acquisition"]
-    if acquisitions:
-        log.info("Deleting %i acquisition containers", len(acquisitions))
-        for a in acquisitions:
-            log.debug(a)
-            fw_client.delete_acquisition(a["id"])
+    Returns:
+        list: The CLEANUP_RECORD_TEMPLATE of each container
+    """
+    levels = [
+        ("acquisition", fw_client.delete_acquisition),
+        ("session", fw_client.delete_session),
+        ("subject", fw_client.delete_subject),
+    ]
+    records = []
+    for container_type, delete in levels:
+        containers = [
+            x
+            for x in created_data
+            if x["container"] == container_type
+            and (container_type != "subject" or x["new"])
+        ]
+        if containers:
+            log.info("Deleting %i %s containers", len(containers), container_type)
+            records.extend(
+                _delete_containers(fw_client, containers, delete, max_workers)
+            )
 
-    sessions = [x for x in created_data if x["container"] == "session"]
-    if sessions:
-        log.info("Deleting %i session containers", len(sessions))
-        for s in sessions:
-            log.debug(s)
-            fw_client.delete_session(s["id"])
+    failed = [x for x in records if x["status"] == "failed"]
+    if failed:
+        log.error(
+            "%i of %i created containers could not be deleted.",
+            len(failed),
+            len(records),
+        )
+    if cleanup_report is not None:
+        cleanup_report.add(records)
 
-    subjects = [x for x in created_data if x["container"] == "subject" and x["new"]]
-    if subjects:
-        log.info("Deleting %i subject containers", len(subjects))
-        for s in subjects:
-            log.debug(s)
-            fw_client.delete_subject(s["id"])
+    return records
 
 
 def find_or_create_group(fw_client, group_id, group_label):
@@ -171,7 +274,7 @@ def find_or_create_group(fw_client, group_id, group_label):
 
     if len(found_groups) > 0:
         log.info(f"Found Existing Group {group_id}")
-        return found_groups[0].reload(), []
+        return fw_client.reload(found_groups[0]), []
     
     log.info(f"No existing group {group_id}, creating...")
     group_id = fw_client.add_group(flywheel.Group(group_id, group_label))
@@ -180,7 +283,7 @@ def find_or_create_group(fw_client, group_id, group_label):
 
     created_container = define_created(group)
 
-    return group.reload(), [created_container]
+    return fw_client.reload(group), [created_container]
 
 
 def create_project(fw_client, project_label, group, user_id, project_info={}):
@@ -207,10 +310,8 @@ def create_project(fw_client, project_label, group, user_id, project_info={}):
     new_project.update_info(project_info)
 
     # Get the generic "read-write" role and apply to the user for this project
-    rw_role = [
-        role for role in fw_client.get_all_roles() if role.label == "read-write"
-    ][0]
-    user_permission = {"_id": user_id, "role_ids": [rw_role.id]}
+    rw_role_id = fw_client.roles.read_write_id
+    user_permission = {"_id": user_id, "role_ids": [rw_role_id]}
     new_project.add_permission(user_permission)
 
     created_container = define_created(new_project)
@@ -237,7 +338,8 @@ def export_or_find_subject(fw_client, source_subject, dest_project):
     """
     subj_export = define_export(fw_client, source_subject, dest_project)
 
-    dest_subject = dest_project.subjects.find_first(f'code="{source_subject.code}"')
+    subject_index = fw_client.subject_index(dest_project)
+    dest_subject = subject_index.get(source_subject.code)
     if not dest_subject:
         log.info(
             "Subject %s does not exist in project %s.",
@@ -245,41 +347,28 @@ def export_or_find_subject(fw_client, source_subject, dest_project):
             dest_project.label,
         )
         log.info("CREATING SUBJECT CONTAINER")
-        subj_export["status"] = "created"
         subject_metadata = {}
         for key in SUBJECT_KEYS:
             value = source_subject.get(key)
             if value:
                 subject_metadata[key] = value
 
-        # Attempt to create the subject. This may fail as a batch-run could
-        # result in the subject having been created already, thus we try/except
-        # and look for the subject again.
-        try:
-            dest_subject = dest_project.add_subject(subject_metadata)
+        # The subject may have been created by another job of a batch-run since the
+        # project was indexed, in which case the existing subject is used.
+        dest_subject, created = subject_index.create(subject_metadata)
+        if created:
             log.info("Created %s in %s", dest_subject.code, dest_project.label)
-
+            subj_export["status"] = "created"
             created_container = define_created(dest_subject)
-
-        except flywheel.ApiException as e:
-            log.warning(
-                "Could not generate subject: {} -- {}".format(e.status, e.reason)
-            )
-            log.info("Attempting to find subject...")
-            time.sleep(2)
-            dest_subject = dest_project.subjects.find_first(
-                f'code="{source_subject.code}"'
+        else:
+            log.info(
+                "... found existing subject %s in project: %s. "
+                "Using existing container.",
+                dest_subject.code,
+                dest_project.label,
             )
-            if dest_subject:
-                log.info(
-                    "... found existing subject %s in project: %s. "
-                    "Using existing container.",
-                    dest_subject.code,
-                    dest_project.label,
-                )
-                subj_export["status"] = "used existing"
-            else:
-                raise
+            subj_export["status"] = "used existing"
+            created_container = None
     else:
         log.info(
             "Found existing subject %s in project: %s. Using existing container.",
@@ -292,122 +381,137 @@ def export_or_find_subject(fw_client, source_subject, dest_project):
     return dest_subject, subj_export, created_container
 
 
-def export_session(fw_client, source_session, dest_project, export_info=False):
-
+def _create_dest_session(
+    fw_client,
+    source_session,
+    dest_project,
+    exported_data,
+    created_data,
+    export_info=False,
+):
     """
-    Export a session (source_session) to project (dest_project).
+    Create the subject (if not found) and session of source_session in dest_project.
 
     Args:
         fw_client (flywheel.Client): Flywheel Client object instantiated on instance
         source_session (flywheel.Session): The session to be exported.
         dest_project (flywheel.Project): The destination project receiving the
             source session
+        exported_data (list): Receives the EXPORTED_CONTAINER_TEMPLATE of the subject
+            and session
+        created_data (list): Receives the CREATED_CONTAINER_TEMPLATE of the created
+            subject and session
         export_info (bool, optional): Export session info or not. Defaults to False.
 
     Returns:
-        tuple:  dest_session(flywheel.Session),
-                exported_data(EXPORTED_CONTAINER_TEMPLATE),
-                created_data (CREATED_CONTAINER_TEMPLATE)
+        flywheel.Session: The created session
     """
-    exported_data = []
-
-    # specific information about each container created, for ease of deletion on failure
-    created_data = []
-
     source_subject = source_session.subject
-    try:
-        ########################################################################
-        # Create Subject
-        # export subject to new project, if the subject exists in that project,
-        # use that subject
+    ########################################################################
+    # Create Subject
+    # export subject to new project, if the subject exists in that project,
+    # use that subject
+
+    dest_subject, subj_export, created_container = export_or_find_subject(
+        fw_client, source_subject, dest_project
+    )
+
+    exported_data.append(subj_export)
+
+    if created_container:
+        created_data.append(created_container)
+    ########################################################################
+    # Create the dest_session
+    log.info(
+        "CREATING SESSION CONTAINER %s IN %s/%s",
+        source_session.label,
+        dest_project.label,
+        source_subject.label,
+    )
+    session_export = define_export(fw_client, source_session, dest_project)
+
+    session_metadata = {}
+    for key in SESSION_KEYS:
+        if not (key == "info" and export_info is False):
+            value = source_session.get(key)
+            if value:
+                session_metadata[key] = value
 
-        dest_subject, subj_export, created_container = export_or_find_subject(
-            fw_client, source_subject, dest_project
-        )
+    # Add session, with its tags, to the subject
+    dest_session = dest_subject.add_session(session_metadata)
+    fw_client.invalidate(dest_subject.id)
+    created_container = define_created(dest_session)
 
-        exported_data.append(subj_export)
+    exported_data.append(session_export)
 
-        if created_container:
-            created_data.append(created_container)
-        ########################################################################
-        # Create the dest_session
-        log.info(
-            "CREATING SESSION CONTAINER %s IN %s/%s",
-            source_session.label,
-            dest_project.label,
-            source_subject.label,
-        )
-        session_export = define_export(fw_client, source_session, dest_project)
-
-        session_metadata = {}
-        for key in SESSION_KEYS:
-            if not (key == "info" and export_info is False):
-                value = source_session.get(key)
-                if value:
-                    session_metadata[key] = value
-
-        # Add session to the subject
-        dest_session = dest_subject.add_session(session_metadata)
-        created_container = define_created(dest_session)
-
-        for tag in source_session.tags:
-            dest_session.add_tag(tag)
-
-        exported_data.append(session_export)
-
-        if created_container:
-            created_data.append(created_container)
-        ########################################################################
-        # For each acquisition, create the export_acquisition, upload and modify
-        # the files
-        num_acq = len(source_session.acquisitions())
-        log.info("EXPORTING %i ACQUISITIONS...", num_acq)
-        acq_count = 0
-        if num_acq == 0:
-            log.warning(
-                "NO ACQUISITIONS FOUND ON THE SESSION! "
-                "Resulting session will have no acquisitions."
-            )
-        for source_acquisition in source_session.acquisitions():
-            acq_count += 1
-            log.info("ACQUISITION %i/%i", acq_count, num_acq)
-            log.info(
-                "CREATING ACQUISITION CONTAINER: [label=%s]", source_acquisition.label
-            )
-            source_acquisition = source_acquisition.reload()
-            _, acq_export, created_container = export_acquisition(
-                fw_client, source_acquisition, dest_session
-            )
-            exported_data.append(acq_export)
+    if created_container:
+        created_data.append(created_container)
+
+    return dest_session
 
-            if created_container:
-                created_data.append(created_container)
 
-        log.info("All acquisitions exported.")
-        source_session = source_session.reload()
-        # if 'EXPORTED' not in source_session.get('tags', []):
-        #     log.info(
-        #         'Adding "EXPORTED" tag to %s.',
-        #         source_session.label
-        #     )
-        #     source_session.add_tag('EXPORTED')
+def export_session(
+    fw_client,
+    source_session,
+    dest_project,
+    export_info=False,
+    max_workers=MAX_EXPORT_WORKERS,
+    transfer_engine=None,
+    journal=None,
+    cleanup_report=None,
+):
 
-        return dest_session, exported_data, created_data
-    except Exception as e:
-        log.exception("ERRORS DETECTED exporting session, %s", source_session.label)
-        log.info("CLEANING UP...")
-        _cleanup(fw_client, created_data)
-        raise e
+    """
+    Export a session (source_session) to project (dest_project).
 
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        source_session (flywheel.Session): The session to be exported.
+        dest_project (flywheel.Project): The destination project receiving the
+            source session
+        export_info (bool, optional): Export session info or not. Defaults to False.
+        max_workers (int, optional): Maximum number of acquisitions exported
+            concurrently. Defaults to MAX_EXPORT_WORKERS.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        journal (ExportJournal, optional): Records the steps of the export, so that an
+            interrupted export is resumed. Defaults to None.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
 
-def export_acquisition(fw_client, source_acquisition, dest_session):
+    Returns:
+        tuple:  dest_session(flywheel.Session),
+                exported_data(EXPORTED_CONTAINER_TEMPLATE),
+                created_data (CREATED_CONTAINER_TEMPLATE)
     """
-    exports acquisition object, acquisition metadata, and acquisitions files
+    (export,) = export_session_to_projects(
+        fw_client,
+        source_session,
+        [dest_project],
+        export_info=export_info,
+        max_workers=max_workers,
+        transfer_engine=transfer_engine,
+        journal=journal,
+        cleanup_report=cleanup_report,
+    )
+    if isinstance(export, Exception):
+        raise export
+
+    return export
+
+
+def _create_dest_acquisition(
+    fw_client, source_acquisition, dest_session, created_data=None
+):
+    """
+    Create the acquisition of source_acquisition, without its files, in dest_session.
 
     Args:
         fw_client (flywheel.Client): Flywheel Client object instantiated on instance
         source_acquisition (flywheel.Acquisition): Flywheel acquisition to export
         dest_session (flywheel.Session): Flywheel session to receive source acquisition
+        created_data (list, optional): If provided, the created acquisition is
+            recorded here. Defaults to None.
 
     Returns:
         tuple:  dest_acquisition(flywheel.Acquisition),
@@ -425,19 +529,343 @@ def export_acquisition(fw_client, source_acquisition, dest_session):
         if value:
             acquisition_metadata[key] = value
 
-    # Add acquisition to the session
+    # Add acquisition, with its tags, to the session
     dest_acquisition = dest_session.add_acquisition(acquisition_metadata)
+    fw_client.invalidate(dest_session.id)
 
     created_container = define_created(dest_acquisition)
-    
-    source_tags = source_acquisition.tags
-    
-    if source_tags is not None:
-        for tag in source_acquisition.tags:
-            dest_acquisition.add_tag(tag)
+    if created_data is not None:
+        created_data.append(created_container)
+
+    return dest_acquisition, acquisition_export, created_container
+
+
+def export_acquisition(
+    fw_client,
+    source_acquisition,
+    dest_session,
+    created_data=None,
+    transfer_engine=None,
+):
+    """
+    exports acquisition object, acquisition metadata, and acquisitions files
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        source_acquisition (flywheel.Acquisition): Flywheel acquisition to export
+        dest_session (flywheel.Session): Flywheel session to receive source acquisition
+        created_data (list, optional): If provided, the created acquisition is
+            recorded here before its files are exported, so that it can be cleaned up
+            if the export of its files fails. Defaults to None.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+
+    Returns:
+        tuple:  dest_acquisition(flywheel.Acquisition),
+                acquisition_export(EXPORTED_CONTAINER_TEMPLATE),
+                created_container(CREATED_CONTAINER_TEMPLATE)
+    """
+    dest_acquisition, acquisition_export, created_container = _create_dest_acquisition(
+        fw_client, source_acquisition, dest_session, created_data
+    )
 
     # Export the individual files in each acquisition
     log.info("Exporting files to %s...", dest_acquisition.label)
-    _export_files(fw_client, source_acquisition, dest_acquisition)
+    _export_files(fw_client, source_acquisition, dest_acquisition, transfer_engine)
 
     return dest_acquisition, acquisition_export, created_container
+
+
+def _find_container(fw_client, container_id):
+    """Return a container created in an earlier run, or None if it was removed."""
+    try:
+        return fw_client.get(container_id)
+    except flywheel.ApiException:
+        return None
+
+
+def export_acquisition_to_sessions(
+    fw_client,
+    source_acquisition,
+    dest_sessions,
+    created_data,
+    transfer_engine=None,
+    journal=None,
+):
+    """
+    Export an acquisition to each of several sessions, downloading its files once.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        source_acquisition (flywheel.Acquisition): Flywheel acquisition to export
+        dest_sessions (list): Flywheel sessions (flywheel.Session) to receive the
+            source acquisition
+        created_data (list): For each of dest_sessions, the list receiving the
+            CREATED_CONTAINER_TEMPLATE of the created acquisition
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        journal (ExportJournal, optional): Records the steps of the export. An
+            acquisition, or file, exported in an earlier run is not exported again.
+            Defaults to None.
+
+    Returns:
+        list: For each of dest_sessions, the EXPORTED_CONTAINER_TEMPLATE of the
+            acquisition or the exception raised exporting it
+    """
+    source_session_id = source_acquisition.parents["session"]
+    results = [None] * len(dest_sessions)
+    dest_indices = []
+    dest_acquisitions = []
+    completed_files = []
+    for index, dest_session in enumerate(dest_sessions):
+        acq_entry = None
+        if journal is not None:
+            entry = journal.entry(source_session_id, dest_session.project) or {}
+            acq_entry = entry.get("acquisitions", {}).get(source_acquisition.id)
+        try:
+            dest_acquisition = None
+            if acq_entry and acq_entry["id"]:
+                dest_acquisition = _find_container(fw_client, acq_entry["id"])
+            if dest_acquisition is not None:
+                dest_project = fw_client.get(dest_session.project)
+                acquisition_export = define_export(
+                    fw_client, source_acquisition, dest_project
+                )
+                if acq_entry["status"] == "exported":
+                    log.info("%s was exported in an earlier run.", dest_acquisition.label)
+                    results[index] = acquisition_export
+                    continue
+                files = acq_entry["files"]
+            else:
+                dest_acquisition, acquisition_export, _ = _create_dest_acquisition(
+                    fw_client, source_acquisition, dest_session, created_data[index]
+                )
+                if journal is not None:
+                    journal.record_acquisition(
+                        source_session_id,
+                        dest_session.project,
+                        source_acquisition.id,
+                        dest_acquisition.id,
+                    )
+                files = []
+        except Exception as e:
+            results[index] = e
+            continue
+        results[index] = acquisition_export
+        dest_indices.append(index)
+        dest_acquisitions.append(dest_acquisition)
+        completed_files.append(files)
+
+    def record_file(index, transfer):
+        journal.record_file(
+            source_session_id,
+            dest_sessions[dest_indices[index]].project,
+            source_acquisition.id,
+            transfer["file"],
+        )
+
+    # Export the individual files in each acquisition
+    log.info("Exporting files to %i acquisitions...", len(dest_acquisitions))
+    errors = _fan_out_files(
+        fw_client,
+        source_acquisition,
+        dest_acquisitions,
+        transfer_engine,
+        completed=completed_files,
+        on_transfer=record_file if journal is not None else None,
+    )
+    for index, error in zip(dest_indices, errors):
+        if error:
+            results[index] = error
+        elif journal is not None:
+            journal.complete_acquisition(
+                source_session_id, dest_sessions[index].project, source_acquisition.id
+            )
+
+    if journal is not None:
+        journal.checkpoint()
+
+    return results
+
+
+def _resume_dest_session(fw_client, source_session, dest_project, journal):
+    """
+    Return the session created in dest_project by an export interrupted in an earlier
+    run, or None.
+    """
+    if journal is None:
+        return None
+    entry = journal.entry(source_session.id, dest_project.id)
+    if not entry or not entry["session"]:
+        return None
+    dest_session = _find_container(fw_client, entry["session"])
+    if dest_session is not None:
+        log.info(
+            "RESUMING EXPORT OF SESSION %s TO %s", source_session.label, dest_project.label
+        )
+    return dest_session
+
+
+def export_session_to_projects(
+    fw_client,
+    source_session,
+    dest_projects,
+    export_info=False,
+    max_workers=MAX_EXPORT_WORKERS,
+    transfer_engine=None,
+    journal=None,
+    cleanup_report=None,
+):
+    """
+    Export a session (source_session) to each of several projects (dest_projects).
+
+    Each file of the source session is downloaded once and uploaded to every
+    destination. The export to each project succeeds or fails on its own.
+
+    A failed export is cleaned up without affecting the exports to the other projects.
+    With a journal, each step of the exports is recorded, so that an export interrupted
+    in an earlier run is resumed from its last completed step. The containers of an
+    earlier run are not removed by the cleanup of a failed export.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        source_session (flywheel.Session): The session to be exported.
+        dest_projects (list): The destination projects (flywheel.Project) receiving
+            the source session
+        export_info (bool, optional): Export session info or not. Defaults to False.
+        max_workers (int, optional): Maximum number of acquisitions exported
+            concurrently. Defaults to MAX_EXPORT_WORKERS.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        journal (ExportJournal, optional): Records the steps of the exports. Defaults
+            to None.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
+
+    Returns:
+        list: For each of dest_projects, either the tuple
+            (dest_session, exported_data, created_data) of its export, as returned by
+            `export_session`, or the exception that caused it to fail
+    """
+    dest_sessions = [None] * len(dest_projects)
+    exported_data = [[] for _ in dest_projects]
+    created_data = [[] for _ in dest_projects]
+    errors = [None] * len(dest_projects)
+
+    for index, dest_project in enumerate(dest_projects):
+        try:
+            dest_session = _resume_dest_session(
+                fw_client, source_session, dest_project, journal
+            )
+            if dest_session is not None:
+                exported_data[index].append(
+                    define_export(fw_client, source_session.subject, dest_project)
+                )
+                exported_data[index].append(
+                    define_export(fw_client, source_session, dest_project)
+                )
+            else:
+                dest_session = _create_dest_session(
+                    fw_client,
+                    source_session,
+                    dest_project,
+                    exported_data[index],
+                    created_data[index],
+                    export_info=export_info,
+                )
+                if journal is not None:
+                    journal.record_session(
+                        source_session.id, dest_project.id, dest_session.id
+                    )
+            dest_sessions[index] = dest_session
+        except Exception as e:
+            errors[index] = e
+
+    if journal is not None:
+        journal.checkpoint()
+
+    source_acquisitions = source_session.acquisitions()
+    num_acq = len(source_acquisitions)
+    log.info(
+        "EXPORTING %i ACQUISITIONS TO %i PROJECTS...", num_acq, len(dest_projects)
+    )
+    if num_acq == 0:
+        log.warning(
+            "NO ACQUISITIONS FOUND ON THE SESSION! "
+            "Resulting session will have no acquisitions."
+        )
+
+    # The containers created by each export, by acquisition and destination
+    acq_created_data = [{} for _ in source_acquisitions]
+
+    def export(acq_index, source_acquisition):
+        # Destinations that have already failed are not exported to
+        dest_indices = [i for i, error in enumerate(errors) if error is None]
+        if not dest_indices:
+            return dest_indices, []
+        log.info("ACQUISITION %i/%i", acq_index + 1, num_acq)
+        log.info(
+            "CREATING ACQUISITION CONTAINERS: [label=%s]", source_acquisition.label
+        )
+        source_acquisition = fw_client.reload(source_acquisition)
+        results = export_acquisition_to_sessions(
+            fw_client,
+            source_acquisition,
+            [dest_sessions[i] for i in dest_indices],
+            [acq_created_data[acq_index].setdefault(i, []) for i in dest_indices],
+            transfer_engine=transfer_engine,
+            journal=journal,
+        )
+        return dest_indices, results
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        futures = [
+            executor.submit(export, acq_index, source_acquisition)
+            for acq_index, source_acquisition in enumerate(source_acquisitions)
+        ]
+        for future in futures:
+            try:
+                dest_indices, results = future.result()
+            except Exception as e:
+                dest_indices = [i for i, error in enumerate(errors) if error is None]
+                results = [e] * len(dest_indices)
+            for index, result in zip(dest_indices, results):
+                if isinstance(result, Exception):
+                    if errors[index] is None:
+                        errors[index] = result
+                else:
+                    exported_data[index].append(result)
+
+    for acq_created in acq_created_data:
+        for index, created in acq_created.items():
+            created_data[index].extend(created)
+
+    exports = []
+    for index, dest_project in enumerate(dest_projects):
+        if errors[index]:
+            log.error(
+                "ERRORS DETECTED exporting session, %s, to %s: %s",
+                source_session.label,
+                dest_project.label,
+                errors[index],
+            )
+            log.info("CLEANING UP...")
+            _cleanup(fw_client, created_data[index], cleanup_report=cleanup_report)
+            # An export whose session was removed by the cleanup has nothing to resume
+            if journal is not None and any(
+                created["container"] == "session" for created in created_data[index]
+            ):
+                journal.remove(source_session.id, dest_project.id)
+            exports.append(errors[index])
+        else:
+            log.info("All acquisitions exported to %s.", dest_project.label)
+            if journal is not None:
+                journal.complete_session(source_session.id, dest_project.id)
+            exports.append(
+                (dest_sessions[index], exported_data[index], created_data[index])
+            )
+
+    if journal is not None:
+        journal.checkpoint()
+
+    return exports
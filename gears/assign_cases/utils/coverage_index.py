@@ -0,0 +1,104 @@
+"""
+An index of the coverage of the sessions of a master project.
+
+The master project records the state of each case (session) in the "case_states" of its
+project_features, including the number of readers the session is assigned to and its
+case_coverage. An incremental run consults the index to skip the sessions that need no
+more readers, or that no reader with capacity can receive, without loading them.
+"""
+import logging
+from collections import Counter
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+
+class CoverageIndex:
+    """
+    Maps the sessions of a master project to their recorded case states.
+
+    Args:
+        case_states (list): The recorded case states of the master project, each with
+            the keys "id", "assigned", and "case_coverage"
+        dest_projects_df (pandas.DataFrame): Dataframe recording the reader projects
+            and their assigned sessions
+    """
+
+    def __init__(self, case_states, dest_projects_df):
+        self._states = {state["id"]: state for state in case_states}
+        # The number of reader projects with capacity, and of those holding a session
+        self._num_available = 0
+        self._holders = Counter()
+        for assignments, max_cases, num_assignments in zip(
+            dest_projects_df.assignments,
+            dest_projects_df.max_cases,
+            dest_projects_df.num_assignments,
+        ):
+            if pd.isna(max_cases) or num_assignments >= max_cases:
+                continue
+            self._num_available += 1
+            if isinstance(assignments, list):
+                self._holders.update(
+                    {assignment["source_session"] for assignment in assignments}
+                )
+
+    @classmethod
+    def from_project(cls, project, dest_projects_df):
+        """
+        Return the coverage index of a master project.
+
+        Args:
+            project (flywheel.Project): The master project
+            dest_projects_df (pandas.DataFrame): Dataframe recording the reader
+                projects and their assigned sessions
+
+        Returns:
+            CoverageIndex: The index of the recorded case states of the project
+        """
+        project_features = (project.info or {}).get("project_features") or {}
+        case_states = project_features.get("case_states") or []
+        log.debug(
+            "Indexed the coverage of %i sessions of project %s.",
+            len(case_states),
+            project.label,
+        )
+        return cls(case_states, dest_projects_df)
+
+    def __len__(self):
+        return len(self._states)
+
+    @property
+    def case_states(self):
+        """list: The recorded case states."""
+        return list(self._states.values())
+
+    def is_covered(self, session_id):
+        """
+        Return whether a session is recorded as assigned to case_coverage readers.
+
+        Sessions without a recorded case state (e.g. new sessions) are not covered.
+
+        Args:
+            session_id (str): The id of the session
+
+        Returns:
+            bool: Whether the session needs no more readers
+        """
+        state = self._states.get(session_id)
+        return state is not None and state["assigned"] >= state["case_coverage"]
+
+    def needs_assignment(self, session_id):
+        """
+        Return whether a session is under-covered and a reader can receive it.
+
+        Args:
+            session_id (str): The id of the session
+
+        Returns:
+            bool: Whether the session is to be processed in an incremental run
+        """
+        if self.is_covered(session_id):
+            return False
+        # A reader with capacity that does not yet hold the session
+        return self._holders[session_id] < self._num_available
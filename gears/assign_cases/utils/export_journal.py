@@ -0,0 +1,265 @@
+"""
+A durable journal of the sessions exported to reader projects.
+
+Each step of the export of a session to a reader project (the session, each
+acquisition, and each file) is recorded as it completes. The journal is checkpointed to
+an attachment of the master project, and to the output directory, so that a run that
+is interrupted can be resumed by the next run: completed steps are skipped and the
+containers already created are reused.
+
+An export remains in the journal until the assignment of the session has been recorded
+in the info of the master project session.
+"""
+import copy
+import io
+import json
+import logging
+import os
+import threading
+import time
+
+import flywheel
+
+log = logging.getLogger(__name__)
+
+# The name of the journal attachment of the master project
+JOURNAL_FILE = "export_journal.json"
+
+# Minimum number of seconds between checkpoints to the master project
+CHECKPOINT_SECONDS = 30
+
+# Records the export of a session to a reader project
+JOURNAL_ENTRY_TEMPLATE = {
+    "source_session": None,
+    "dest_project": None,
+    "session": None,
+    "status": "exporting",
+    "acquisitions": {},
+}
+
+# Records the export of an acquisition of the session
+JOURNAL_ACQUISITION_TEMPLATE = {"id": None, "status": "exporting", "files": []}
+
+
+def journal_key(source_session_id, dest_project_id):
+    """Return the key of the export of a session to a project."""
+    return f"{source_session_id}:{dest_project_id}"
+
+
+class ExportJournal:
+    """
+    Records the steps of each session export and checkpoints them.
+
+    Args:
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        project (flywheel.Project, optional): The master project the journal is
+            attached to. Defaults to None, no attachment.
+        output_dir (str, optional): The directory the journal is also written to.
+            Defaults to None.
+        entries (dict, optional): The entries of a journal loaded from a previous run.
+            Defaults to None, an empty journal.
+        checkpoint_seconds (int, optional): Minimum number of seconds between
+            checkpoints to the master project. Defaults to CHECKPOINT_SECONDS.
+    """
+
+    def __init__(
+        self,
+        fw_client,
+        project=None,
+        output_dir=None,
+        entries=None,
+        checkpoint_seconds=CHECKPOINT_SECONDS,
+    ):
+        self._fw_client = fw_client
+        self.project = project
+        self.output_dir = output_dir
+        self.entries = entries or {}
+        self.checkpoint_seconds = checkpoint_seconds
+        self._lock = threading.Lock()
+        # Serializes the writes and uploads of checkpoints
+        self._checkpoint_lock = threading.Lock()
+        self._dirty = False
+        self._last_checkpoint = time.monotonic()
+        self.checkpoints = 0
+
+    @classmethod
+    def load(cls, fw_client, project, output_dir=None, **kwargs):
+        """
+        Load the journal attached to a master project, if any.
+
+        Args:
+            fw_client (ContainerCache): Flywheel Client wrapped in a ContainerCache
+            project (flywheel.Project): The master project
+            output_dir (str, optional): The directory the journal is also written to.
+                Defaults to None.
+
+        Returns:
+            ExportJournal: The journal of the master project
+        """
+        entries = {}
+        if project.get_file(JOURNAL_FILE):
+            entries = json.loads(project.read_file(JOURNAL_FILE))
+            log.info(
+                "Loaded %i unfinished session exports from %s.", len(entries), JOURNAL_FILE
+            )
+        return cls(fw_client, project, output_dir, entries=entries, **kwargs)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def entry(self, source_session_id, dest_project_id):
+        """
+        Return a copy of the entry of the export of a session to a project.
+
+        Args:
+            source_session_id (str): The id of the master project session
+            dest_project_id (str): The id of the reader project
+
+        Returns:
+            dict: The JOURNAL_ENTRY_TEMPLATE of the export, or None
+        """
+        with self._lock:
+            entry = self.entries.get(journal_key(source_session_id, dest_project_id))
+            return copy.deepcopy(entry)
+
+    def pending_projects(self, source_session_id):
+        """
+        Return the reader projects with an unrecorded export of a session.
+
+        Args:
+            source_session_id (str): The id of the master project session
+
+        Returns:
+            list: The ids of the reader projects
+        """
+        with self._lock:
+            return [
+                entry["dest_project"]
+                for entry in self.entries.values()
+                if entry["source_session"] == source_session_id
+            ]
+
+    def _update(self, source_session_id, dest_project_id, update):
+        with self._lock:
+            key = journal_key(source_session_id, dest_project_id)
+            if key not in self.entries:
+                entry = copy.deepcopy(JOURNAL_ENTRY_TEMPLATE)
+                entry["source_session"] = source_session_id
+                entry["dest_project"] = dest_project_id
+                self.entries[key] = entry
+            update(self.entries[key])
+            self._dirty = True
+
+    def _update_acquisition(self, source_session_id, dest_project_id, acq_id, update):
+        def update_entry(entry):
+            acquisition = entry["acquisitions"].setdefault(
+                acq_id, copy.deepcopy(JOURNAL_ACQUISITION_TEMPLATE)
+            )
+            update(acquisition)
+
+        self._update(source_session_id, dest_project_id, update_entry)
+
+    def record_session(self, source_session_id, dest_project_id, dest_session_id):
+        """Record the creation of the session in the reader project."""
+
+        def update(entry):
+            entry["session"] = dest_session_id
+            entry["status"] = "exporting"
+            entry["acquisitions"] = {}
+
+        self._update(source_session_id, dest_project_id, update)
+
+    def record_acquisition(
+        self, source_session_id, dest_project_id, source_acq_id, dest_acq_id
+    ):
+        """Record the creation of an acquisition in the reader project session."""
+
+        def update(acquisition):
+            acquisition["id"] = dest_acq_id
+
+        self._update_acquisition(
+            source_session_id, dest_project_id, source_acq_id, update
+        )
+
+    def record_file(self, source_session_id, dest_project_id, source_acq_id, file_name):
+        """Record the transfer of a file to the reader project acquisition."""
+
+        def update(acquisition):
+            if file_name not in acquisition["files"]:
+                acquisition["files"].append(file_name)
+
+        self._update_acquisition(
+            source_session_id, dest_project_id, source_acq_id, update
+        )
+
+    def complete_acquisition(self, source_session_id, dest_project_id, source_acq_id):
+        """Record the completed export of an acquisition."""
+
+        def update(acquisition):
+            acquisition["status"] = "exported"
+
+        self._update_acquisition(
+            source_session_id, dest_project_id, source_acq_id, update
+        )
+
+    def complete_session(self, source_session_id, dest_project_id):
+        """Record the completed export of a session."""
+
+        def update(entry):
+            entry["status"] = "exported"
+
+        self._update(source_session_id, dest_project_id, update)
+
+    def remove(self, source_session_id, dest_project_id=None):
+        """
+        Remove the exports of a session once its assignments have been recorded.
+
+        Args:
+            source_session_id (str): The id of the master project session
+            dest_project_id (str, optional): The id of the reader project. Defaults to
+                None, the exports to all reader projects.
+        """
+        with self._lock:
+            for key, entry in list(self.entries.items()):
+                if entry["source_session"] == source_session_id and (
+                    dest_project_id is None or entry["dest_project"] == dest_project_id
+                ):
+                    del self.entries[key]
+                    self._dirty = True
+
+    def checkpoint(self, force=False):
+        """
+        Write the journal to the output directory and attach it to the master project.
+
+        Checkpoints are made no more than every `checkpoint_seconds`, unless forced, and
+        only if the journal has changed.
+
+        Args:
+            force (bool, optional): Checkpoint regardless of the time since the last
+                checkpoint. Defaults to False.
+        """
+        with self._checkpoint_lock:
+            with self._lock:
+                elapsed = time.monotonic() - self._last_checkpoint
+                if not self._dirty or (
+                    not force and elapsed < self.checkpoint_seconds
+                ):
+                    return
+                contents = json.dumps(self.entries, indent=2).encode("utf-8")
+                self._dirty = False
+                self._last_checkpoint = time.monotonic()
+                self.checkpoints += 1
+
+            if self.output_dir:
+                with open(os.path.join(self.output_dir, JOURNAL_FILE), "wb") as fp:
+                    fp.write(contents)
+            if self.project is not None:
+                self.project.upload_file(
+                    flywheel.FileSpec(
+                        JOURNAL_FILE,
+                        io.BytesIO(contents),
+                        content_type="application/json",
+                        size=len(contents),
+                    )
+                )
+                self._fw_client.invalidate(self.project.id)
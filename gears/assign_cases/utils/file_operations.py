@@ -2,6 +2,8 @@ import logging
 import os
 import zipfile
 
+from .transfer_engine import TransferEngine
+
 log = logging.getLogger(__name__)
 
 
@@ -64,97 +66,72 @@ def _extract_archive(zip_file_path, extract_location):
             return extract_dest
 
 
-def _export_files(fw, source_acquisition, dest_acquisition):
+def _export_files(fw, source_acquisition, dest_acquisition, transfer_engine=None):
     """
     Export source_acquisition files to the exported acquisiton.
 
-    For each file in the source_acquisition:
+    For each file in the source_acquisition, concurrently:
         1. Download the file
             a. If the file is a DICOM file, modify the DICOM archives individual files
                to match the appropriate metadata as exists in Flywheel.
-        2. Upload the file to the dest_acquisition
-        3. Modify the file in the dest_acquisition to have the same metadata
+        2. Upload the file to the dest_acquisition along with its metadata
 
     Args:
         fw (flywheel.Client): Valid Flywheel Client
         source_acquisition (flywheel.Acquisition): Source Acquisition of files
         dest_acquisition (flywheel.Acquisition): Destination Acquisition of files
         map_fw_to_dcm (bool, optional): Not Used. Defaults to False.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None, an engine for these files only.
+
+    Returns:
+        list: The TRANSFER_RECORD_TEMPLATE of each file
     """
 
-    # Get the source_acquisition so that the metadata are all there.
-    source_acquisition = source_acquisition.reload()
-    source_session = fw.get(source_acquisition.parents["session"])
-    source_subject = fw.get(source_acquisition.parents["subject"])
-    source_project = fw.get(source_acquisition.parents["project"])
-
-    for acq_file in source_acquisition.files:
-        log.info(
-            "Exporting %s/%s/%s/%s/%s...",
-            source_project.label,
-            source_subject.label,
-            source_session.label,
-            source_acquisition.label,
-            acq_file.name,
-        )
-        # The DICOM files are assumed to have been fully anonymized
-        upload_file_path = os.path.join("/tmp", acq_file.name)
-        acq_file.download(upload_file_path)
-
-        # Upload the file to the dest_acquisition
-        log.debug("Uploading %s to %s", acq_file.name, dest_acquisition.label)
-
-        # Add logic around retrying failed uploads
-        max_attempts = 5
-        attempt = 0
-        while attempt < max_attempts:
-            attempt += 1
-            status = dest_acquisition.upload_file(upload_file_path)
-            log.info("Upload status = %s", status)
-            # NOTE: Why do we do this? Can't we reload instead?
-            dest_acquisition = fw.get_acquisition(dest_acquisition.id)
-            file_names = [x.name for x in dest_acquisition.files]
-            log.debug(file_names)
-            if os.path.basename(upload_file_path) not in file_names:
-                log.warning(
-                    "Upload failed for %s - retrying...",
-                    os.path.basename(upload_file_path),
-                )
-            else:
-                log.info(
-                    "Successfully exported: %s", os.path.basename(upload_file_path)
-                )
-                break
-
-        # Delete the uploaded file locally.
-
-        log.debug("Removing local file: %s", upload_file_path)
-        os.remove(upload_file_path)
-
-        # Update file metadata
-        if acq_file.modality:
-            log.debug(
-                "Updating modality to %s for %s", acq_file.modality, acq_file.name
-            )
-            dest_acquisition.update_file(acq_file.name, modality=acq_file.modality)
-        if not acq_file.modality and acq_file.name.endswith("mriqc.qa.html"):
-            # Special case - mriqc output files do not have modality set, so
-            # we must set the modality prior to the classification to avoid errors.
-            dest_acquisition.update_file(acq_file.name, modality="MR")
-        if acq_file.type:
-            log.debug("Updating type to %s for %s", acq_file.type, acq_file.name)
-            dest_acquisition.update_file(acq_file.name, type=acq_file.type)
-        if acq_file.classification:
-            log.debug(
-                "Updating classification to %s for %s",
-                acq_file.classification,
-                acq_file.name,
-            )
-            dest_acquisition.update_file_classification(
-                acq_file.name, acq_file.classification
-            )
-        if acq_file.info:
-            log.debug("Updating info for %s", acq_file.name)
-            dest_acquisition.update_file_info(acq_file.name, acq_file.info)
+    if transfer_engine is None:
+        transfer_engine = TransferEngine(fw)
+
+    return transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+
+def _fan_out_files(
+    fw,
+    source_acquisition,
+    dest_acquisitions,
+    transfer_engine=None,
+    completed=None,
+    on_transfer=None,
+):
+    """
+    Export source_acquisition files to each of several exported acquisitions.
+
+    Each file in the source_acquisition is downloaded once and uploaded, along with its
+    metadata, to every one of the dest_acquisitions that does not already have it.
+
+    Args:
+        fw (flywheel.Client): Valid Flywheel Client
+        source_acquisition (flywheel.Acquisition): Source Acquisition of files
+        dest_acquisitions (list): Destination Acquisitions (flywheel.Acquisition) of
+            files
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None, an engine for these files only.
+        completed (list, optional): For each of dest_acquisitions, the names of the
+            files it already has. Defaults to None.
+        on_transfer (callable, optional): Called with the index of the destination
+            and the TRANSFER_RECORD_TEMPLATE of each file transferred. Defaults to None.
+
+    Returns:
+        list: For each of dest_acquisitions, the first exception raised exporting files
+            to it, or None
+    """
+
+    if transfer_engine is None:
+        transfer_engine = TransferEngine(fw)
 
-        dest_acquisition.reload()
+    _, errors = transfer_engine.fan_out_files(
+        source_acquisition,
+        dest_acquisitions,
+        completed=completed,
+        on_transfer=on_transfer,
+    )
+    return errors
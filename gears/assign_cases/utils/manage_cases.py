@@ -1,14 +1,22 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-import numpy as np
 import pandas as pd
 
-from .container_operations import export_session, find_or_create_group
+from .assignment_planner import plan_assignments
+from .assignment_solver import ASSIGNMENT_SOLVERS
+from .container_operations import export_session_to_projects, find_or_create_group
+from .coverage_index import CoverageIndex
+from .reader_selector import ReaderSelector
+from .session_loader import iter_project_sessions
 
 log = logging.getLogger(__name__)
 
 OHIF_CONFIG = "/flywheel/v0/ohif_config.json"
 
+# Maximum number of planned sessions exported concurrently
+MAX_SESSION_WORKERS = 4
+
 
 class InvalidGroupError(Exception):
     """
@@ -162,26 +170,6 @@ def find_readers_in_projects(projects, reader_roles):
     return reader_ids
 
 
-def find_reader_project_from_id(projects, reader_id, reader_roles):
-    reader_project = []
-
-    for proj in projects:
-        proj_readers = find_readers_in_projects(proj, reader_roles)
-        if reader_id in proj_readers:
-            reader_project.append(proj)
-
-    if len(reader_project) > 1:
-        log.warning(f"WARNING {len(reader_project)} projects found for reader {reader_id}:")
-        log.warning([p.label for p in reader_project])
-        log.warning(f"Returning first project")
-
-    if len(reader_project) == 0:
-        log.warning(f"No projects found for reader {reader_id}")
-        reader_project = [None]
-
-    return reader_project[0]
-
-
 def set_project_session_attributes(session_features):
     """
     Return session attributes generated by assigning sessions to reader projects
@@ -231,7 +219,7 @@ def initialize_dataframes(fw_client, reader_group):
     Initializes pandas DataFrames used to select sessions and reader projects
 
     Args:
-        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
         reader_group (flywheel.Group): The reader group
 
     Returns:
@@ -253,36 +241,17 @@ def initialize_dataframes(fw_client, reader_group):
         dtype="object",
     )
 
-    # Initialize destination projects dataframe
-    # for reader_proj in fw_client.projects.find(f'group={reader_group.id}'):
-    for reader_proj in fw_client.projects.iter_find(f"group={reader_group.id},label=~Reader [0-9][0-9]?[0-9]?"):
-
-        reader_proj = reader_proj.reload()
-        project_features = reader_proj.info["project_features"]
-        # Valid roles for readers are "read-write" and "read-only"
-        proj_roles = [
-            role.id
-            for role in fw_client.get_all_roles()
-            if role.label in ["read-write", "read-only"]
-        ]
-
-        reader_id = find_readers_in_projects(reader_proj, proj_roles)
-        reader_id = reader_id[0]
-
-        # reader_id = [
-        #     perm.id
-        #     for perm in reader_proj.permissions
-        #     if set(perm.role_ids).intersection(proj_roles)
-        # ][0]
-        #
+    # Initialize destination projects dataframe from the indexed reader projects
+    for reader_record in fw_client.reader_index(reader_group.id):
+        reader_proj = fw_client.get(reader_record["id"])
 
         # Fill the dataframe with project data.
         dest_projects_df.loc[dest_projects_df.shape[0] + 1] = [
-            reader_proj.id,
-            reader_proj.label,
-            reader_id,
-            project_features["assignments"],
-            project_features["max_cases"],
+            reader_record["id"],
+            reader_record["label"],
+            reader_record["reader_id"],
+            reader_record["assignments"],
+            reader_record["max_cases"],
             len(reader_proj.sessions()),
         ]
 
@@ -295,67 +264,103 @@ def initialize_dataframes(fw_client, reader_group):
     return source_sessions_df, dest_projects_df
 
 
-def select_readers_without_replacement(session_features, dest_projects_df):
+def select_readers_without_replacement(session_features, dest_projects_df, rng=None):
     """
     Select reader projects to export assigned sessions to based on
         "selection without replacement"
 
+    To select readers for many sessions, use a single ReaderSelector and record each
+    assignment with `ReaderSelector.record_assignment`.
+
     Args:
         session_features (dict): Current session's features used to assign and export
             to multiple reader projects
         dest_projects_df (pandas.DataFrame): Dataframe recording projects and their
             assigned sessions
+        rng (numpy.random.Generator, optional): The random number generator of the
+            selection. Defaults to None, the global numpy.random state.
 
     Returns:
         list: A list of ids from reader projects to populate with a given session
     """
+    return ReaderSelector(dest_projects_df, rng=rng).select(session_features)
 
-    # Select case_coverage readers for each case
-    # If avail_case_coverage == 0 we don't need to look.  It is all full up.
-    avail_case_coverage = session_features["case_coverage"] - len(
-        session_features["assignments"]
-    )
-
-    # add it to case_coverage distinct readers (projects)
-    readers_proj_assigned = [
-        assignments["project_id"] for assignments in session_features["assignments"]
-    ]
-
-    df_temp = dest_projects_df[
-        (dest_projects_df.num_assignments == np.min(dest_projects_df.num_assignments))
-        & (dest_projects_df.num_assignments < dest_projects_df.max_cases)
-        & ~dest_projects_df.id.isin(readers_proj_assigned)
-    ]
-
-    min_avail_coverage = min(avail_case_coverage, df_temp.shape[0])
-    # new readers to assign a session
-    assign_reader_projs = list(
-        np.random.choice(df_temp.id, min_avail_coverage, replace=False)
-    )
 
-    if df_temp.shape[0] < avail_case_coverage:
-        # save the length of the previous df_temp
-        df_temp_len = df_temp.shape[0]
-        # Select all but the above readers_proj_assigned
-        df_temp = dest_projects_df[
-            ~dest_projects_df.id.isin(readers_proj_assigned + assign_reader_projs)
-            & (dest_projects_df.num_assignments < dest_projects_df.max_cases)
-        ]
-        assign_reader_projs.extend(
-            list(
-                np.random.choice(
-                    df_temp.id,
-                    # need to choose the minimum of these
-                    min(avail_case_coverage - df_temp_len, df_temp.shape[0]),
-                    replace=False,
-                )
-            )
-        )
+def execute_plan(
+    fw_client,
+    plan,
+    transfer_engine=None,
+    journal=None,
+    max_workers=MAX_SESSION_WORKERS,
+    cleanup_report=None,
+):
+    """
+    Export the sessions of an assignment plan to their planned reader projects.
 
-    return assign_reader_projs
+    Sessions are exported concurrently, except for sessions of the same subject, which
+    are exported one after the other.
+    The results are yielded in the order of the entries of the plan.
 
+    Args:
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        plan (AssignmentPlan): The planned assignments
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        journal (ExportJournal, optional): The journal of the session exports.
+            Defaults to None.
+        max_workers (int, optional): Maximum number of sessions exported concurrently.
+            Defaults to MAX_SESSION_WORKERS.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
+
+    Yields:
+        tuple: Each entry of the plan, in order, and the exports of its session, as
+            returned by `export_session_to_projects`
+    """
 
-def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_coverage):
+    def export_sessions(entries):
+        results = []
+        for entry in entries:
+            exports = []
+            if entry["project_ids"]:
+                projects = [
+                    fw_client.get(project_id) for project_id in entry["project_ids"]
+                ]
+                exports = export_session_to_projects(
+                    fw_client,
+                    entry["session"],
+                    projects,
+                    transfer_engine=transfer_engine,
+                    journal=journal,
+                    cleanup_report=cleanup_report,
+                )
+            results.append(exports)
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        # The future of the subject group of each entry, and the entry's position in it
+        futures = {}
+        for entries in plan.subject_groups():
+            future = executor.submit(export_sessions, entries)
+            for position, entry in enumerate(entries):
+                futures[id(entry)] = (future, position)
+        for entry in plan.entries:
+            future, position = futures[id(entry)]
+            yield entry, future.result()[position]
+
+
+def distribute_cases_to_readers(
+    fw_client,
+    src_project,
+    reader_group_id,
+    case_coverage,
+    transfer_engine=None,
+    journal=None,
+    assignment_solver="greedy",
+    rng=None,
+    incremental=False,
+    cleanup_report=None,
+):
     """
     Distribute cases (sessions) from a source project to multiple reader projects.
 
@@ -365,19 +370,44 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
     reader.max_cases assigned) without replacement. Readers with the least number of
     sessions assigned are assigned new sessions first.
 
+    All assignments are planned before any session is exported. The planned sessions
+    are then exported concurrently. With the "flow" assignment_solver, the readers of
+    all sessions are selected together, so that as many sessions as possible reach
+    their case_coverage when the max_cases of the readers are uneven.
+
     This function can be run multiple times with new sessions in the source project and
-    new readers created with the `assign-readers` gear.
+    new readers created with the `assign-readers` gear. With a journal, the exports
+    interrupted in an earlier run are resumed to the same readers. An incremental run
+    loads and records only the sessions that the case_states of the source project
+    record as under-covered, and that a reader with capacity can receive.
 
     Args:
         fw_client (flywheel.Client): An instantiated Flywheel Client to host instance
         src_project (flywheel.Project): The source project for all sessions
         reader_group_id (str): The Flywheel container id for the group in question
         case_coverage (int): The default number of readers assigned to each session
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        journal (ExportJournal, optional): The journal of the session exports.
+            Defaults to None.
+        assignment_solver (str, optional): The solver selecting the readers of the
+            sessions, one of ASSIGNMENT_SOLVERS. Defaults to "greedy".
+        rng (numpy.random.Generator, optional): The random number generator of the
+            assignment plan. Defaults to None, the global numpy.random state.
+        incremental (bool, optional): Whether to skip the sessions recorded at their
+            case_coverage. Defaults to False.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
 
     Returns:
         tuple: Pandas DataFrames recording source and destination for
-            each session exported.
+            each session exported, and the planned assignments.
     """
+    if assignment_solver not in ASSIGNMENT_SOLVERS:
+        raise InvalidInputError(
+            f"Unknown assignment_solver ({assignment_solver}). "
+            f"Valid solvers are {', '.join(ASSIGNMENT_SOLVERS)}."
+        )
 
     # Grab project-level features, if it does not exist, set defaults
     project_features = (
@@ -388,9 +418,6 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
     # Ensure a valid ohif_config.json file is present for the master project
     confirm_or_create_ohif_config(src_project)
 
-    #src_sessions = src_project.sessions()
-    src_sessions = fw_client.sessions.iter_find(f"project={src_project.id}")
-
     # Keep track of all the exported and created data
     # On Failure, remove contents of created_data from instance.
     exported_data = []
@@ -419,37 +446,44 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
             "Please run `assign-readers` with valid configuration first."
         )
 
-    nses = 0
-    # for each session in the sessions found
-    for src_session in src_sessions:
-        nses += 1
-        # Reload to capture all metadata
-        src_session = src_session.reload()
-        session_features = set_session_features(src_session, case_coverage)
-
-        # select available readers to receive the session
-        assign_reader_projs = select_readers_without_replacement(
-            session_features, dest_projects_df
-        )
-
-        # This is where we record which readers receive the session
-        # and export that session to each of those readers.
-        # Iterate through the assign_reader_projs, export the session to each of them,
-        # record results
+    # Sessions are loaded in pages with their info and subject
+    select = None
+    if incremental:
+        # Only the under-covered sessions are loaded, and their states updated
+        coverage_index = CoverageIndex.from_project(src_project, dest_projects_df)
+        project_features["case_states"] = coverage_index.case_states
+        select = coverage_index.needs_assignment
+    src_sessions = iter_project_sessions(fw_client, src_project.id, select=select)
+
+    # Plan the readers of every session before any session is exported
+    plan = plan_assignments(
+        (
+            (src_session, set_session_features(src_session, case_coverage))
+            for src_session in src_sessions
+        ),
+        dest_projects_df,
+        journal=journal,
+        solver=assignment_solver,
+        rng=rng,
+    )
+    assignment_plan_df = plan.to_dataframe()
+
+    nses = len(plan)
+    # Export each session to its planned readers, and record the results
+    for entry, exports in execute_plan(
+        fw_client,
+        plan,
+        transfer_engine=transfer_engine,
+        journal=journal,
+        cleanup_report=cleanup_report,
+    ):
+        src_session = entry["session"]
+        session_features = entry["session_features"]
+        assign_reader_projs = entry["project_ids"]
         log.debug(f"found {len(assign_reader_projs)} reader projects")
-        
-        for project_id in assign_reader_projs:
-            # grab the reader_id from the selected project
-            project = fw_client.get(project_id)
-
-            proj_roles = [
-                role.id
-                for role in fw_client.get_all_roles()
-                if role.label in ["read-write", "read-only"]
-            ]
-
+        recorded_projs = []
 
-                    
+        for project_id, export in zip(assign_reader_projs, exports):
             # Below is the "original" code, which was modified to the code immediately below it.
             # List comprehension is faster, but I have expanded it for better logging, AND also
             # there was a problem with the new flywheel permissions that caused an error with 
@@ -464,28 +498,25 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
             #     if set(perm.role_ids).intersection(proj_roles)
             # ][0]
 
-            reader_id = find_readers_in_projects(project, proj_roles)
-            reader_id = reader_id[0]
+            # The reader of each project was recorded from the reader index
+            reader_id = dest_projects_df.loc[
+                dest_projects_df.id == project_id, "reader_id"
+            ].values[0]
             #
             # for perm in project.permissions:
             #     if set(perm.role_ids).intersection(proj_roles):
             #         reader_id = perm.id
             
-            try:
-                # export the session to the reader project
-                dest_session, _exported_data, _created_data = export_session(
-                    fw_client, src_session, fw_client.get(project_id)
-                )
-
-                exported_data.extend(_exported_data)
-                created_data.extend(_created_data)
-
-            except Exception as e:
+            if isinstance(export, Exception):
                 log.warning("Error while exporting a session, %s.", src_session.label)
-                log.exception(e)
+                log.error(export, exc_info=export)
                 log.warning("Examine the data and try again.")
                 continue
 
+            dest_session, _exported_data, _created_data = export
+            exported_data.extend(_exported_data)
+            created_data.extend(_created_data)
+
             # grab the index from the dataframe and record source and dest
             # session ids
             indx = dest_projects_df[dest_projects_df.id == project_id].index[0]
@@ -508,6 +539,7 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
                     "status": "Assigned",
                 }
             )
+            recorded_projs.append(project_id)
 
         # This is where we give the "source" the information about where it went
         # later, we will want to use this to query "completed sessions" and get
@@ -516,6 +548,14 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
 
         # Restore the session_features to the source session
         src_session.update_info(session_info)
+        fw_client.invalidate(src_session.id)
+
+        # The recorded assignments no longer need to be resumed, and must not be
+        # resumed again by the next run
+        if journal is not None:
+            for project_id in recorded_projs:
+                journal.remove(src_session.id, project_id)
+            journal.checkpoint(force=True)
 
         # always record the state in the dataframe.
         session_features["id"] = src_session.id
@@ -527,7 +567,7 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
         project_session_attributes = set_project_session_attributes(session_features)
 
         # Check to see if the case is already present in the project_features
-        log.debug(f'looking for case {case["id"]}')
+        log.debug(f'looking for case {session_features["id"]}')
         case = [
             case
             for case in project_features["case_states"]
@@ -542,6 +582,7 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
         project_features["case_states"].append(project_session_attributes)
 
     src_project.update_info({"project_features": project_features})
+    fw_client.invalidate(src_project.id)
 
     # Todo: fix this damn divide by zero error
     if nses % dest_projects_df.shape[0] != 0:
@@ -567,8 +608,9 @@ def distribute_cases_to_readers(fw_client, src_project, reader_group_id, case_co
             }
         }
         reader_proj.update_info(project_info)
+        fw_client.invalidate(reader_proj.id)
 
     # Create a DataFrame from exported_data and then export
     exported_data_df = pd.DataFrame(data=exported_data)
 
-    return source_sessions_df, dest_projects_df, exported_data_df
+    return source_sessions_df, dest_projects_df, exported_data_df, assignment_plan_df
@@ -0,0 +1,150 @@
+"""
+Selection of the reader projects that receive each session.
+
+Sessions are assigned "without replacement": a session is assigned to distinct readers,
+least-loaded readers first, and never to a reader who has reached their max_cases.
+
+The ReaderSelector keeps the reader projects in a bucket queue keyed on their number of
+assignments, with a heap of the occupied assignment counts. Finding the least-loaded
+readers and recording an assignment do not require scanning every reader project.
+"""
+import heapq
+import logging
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+
+class ReaderSelector:
+    """
+    Selects reader projects for sessions, least-loaded first, without replacement.
+
+    Readers are considered in the order of the rows of dest_projects_df, so that the
+    random selection among equally loaded readers is reproducible under a seeded
+    random number generator.
+
+    Args:
+        dest_projects_df (pandas.DataFrame): Dataframe recording projects and their
+            assigned sessions, with columns "id", "max_cases", and "num_assignments"
+        rng (numpy.random.Generator, optional): The random number generator of the
+            selection. Defaults to None, the global numpy.random state.
+    """
+
+    def __init__(self, dest_projects_df, rng=None):
+        self._rng = rng if rng is not None else np.random
+        self._ids = list(dest_projects_df.id)
+        self._positions = {
+            project_id: position for position, project_id in enumerate(self._ids)
+        }
+        self._max_cases = [
+            None if pd.isna(max_cases) else max_cases
+            for max_cases in dest_projects_df.max_cases
+        ]
+        self._counts = [int(count) for count in dest_projects_df.num_assignments]
+        # assignment count -> positions of the reader projects with that count
+        self._buckets = {}
+        # The occupied assignment counts, possibly including emptied buckets
+        self._count_heap = []
+        for position, count in enumerate(self._counts):
+            self._add(position, count)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _add(self, position, count):
+        bucket = self._buckets.get(count)
+        if bucket is None:
+            bucket = self._buckets[count] = set()
+            heapq.heappush(self._count_heap, count)
+        bucket.add(position)
+
+    def _min_count(self):
+        # Emptied buckets are removed from the heap as they are encountered
+        while self._count_heap and not self._buckets.get(self._count_heap[0]):
+            self._buckets.pop(heapq.heappop(self._count_heap), None)
+        return self._count_heap[0] if self._count_heap else None
+
+    def _available(self, position):
+        max_cases = self._max_cases[position]
+        return max_cases is not None and self._counts[position] < max_cases
+
+    def num_assignments(self, project_id):
+        """Return the number of sessions assigned to a reader project."""
+        return self._counts[self._positions[project_id]]
+
+    def record_assignment(self, project_id):
+        """
+        Record the assignment of a session to a reader project.
+
+        Args:
+            project_id (str): The id of the reader project
+        """
+        position = self._positions[project_id]
+        count = self._counts[position]
+        self._buckets[count].discard(position)
+        self._counts[position] = count + 1
+        self._add(position, count + 1)
+
+    def select(self, session_features):
+        """
+        Select the reader projects to assign a session to.
+
+        Readers with the fewest assignments are selected first, at random among them.
+        If there are too few of them to meet the case_coverage of the session, the
+        remaining readers are selected at random among all readers with capacity.
+        Readers the session is already assigned to are never selected.
+
+        Args:
+            session_features (dict): Current session's features used to assign and
+                export to multiple reader projects
+
+        Returns:
+            list: A list of ids from reader projects to populate with a given session
+        """
+        # If avail_case_coverage == 0 we don't need to look.  It is all full up.
+        avail_case_coverage = session_features["case_coverage"] - len(
+            session_features["assignments"]
+        )
+        readers_proj_assigned = {
+            assignments["project_id"]
+            for assignments in session_features["assignments"]
+        }
+
+        # The least-loaded readers with capacity
+        min_count = self._min_count()
+        least_loaded = [
+            self._ids[position]
+            for position in sorted(self._buckets.get(min_count, ()))
+            if self._available(position)
+            and self._ids[position] not in readers_proj_assigned
+        ]
+
+        assign_reader_projs = list(
+            self._rng.choice(
+                np.array(least_loaded, dtype=object),
+                min(avail_case_coverage, len(least_loaded)),
+                replace=False,
+            )
+        )
+
+        if len(least_loaded) < avail_case_coverage:
+            # Select among all readers with capacity but the above
+            excluded = readers_proj_assigned.union(assign_reader_projs)
+            candidates = [
+                project_id
+                for position, project_id in enumerate(self._ids)
+                if self._available(position) and project_id not in excluded
+            ]
+            assign_reader_projs.extend(
+                list(
+                    self._rng.choice(
+                        np.array(candidates, dtype=object),
+                        min(avail_case_coverage - len(least_loaded), len(candidates)),
+                        replace=False,
+                    )
+                )
+            )
+
+        return assign_reader_projs
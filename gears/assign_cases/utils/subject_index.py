@@ -0,0 +1,120 @@
+"""
+An index of the subjects in a destination project.
+
+Every session exported to a project needs the subject with the code of its source
+subject. The subjects of a project are listed once with a single paginated query and
+mapped by code, so that finding the subject of each exported session does not require
+a query of its own. Subjects created in the project are added to the index as they are
+created.
+"""
+import logging
+import threading
+import time
+
+import flywheel
+
+log = logging.getLogger(__name__)
+
+# Number of times a subject is looked up after its creation conflicts with another
+CREATE_CONFLICT_ATTEMPTS = 4
+
+# Seconds to wait before the first lookup after a conflict, doubled for each attempt
+CREATE_CONFLICT_BACKOFF = 0.1
+
+
+class SubjectIndex:
+    """
+    Maps the subject codes of a project to its subjects.
+
+    Args:
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        project (flywheel.Project): The project whose subjects are indexed
+    """
+
+    def __init__(self, fw_client, project):
+        self._fw_client = fw_client
+        self.project = project
+        self._lock = threading.Lock()
+        self._by_code = {}
+        self._build()
+
+    def _build(self):
+        for subject in self.project.subjects.iter_find(limit=250):
+            self._by_code.setdefault(subject.code, subject)
+
+        log.debug(
+            "Indexed %i subjects in project %s.", len(self._by_code), self.project.label
+        )
+
+    def __contains__(self, code):
+        return code in self._by_code
+
+    def __len__(self):
+        return len(self._by_code)
+
+    def get(self, code):
+        """
+        Return the subject of the project with a code.
+
+        Args:
+            code (str): The code of the subject
+
+        Returns:
+            flywheel.Subject: The subject, `None` if the project has no such subject
+        """
+        with self._lock:
+            return self._by_code.get(code)
+
+    def add(self, subject):
+        """
+        Add a subject created in the project to the index.
+
+        Args:
+            subject (flywheel.Subject): The subject created
+        """
+        with self._lock:
+            self._by_code[subject.code] = subject
+
+    def discard(self, subject_id):
+        """
+        Remove a deleted subject from the index.
+
+        Args:
+            subject_id (str): The id of the subject deleted
+        """
+        with self._lock:
+            for code, subject in list(self._by_code.items()):
+                if subject.id == subject_id:
+                    del self._by_code[code]
+
+    def create(self, metadata):
+        """
+        Create a subject in the project, or return the subject created concurrently.
+
+        A batch run can result in the subject having been created by another job since
+        the project was indexed. If the creation fails, the subject is looked up with a
+        short, bounded, exponential backoff.
+
+        Args:
+            metadata (dict): The metadata of the subject, including its "code"
+
+        Returns:
+            tuple: The subject (flywheel.Subject) and whether it was created (bool)
+        """
+        code = metadata.get("code")
+        try:
+            subject = self.project.add_subject(metadata)
+        except flywheel.ApiException as e:
+            log.warning("Could not generate subject: %s -- %s", e.status, e.reason)
+            log.info("Attempting to find subject...")
+            for attempt in range(CREATE_CONFLICT_ATTEMPTS):
+                time.sleep(CREATE_CONFLICT_BACKOFF * 2 ** attempt)
+                subject = self.project.subjects.find_first(f'code="{code}"')
+                if subject:
+                    self.add(subject)
+                    return subject, False
+            raise
+
+        self._fw_client.invalidate(self.project.id)
+        self.add(subject)
+        return subject, True
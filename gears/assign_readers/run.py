@@ -5,12 +5,14 @@ import os
 
 from flywheel_gear_toolkit import GearToolkitContext
 
+from utils.api_profiler import ApiProfiler
 from utils.check_jobs import (
     DuplicateJobError,
     InsufficientPermissionsError,
     check_for_duplicate_execution,
     verify_user_permissions,
 )
+from utils.container_cache import ContainerCache
 from utils.container_operations import find_or_create_group
 from utils.manage_cases import (
     InvalidGroupError,
@@ -24,8 +26,14 @@ log = logging.getLogger(__name__)
 
 
 def main(context):
+    # Requests to the instance are profiled only when requested
+    api_profiler = None
+    if context.config.get("profile_api_calls"):
+        api_profiler = ApiProfiler()
+        api_profiler.install(context.client)
+
     try:
-        fw_client = context.client
+        fw_client = ContainerCache(context.client)
 
         verify_user_permissions(fw_client, context)
         check_for_duplicate_execution(fw_client)
@@ -69,6 +77,8 @@ def main(context):
             fw_client, reader_group, source_project, readers_csv=reader_csv_path,
         )
         created_data.extend(_created_data)
+
+        fw_client.log_summary()
     except (
         DuplicateJobError,
         InsufficientPermissionsError,
@@ -82,6 +92,9 @@ def main(context):
         log.exception(e,)
         log.fatal("Error executing assign-readers.",)
         return 1
+    finally:
+        if api_profiler:
+            api_profiler.write_reports(context.output_dir)
 
     log.info("assign-readers completed successfully!")
     return 0
@@ -0,0 +1,232 @@
+"""
+Optional instrumentation of the Flywheel API calls made during a gear run.
+
+Every SDK method (e.g. `get_session`, `modify_session_info`) makes its request through
+the `call_api` method of the client's ApiClient. The ApiProfiler wraps `call_api` and
+`request` on that ApiClient to record the count, response size, and latency of the
+requests made by each SDK method. Nothing is wrapped unless the profiler is installed.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the buckets of the latency histogram
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+# Columns of the api_profile.csv report
+PROFILE_COLUMNS = [
+    "sdk_method",
+    "endpoint",
+    "count",
+    "errors",
+    "bytes_received",
+    "bytes_sent",
+    "total_seconds",
+    "mean_seconds",
+    "p50_seconds",
+    "p95_seconds",
+    "p99_seconds",
+    "max_seconds",
+]
+
+
+def _sdk_method(frame):
+    """Return the name of the SDK method that called `call_api`."""
+    name = frame.f_code.co_name if frame else "unknown"
+    if name.endswith("_with_http_info"):
+        name = name[: -len("_with_http_info")]
+    return name
+
+
+def _body_size(body):
+    """Return the size of a request body, if known without serializing it."""
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    if isinstance(body, str):
+        return len(body.encode("utf-8"))
+    return 0
+
+
+class ApiProfiler:
+    """
+    Records the count, bytes, and latency of Flywheel API requests per SDK method.
+
+    Install the profiler on the Flywheel client before the run and write its reports
+    at the end of the run:
+
+        api_profiler = ApiProfiler()
+        api_profiler.install(context.client)
+        ...
+        api_profiler.write_reports(context.output_dir)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # (sdk_method, endpoint) -> statistics of the requests
+        self._stats = {}
+        self._api_client = None
+
+    def install(self, fw_client):
+        """
+        Wrap the ApiClient of a Flywheel client to record the requests it makes.
+
+        Args:
+            fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        """
+        api_client = fw_client._fw.api_client
+        call_api = api_client.call_api
+        request = api_client.request
+
+        def profiled_call_api(resource_path, method, *args, **kwargs):
+            key = (_sdk_method(sys._getframe(1)), f"{method} {resource_path}")
+            self._local.received = 0
+            self._local.sent = 0
+            error = False
+            start = time.perf_counter()
+            try:
+                return call_api(resource_path, method, *args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                self.record(
+                    key,
+                    time.perf_counter() - start,
+                    self._local.received,
+                    self._local.sent,
+                    error,
+                )
+
+        def profiled_request(method, url, *args, **kwargs):
+            response = request(method, url, *args, **kwargs)
+            data = getattr(response, "data", None)
+            if isinstance(data, (bytes, bytearray)):
+                self._local.received = getattr(self._local, "received", 0) + len(data)
+            self._local.sent = getattr(self._local, "sent", 0) + _body_size(
+                kwargs.get("body")
+            )
+            return response
+
+        api_client.call_api = profiled_call_api
+        api_client.request = profiled_request
+        self._api_client = api_client
+
+    def uninstall(self):
+        """Restore the unwrapped methods of the ApiClient."""
+        if self._api_client is not None:
+            del self._api_client.call_api
+            del self._api_client.request
+            self._api_client = None
+
+    def record(self, key, seconds, received=0, sent=0, error=False):
+        """
+        Record a single request.
+
+        Args:
+            key (tuple): The (sdk_method, endpoint) of the request
+            seconds (float): The latency of the request
+            received (int, optional): Bytes received. Defaults to 0.
+            sent (int, optional): Bytes sent. Defaults to 0.
+            error (bool, optional): Whether the request failed. Defaults to False.
+        """
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = {"errors": 0, "received": 0, "sent": 0, "latencies": []}
+                self._stats[key] = stats
+            stats["latencies"].append(seconds)
+            stats["received"] += received
+            stats["sent"] += sent
+            stats["errors"] += int(error)
+
+    def summary(self):
+        """
+        Return the statistics of the requests of each SDK method.
+
+        Returns:
+            pandas.DataFrame: One row per (sdk_method, endpoint) with the columns of
+                PROFILE_COLUMNS, sorted by total time descending
+        """
+        with self._lock:
+            stats = {
+                key: dict(value, latencies=list(value["latencies"]))
+                for key, value in self._stats.items()
+            }
+
+        records = []
+        for (sdk_method, endpoint), value in stats.items():
+            latencies = np.array(value["latencies"])
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            records.append(
+                {
+                    "sdk_method": sdk_method,
+                    "endpoint": endpoint,
+                    "count": len(latencies),
+                    "errors": value["errors"],
+                    "bytes_received": value["received"],
+                    "bytes_sent": value["sent"],
+                    "total_seconds": latencies.sum(),
+                    "mean_seconds": latencies.mean(),
+                    "p50_seconds": p50,
+                    "p95_seconds": p95,
+                    "p99_seconds": p99,
+                    "max_seconds": latencies.max(),
+                }
+            )
+
+        summary_df = pd.DataFrame(records, columns=PROFILE_COLUMNS)
+        return summary_df.sort_values("total_seconds", ascending=False).reset_index(
+            drop=True
+        )
+
+    def histograms(self):
+        """
+        Return the latency histogram of the requests of each SDK method.
+
+        Returns:
+            dict: "<sdk_method> <endpoint>" -> counts of requests with a latency up to
+                each of LATENCY_BUCKETS, and above the last bucket
+        """
+        with self._lock:
+            latencies = {
+                key: list(value["latencies"]) for key, value in self._stats.items()
+            }
+
+        histograms = {}
+        for (sdk_method, endpoint), values in latencies.items():
+            counts, _ = np.histogram(values, bins=[0.0] + LATENCY_BUCKETS + [np.inf])
+            histograms[f"{sdk_method} {endpoint}"] = counts.tolist()
+        return histograms
+
+    def write_reports(self, output_dir):
+        """
+        Write api_profile.json and api_profile.csv to the output directory.
+
+        Args:
+            output_dir (pathlib.Path): The gear output directory
+        """
+        summary_df = self.summary()
+        summary_df.to_csv(str(output_dir / "api_profile.csv"), index=False)
+
+        profile = {
+            "total_requests": int(summary_df["count"].sum()),
+            "total_seconds": float(summary_df["total_seconds"].sum()),
+            "latency_buckets": LATENCY_BUCKETS,
+            "methods": summary_df.to_dict(orient="records"),
+            "histograms": self.histograms(),
+        }
+        with open(output_dir / "api_profile.json", "w") as fp:
+            json.dump(profile, fp, indent=4, default=float)
+
+        log.info(
+            "API profile: %i requests in %.1f seconds.",
+            profile["total_requests"],
+            profile["total_seconds"],
+        )
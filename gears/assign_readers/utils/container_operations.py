@@ -4,9 +4,11 @@ groups, projects, sessions, and acquisitions. File operations are handled in a
 different module.
 """
 import logging
-import time
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 
 import flywheel
+import pandas as pd
 
 from .file_operations import _export_files
 
@@ -52,9 +54,49 @@ SESSION_KEYS = [
     "timezone",
     "weight",
     "uid",
+    "tags",
 ]
 
-ACQUISITION_KEYS = ["info", "label", "timestamp", "timezone", "uid"]
+ACQUISITION_KEYS = ["info", "label", "timestamp", "timezone", "uid", "tags"]
+
+# Maximum number of acquisitions of a session exported concurrently
+MAX_EXPORT_WORKERS = 4
+
+# Maximum number of containers deleted concurrently in a cleanup
+MAX_CLEANUP_WORKERS = 8
+
+# Records the outcome of deleting each created container in a cleanup
+CLEANUP_RECORD_TEMPLATE = {"container": None, "id": None, "status": None, "error": ""}
+
+
+class CleanupReport:
+    """Records the outcome of deleting each container cleaned up in a run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.records = []
+
+    def add(self, records):
+        """
+        Add the records of a cleanup to the report.
+
+        Args:
+            records (list): The CLEANUP_RECORD_TEMPLATE of each container
+        """
+        with self._lock:
+            self.records.extend(records)
+
+    def report(self):
+        """
+        Return a report of the cleanups of the run.
+
+        Returns:
+            pandas.DataFrame: One row for each container with the columns of
+                CLEANUP_RECORD_TEMPLATE
+        """
+        with self._lock:
+            records = list(self.records)
+        return pd.DataFrame(records, columns=CLEANUP_RECORD_TEMPLATE.keys())
 
 
 def define_export(fw_client, container, dest_project):
@@ -124,35 +166,96 @@ def define_created(container):
     return created_container
 
 
-def _cleanup(fw_client, created_data):
+def _delete_containers(fw_client, containers, delete, max_workers):
+    """
+    Delete containers of a single level concurrently, continuing past failures.
+
+    Args:
+        fw_client (flywheel.Client): The Flywheel Client
+        containers (list): The CREATED_CONTAINER_TEMPLATE instances to delete
+        delete (callable): Deletes a container, given its id
+        max_workers (int): Maximum number of containers deleted concurrently
+
+    Returns:
+        list: The CLEANUP_RECORD_TEMPLATE of each container
+    """
+
+    def delete_container(container):
+        log.debug(container)
+        record = CLEANUP_RECORD_TEMPLATE.copy()
+        record["container"] = container["container"]
+        record["id"] = container["id"]
+        try:
+            delete(container["id"])
+            fw_client.invalidate(container["id"])
+            record["status"] = "deleted"
+        except Exception as e:
+            log.warning(
+                "Could not delete %s %s: %s", container["container"], container["id"], e
+            )
+            record["status"] = "failed"
+            record["error"] = str(e)
+        return record
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        return list(executor.map(delete_container, containers))
+
+
+def _cleanup(
+    fw_client,
+    created_data,
+    max_workers=MAX_CLEANUP_WORKERS,
+    cleanup_report=None,
+):
     """
     In the case of a failure, cleanup all containers that were created.
 
+    Acquisitions, then sessions, then subjects are deleted, with the containers of each
+    level deleted concurrently. A container that cannot be deleted does not stop the
+    cleanup of the others. The outcome for each container is added to the cleanup
+    report.
+
     Args:
         fw_client (flywheel.Client): The Flywheel Client
         created_data (dict): A list of CREATED_CONTAINER_TEMPLATE instances
-    """
+        max_workers (int, optional): Maximum number of containers deleted
+            concurrently. Defaults to MAX_CLEANUP_WORKERS.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
 
-    acquisitions = [x for x in created_data if x["container"] == "acquisition"]
-    if acquisitions:
-        log.info("Deleting %i acquisition containers", len(acquisitions))
-        for a in acquisitions:
-            log.debug(a)
-            fw_client.delete_acquisition(a["id"])
+    Returns:
+        list: The CLEANUP_RECORD_TEMPLATE of each container
+    """
+    levels = [
+        ("acquisition", fw_client.delete_acquisition),
+        ("session", fw_client.delete_session),
+        ("subject", fw_client.delete_subject),
+    ]
+    records = []
+    for container_type, delete in levels:
+        containers = [
+            x
+            for x in created_data
+            if x["container"] == container_type
+            and (container_type != "subject" or x["new"])
+        ]
+        if containers:
+            log.info("Deleting %i %s containers", len(containers), container_type)
+            records.extend(
+                _delete_containers(fw_client, containers, delete, max_workers)
+            )
 
-    sessions = [x for x in created_data if x["container"] == "session"]
-    if sessions:
-        log.info("Deleting %i session containers", len(sessions))
-        for s in sessions:
-            log.debug(s)
-            fw_client.delete_session(s["id"])
+    failed = [x for x in records if x["status"] == "failed"]
+    if failed:
+        log.error(
+            "%i of %i created containers could not be deleted.",
+            len(failed),
+            len(records),
+        )
+    if cleanup_report is not None:
+        cleanup_report.add(records)
 
-    subjects = [x for x in created_data if x["container"] == "subject" and x["new"]]
-    if subjects:
-        log.info("Deleting %i subject containers", len(subjects))
-        for s in subjects:
-            log.debug(s)
-            fw_client.delete_subject(s["id"])
+    return records
 
 
 def find_or_create_group(fw_client, group_id, group_label):
@@ -170,7 +273,7 @@ def find_or_create_group(fw_client, group_id, group_label):
     found_groups = fw_client.groups.find(f'_id="{group_id}"')
 
     if len(found_groups) > 0:
-        return found_groups[0].reload(), []
+        return fw_client.reload(found_groups[0]), []
 
     group_id = fw_client.add_group(flywheel.Group(group_id, group_label))
 
@@ -178,7 +281,7 @@ def find_or_create_group(fw_client, group_id, group_label):
 
     created_container = define_created(group)
 
-    return group.reload(), [created_container]
+    return fw_client.reload(group), [created_container]
 
 
 def apply_group_template_to_project(fw_client, project, group):
@@ -241,10 +344,8 @@ def create_project(fw_client, project_label, group, user_id, project_info=None):
     new_project = new_project.reload()
 
     # Get the generic "read-write" role and apply to the user for this project
-    rw_role = [
-        role for role in fw_client.get_all_roles() if role.label == "read-write"
-    ][0]
-    user_permission = {"_id": user_id, "role_ids": [rw_role.id]}
+    rw_role_id = fw_client.roles.read_write_id
+    user_permission = {"_id": user_id, "role_ids": [rw_role_id]}
     # If the assigner and reader are the same, accomodate for a user with admin role
     # that is automatically given permissions to the project
     if [perm.id for perm in new_project.permissions if perm.id == user_id]:
@@ -276,7 +377,8 @@ def export_or_find_subject(fw_client, source_subject, dest_project):
     """
     subj_export = define_export(fw_client, source_subject, dest_project)
 
-    dest_subject = dest_project.subjects.find_first(f'code="{source_subject.code}"')
+    subject_index = fw_client.subject_index(dest_project)
+    dest_subject = subject_index.get(source_subject.code)
     if not dest_subject:
         log.info(
             "Subject %s does not exist in project %s.",
@@ -284,41 +386,28 @@ def export_or_find_subject(fw_client, source_subject, dest_project):
             dest_project.label,
         )
         log.info("CREATING SUBJECT CONTAINER")
-        subj_export["status"] = "created"
         subject_metadata = {}
         for key in SUBJECT_KEYS:
             value = source_subject.get(key)
             if value:
                 subject_metadata[key] = value
 
-        # Attempt to create the subject. This may fail as a batch-run could
-        # result in the subject having been created already, thus we try/except
-        # and look for the subject again.
-        try:
-            dest_subject = dest_project.add_subject(subject_metadata)
+        # The subject may have been created by another job of a batch-run since the
+        # project was indexed, in which case the existing subject is used.
+        dest_subject, created = subject_index.create(subject_metadata)
+        if created:
             log.info("Created %s in %s", dest_subject.code, dest_project.label)
-
+            subj_export["status"] = "created"
             created_container = define_created(dest_subject)
-
-        except flywheel.ApiException as e:
-            log.warning(
-                "Could not generate subject: {} -- {}".format(e.status, e.reason)
-            )
-            log.info("Attempting to find subject...")
-            time.sleep(2)
-            dest_subject = dest_project.subjects.find_first(
-                f'code="{source_subject.code}"'
+        else:
+            log.info(
+                "... found existing subject %s in project: %s. "
+                "Using existing container.",
+                dest_subject.code,
+                dest_project.label,
             )
-            if dest_subject:
-                log.info(
-                    "... found existing subject %s in project: %s. "
-                    "Using existing container.",
-                    dest_subject.code,
-                    dest_project.label,
-                )
-                subj_export["status"] = "used existing"
-            else:
-                raise
+            subj_export["status"] = "used existing"
+            created_container = None
     else:
         log.info(
             "Found existing subject %s in project: %s. Using existing container.",
@@ -331,7 +420,15 @@ def export_or_find_subject(fw_client, source_subject, dest_project):
     return dest_subject, subj_export, created_container
 
 
-def export_session(fw_client, source_session, dest_project, export_info=False):
+def export_session(
+    fw_client,
+    source_session,
+    dest_project,
+    export_info=False,
+    max_workers=MAX_EXPORT_WORKERS,
+    transfer_engine=None,
+    cleanup_report=None,
+):
     """
     Export a session (source_session) to project (dest_project).
 
@@ -341,6 +438,12 @@ def export_session(fw_client, source_session, dest_project, export_info=False):
         dest_project (flywheel.Project): The destination project receiving the
             source session
         export_info (bool, optional): Export session info or not. Defaults to False.
+        max_workers (int, optional): Maximum number of acquisitions exported
+            concurrently. Defaults to MAX_EXPORT_WORKERS.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
 
     Returns:
         tuple:  dest_session(flywheel.Session),
@@ -384,13 +487,11 @@ def export_session(fw_client, source_session, dest_project, export_info=False):
                 if value:
                     session_metadata[key] = value
 
-        # Add session to the subject
+        # Add session, with its tags, to the subject
         dest_session = dest_subject.add_session(session_metadata)
+        fw_client.invalidate(dest_subject.id)
         created_container = define_created(dest_session)
 
-        for tag in source_session.tags:
-            dest_session.add_tag(tag)
-
         exported_data.append(session_export)
 
         if created_container:
@@ -398,30 +499,25 @@ def export_session(fw_client, source_session, dest_project, export_info=False):
         ########################################################################
         # For each acquisition, create the export_acquisition, upload and modify
         # the files
-        num_acq = len(source_session.acquisitions())
+        source_acquisitions = source_session.acquisitions()
+        num_acq = len(source_acquisitions)
         log.info("EXPORTING %i ACQUISITIONS...", num_acq)
-        acq_count = 0
         if num_acq == 0:
             log.warning(
                 "NO ACQUISITIONS FOUND ON THE SESSION! "
                 "Resulting session will have no acquisitions."
             )
-        for source_acquisition in source_session.acquisitions():
-            acq_count += 1
-            log.info("ACQUISITION %i/%i", acq_count, num_acq)
-            log.info(
-                "CREATING ACQUISITION CONTAINER: [label=%s]", source_acquisition.label
-            )
-            _, acq_export, created_container = export_acquisition(
-                fw_client, source_acquisition, dest_session
-            )
-            exported_data.append(acq_export)
-
-            if created_container:
-                created_data.append(created_container)
+        acq_exports = _export_acquisitions(
+            fw_client,
+            source_acquisitions,
+            dest_session,
+            created_data,
+            max_workers,
+            transfer_engine,
+        )
+        exported_data.extend(acq_exports)
 
         log.info("All acquisitions exported.")
-        source_session = source_session.reload()
         # if 'EXPORTED' not in source_session.get('tags', []):
         #     log.info(
         #         'Adding "EXPORTED" tag to %s.',
@@ -433,11 +529,97 @@ def export_session(fw_client, source_session, dest_project, export_info=False):
     except Exception as e:
         log.exception("ERRORS DETECTED exporting session, %s", source_session.label)
         log.info("CLEANING UP...")
-        _cleanup(fw_client, created_data)
+        _cleanup(fw_client, created_data, cleanup_report=cleanup_report)
         raise e
 
 
-def export_acquisition(fw_client, source_acquisition, dest_session):
+def _export_acquisitions(
+    fw_client,
+    source_acquisitions,
+    dest_session,
+    created_data,
+    max_workers=MAX_EXPORT_WORKERS,
+    transfer_engine=None,
+):
+    """
+    Export acquisitions to dest_session, up to max_workers at a time.
+
+    The export records are returned in the order of source_acquisitions, regardless of
+    the order in which the exports complete. The containers created by every export
+    are added to created_data, in the same order, before any error is raised so that
+    `_cleanup` removes them. As soon as an export fails, exports not yet started are
+    cancelled.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        source_acquisitions (list): The acquisitions (flywheel.Acquisition) to export
+        dest_session (flywheel.Session): Flywheel session to receive the acquisitions
+        created_data (list): CREATED_CONTAINER_TEMPLATE records of the export
+        max_workers (int, optional): Maximum number of acquisitions exported
+            concurrently. Defaults to MAX_EXPORT_WORKERS.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+
+    Returns:
+        list: EXPORTED_CONTAINER_TEMPLATE for each acquisition
+    """
+    num_acq = len(source_acquisitions)
+    # The containers created by each export, in the order of source_acquisitions
+    acq_created_data = [[] for _ in source_acquisitions]
+
+    def export(acq_index, source_acquisition):
+        log.info("ACQUISITION %i/%i", acq_index + 1, num_acq)
+        log.info(
+            "CREATING ACQUISITION CONTAINER: [label=%s]", source_acquisition.label
+        )
+        source_acquisition = fw_client.reload(source_acquisition)
+        _, acq_export, _ = export_acquisition(
+            fw_client,
+            source_acquisition,
+            dest_session,
+            created_data=acq_created_data[acq_index],
+            transfer_engine=transfer_engine,
+        )
+        return acq_export
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+        futures = [
+            executor.submit(export, acq_index, source_acquisition)
+            for acq_index, source_acquisition in enumerate(source_acquisitions)
+        ]
+        # Exports not yet started are cancelled as soon as any export fails
+        done, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+        if any(future.exception() is not None for future in done):
+            for future in not_done:
+                future.cancel()
+
+    # The records and first error are taken in the order of source_acquisitions
+    acq_exports = []
+    error = None
+    for future in futures:
+        if future.cancelled():
+            continue
+        if future.exception() is None:
+            acq_exports.append(future.result())
+        elif error is None:
+            error = future.exception()
+
+    for acq_created in acq_created_data:
+        created_data.extend(acq_created)
+
+    if error:
+        raise error
+
+    return acq_exports
+
+
+def export_acquisition(
+    fw_client,
+    source_acquisition,
+    dest_session,
+    created_data=None,
+    transfer_engine=None,
+):
     """
     exports acquisition object, acquisition metadata, and acquisitions files
 
@@ -445,6 +627,11 @@ def export_acquisition(fw_client, source_acquisition, dest_session):
         fw_client (flywheel.Client): Flywheel Client object instantiated on instance
         source_acquisition (flywheel.Acquisition): Flywheel acquisition to export
         dest_session (flywheel.Session): Flywheel session to receive source acquisition
+        created_data (list, optional): If provided, the created acquisition is
+            recorded here before its files are exported, so that it can be cleaned up
+            if the export of its files fails. Defaults to None.
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
 
     Returns:
         tuple:  dest_acquisition(flywheel.Acquisition),
@@ -462,16 +649,16 @@ def export_acquisition(fw_client, source_acquisition, dest_session):
         if value:
             acquisition_metadata[key] = value
 
-    # Add acquisition to the session
+    # Add acquisition, with its tags, to the session
     dest_acquisition = dest_session.add_acquisition(acquisition_metadata)
+    fw_client.invalidate(dest_session.id)
 
     created_container = define_created(dest_acquisition)
-
-    for tag in source_acquisition.tags:
-        dest_acquisition.add_tag(tag)
+    if created_data is not None:
+        created_data.append(created_container)
 
     # Export the individual files in each acquisition
     log.info("Exporting files to %s...", dest_acquisition.label)
-    _export_files(fw_client, source_acquisition, dest_acquisition)
+    _export_files(fw_client, source_acquisition, dest_acquisition, transfer_engine)
 
     return dest_acquisition, acquisition_export, created_container
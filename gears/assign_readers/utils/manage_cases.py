@@ -191,7 +191,7 @@ def define_reader_csv(context):
         )
 
 
-def find_readers_in_project_by_permission(project, reader_roles=None):
+def find_readers_in_project_by_permission(project, reader_roles):
     """ finds a user with a specific set of permissions on a flywheel project
 
     Given a project, this function looks for a user with the roles/permissions
@@ -199,18 +199,13 @@ def find_readers_in_project_by_permission(project, reader_roles=None):
 
     Args:
         project (flywheel.Project): a flywheel project to look for user roles on
+        reader_roles (set): the ids of the roles a reader can have (see
+            `RoleRegistry.reader_role_ids`)
 
     Returns:
         reader_ids (list): a list of
     """
 
-    if not reader_roles:
-        reader_roles = [
-            role.id
-            for role in fw_client.get_all_roles()
-            if role.label in ["read-write", "read-only"]
-        ]
-
     reader_ids = []
     for perm in project.permissions:
         log.debug(f"Found permission: {perm}")
@@ -222,7 +217,7 @@ def find_readers_in_project_by_permission(project, reader_roles=None):
     return reader_ids
 
 
-def find_and_add_readers_by_perm(project, reader_roles=None):
+def find_and_add_readers_by_perm(project, reader_roles):
     """ Finds a user with the correct flywheel roles/permissions on a given
 
     project, and adds that user ID to the projects metadata:
@@ -256,7 +251,7 @@ def find_and_add_readers_by_perm(project, reader_roles=None):
     return pf_reader
 
 
-def find_readers_in_projects(projects, reader_roles=None):
+def find_readers_in_projects(projects, reader_roles):
     """ Finds the reader ids on a set of projects
 
     Kind of an "interem" function...the old way of doing things was to always
@@ -307,54 +302,7 @@ def find_readers_in_projects(projects, reader_roles=None):
     return reader_ids
 
 
-def find_reader_project_from_id(projects, reader_id, reader_roles=None):
-    """ finds a reader's project given a reader ID.
-
-    Given a flywheel user id, find the project that they are a reader on.
-
-    This has legacy functionality.  Ideally reader projects have the reader id
-    stored in the metadata key:
-
-    `project.info.project_features.reader.id`
-
-    But if that's not there, we have to use the legacy method of finding the project,
-    based on role.  If we find it that way, populate the
-    `project.info.project_features.reader.id` metadata key
-
-    Args:
-        projects (list): a list of flywheel projects to search through for the reader
-        reader_id (string): the email of the reader to locate
-        reader_roles (list): a list of flywheel roles that are intended for readers,
-            usually read/write and read only
-
-    Returns:
-        reader_project (flywheel.Project): the project that the reader specified in
-            `reader_id` is assigned to
-
-    """
-
-    reader_project = []
-
-    for proj in projects:
-        proj_readers = find_readers_in_projects(proj, reader_roles)
-        if reader_id in proj_readers:
-            reader_project.append(proj)
-
-    if len(reader_project) > 1:
-        log.warning(f"WARNING {len(reader_project)} projects found for reader {reader_id}:")
-        log.warning([p.label for p in reader_project])
-        log.warning(f"Returning first project")
-
-    if len(reader_project) == 0:
-        log.warning(f"No projects found for reader {reader_id}")
-        reader_project = [None]
-
-    reader_project = reader_project[0]
-
-    return reader_project
-
-
-def update_reader_projects_metadata(fw_client, group_projects, readers_df):
+def update_reader_projects_metadata(fw_client, reader_index, readers_df):
     """
     Update reader group projects' metadata according to the csv/dataframe contents
 
@@ -367,23 +315,19 @@ def update_reader_projects_metadata(fw_client, group_projects, readers_df):
     exist in the DataFrame and as a reader project.
 
     Args:
-        group_projects (list): List of Flywheel Projects
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
+        reader_index (ReaderIndex): The index of the reader projects in the group
         readers_df (pandas.DataFrame): Pandas Dataframe containing columns:
             "email", "first_name", "last_name", and "max_cases"
     """
 
-
-    group_reader_ids = find_readers_in_projects(group_projects)
-
-
     for index in readers_df.index:
         reader_id = readers_df.email[index]
         # if the csv reader_id is not in the current reader projects, skip
-        if reader_id not in group_reader_ids:
+        if reader_id not in reader_index:
             continue
 
-        reader_project = find_reader_project_from_id(group_projects, reader_id, proj_roles)
-        reader_project = reader_project.reload()
+        reader_project = reader_index.get_project(reader_id)
         # If this reader has no project yet, skip (OR SHOULD THIS ERROR?)
         if reader_project is None:
             log.info(f"skipping reader {reader_id} with no current project")
@@ -411,16 +355,17 @@ def update_reader_projects_metadata(fw_client, group_projects, readers_df):
         # update if csv.max_cases and info.max_cases are different
         if csv_max_cases is not project_max_cases:
             reader_project.update_info(project_info)
+            fw_client.invalidate(reader_project.id)
+            reader_index.update(reader_project)
 
 
-def instantiate_new_readers(fw_client, group, readers_df):
+def instantiate_new_readers(fw_client, reader_index, readers_df):
     """
     Instantiate and grant permissions to new readers found in readers_df
 
     Args:
         fw_client (flywheel.Client): The Flywheel client
-        group (flywheel.Group): The flywheel group that reader projects are created in
-        group_readers (list): ids for each reader with ro/rw permission to the group
+        reader_index (ReaderIndex): The index of the reader projects in the group
         readers_df (pandas.DataFrame): DataFrame for reader updates and creation
 
     Returns:
@@ -445,33 +390,7 @@ def instantiate_new_readers(fw_client, group, readers_df):
         fw_client.add_user(fw_user)
 
     # A Reader Project will have only one rw/ro user
-    reader_roles = [
-        role.id
-        for role in fw_client.get_all_roles()
-        if role.label in ["read-write", "read-only"]
-    ]
-
-
-    # Below is the "original" code, which was modified to the code immediately below it.
-    # List comprehension is faster, but I have expanded it for better logging, AND also
-    # there was a problem with the new flywheel permissions that caused an error with 
-    # the old code.  I am leaving it in for now in case any weird problems arise in the
-    # future, so we can reference the "original" code quickly in case I missed something
-    # 2021-05-18
-
-    # project_readers = [
-    #     [
-    #         perm.id
-    #         for perm in proj.permissions
-    #         if set(perm.role_ids).intersection(proj_roles)
-    #     ][0]
-    #     for proj in group.projects()
-    # ]
-
-    projects = fw_client.projects.iter_find(f'group={group.id},label=~Reader [0-9][0-9]?[0-9]?', limit=50)
-    # Tested on imidex, iters uses pagination by default, this works when a simple finder would fail
-    projects = list(projects)
-    project_readers = find_readers_in_projects(projects, reader_roles)
+    project_readers = reader_index.reader_ids
                 
     # If the readers email (from the dataframe) is not in the project readers list,
     # We will initiate it.
@@ -514,9 +433,8 @@ def create_or_update_reader_projects(
             "container", "id", and "new" as described in define_container above.
     """
 
-    # Generate list of all projects in this group
-    group_projects = fw_client.projects.iter_find(f'group={group.id},label=~Reader [0-9][0-9]?[0-9]?', limit=50)
-    group_projects = list(group_projects)
+    # Index all reader projects in this group
+    reader_index = fw_client.reader_index(group.id)
 
 
     # Keep track of the created containers, in case of "rollback"
@@ -538,11 +456,11 @@ def create_or_update_reader_projects(
         if all([(c in readers_df.columns) for c in req_columns]):
             # update max_cases for existing projects in the reader group according to
             # csv data
-            update_reader_projects_metadata(fw_client, group_projects, readers_df)
+            update_reader_projects_metadata(fw_client, reader_index, readers_df)
 
             # identify new readers, instantiate, give group permissions
             readers_to_instantiate = instantiate_new_readers(
-                fw_client, group, readers_df
+                fw_client, reader_index, readers_df
             )
 
         else:
@@ -559,7 +477,7 @@ def create_or_update_reader_projects(
     
     for reader, _max_cases in readers_to_instantiate:
         # reader_number = len(group.projects()) + 1
-        reader_number = get_reader_number(fw_client, group.id)
+        reader_number = reader_index.next_reader_number()
         project_label = "Reader " + str(reader_number)
         project_info = {
             "project_features": {"assignments": [], "max_cases": _max_cases, "reader": {"id": reader}}
@@ -568,21 +486,10 @@ def create_or_update_reader_projects(
         new_project, created_container = create_project(
             fw_client, project_label, group, reader, project_info
         )
+        reader_index.add(new_project, reader)
         if ohif_config_path and os.path.exists(ohif_config_path):
             new_project.upload_file(ohif_config_path)
 
         created_data.append(created_container)
 
     return created_data
-
-
-def get_reader_number(fw_client, group_id):
-
-    projects = fw_client.projects.iter_find(f'group={group_id},label=~Reader [0-9][0-9]?[0-9]?', limit=50)
-    numbers = [int(p.label.split('Reader ')[-1]) for p in projects]
-    if len(numbers) > 0:
-        number = max(numbers)+1
-    else:
-        number = 1
-
-    return number
\ No newline at end of file
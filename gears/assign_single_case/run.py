@@ -9,12 +9,16 @@ import os
 
 from flywheel_gear_toolkit import GearToolkitContext
 
+from utils.api_profiler import ApiProfiler
 from utils.check_jobs import (
     DuplicateJobError,
     InsufficientPermissionsError,
     check_for_duplicate_execution,
     verify_user_permissions,
 )
+from utils.container_cache import ContainerCache
+from utils.container_operations import CleanupReport
+from utils.file_cache import FileCache
 from utils.manage_cases import (
     ExceededConstraintsError,
     ExistingReaderCaseError,
@@ -25,13 +29,36 @@ from utils.manage_cases import (
     assign_single_case,
     check_valid_reader,
 )
+from utils.transfer_engine import TransferEngine
 
 log = logging.getLogger(__name__)
 
 
 def main(context):
+    # Requests to the instance are profiled only when requested
+    api_profiler = None
+    if context.config.get("profile_api_calls"):
+        api_profiler = ApiProfiler()
+        api_profiler.install(context.client)
+
+    # The containers removed by the cleanup of failed exports are reported
+    cleanup_report = CleanupReport()
+    file_cache = None
     try:
-        fw_client = context.client
+        fw_client = ContainerCache(context.client)
+        # Files downloaded earlier in the run are served from a local cache
+        file_cache = FileCache(
+            context.work_dir / "file_cache",
+            max_bytes=context.config.get("file_cache_size_mb", 2048) * 1024 * 1024,
+        )
+        # Transfers the files of all sessions exported in this run, within the
+        # optional budget of bytes downloaded
+        byte_budget = context.config.get("transfer_budget_mb")
+        if byte_budget is not None:
+            byte_budget *= 1024 * 1024
+        transfer_engine = TransferEngine(
+            fw_client, byte_budget=byte_budget, file_cache=file_cache
+        )
 
         verify_user_permissions(fw_client, context)
         check_for_duplicate_execution(fw_client)
@@ -48,7 +75,7 @@ def main(context):
             )
 
         if analysis.parents["session"]:
-            source_session = fw_client.get(analysis.parents["session"]).reload()
+            source_session = fw_client.get(analysis.parents["session"])
         else:
             raise InvalidLaunchContainerError(
                 'This gear can only be run at the "Session" level.'
@@ -63,11 +90,19 @@ def main(context):
                 reader_group_id,
                 context.config["reader_email"],
                 context.config["assignment_reason"],
+                transfer_engine=transfer_engine,
+                cleanup_report=cleanup_report,
             )
 
         source_sess_df.to_csv(str(context.output_dir / "master_project_case_data.csv"))
         dest_proj_df.to_csv(str(context.output_dir / "reader_project_case_data.csv"))
         exported_data_df.to_csv(str(context.output_dir / "exported_data.csv"))
+        transfer_engine.report().to_csv(
+            str(context.output_dir / "transfer_report.csv"), index=False
+        )
+        transfer_engine.log_summary()
+
+        fw_client.log_summary()
     except (
         DuplicateJobError,
         InsufficientPermissionsError,
@@ -85,6 +120,14 @@ def main(context):
         log.exception(e,)
         log.fatal("Error executing assign-single-case.",)
         return 1
+    finally:
+        if api_profiler:
+            api_profiler.write_reports(context.output_dir)
+        cleanup_report.report().to_csv(
+            str(context.output_dir / "cleanup_report.csv"), index=False
+        )
+        if file_cache is not None:
+            file_cache.clear()
 
     log.info("assign-single-case completed Successfully!")
     return 0
@@ -0,0 +1,189 @@
+"""
+A local, content-addressed cache of the files exported in a run.
+
+A source file is exported once for each reader it is assigned to, and again when an
+export is retried. The cache keeps a copy of each file downloaded in the run so that
+later exports of the same file are served locally. Files are keyed by their content
+hash or, where no hash is available, by their file id and version.
+
+The cache is bounded in size. When adding a file would exceed the bound, the least
+recently used files are evicted.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+# Default maximum number of bytes held in the cache
+MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024
+
+
+def cache_key(acq_file):
+    """
+    Return the key of a file in the cache.
+
+    Args:
+        acq_file (flywheel.FileEntry): The file to key
+
+    Returns:
+        str: The content hash of the file, or its file id and version. None if the file
+            has neither.
+    """
+    if getattr(acq_file, "hash", None):
+        return acq_file.hash
+    if getattr(acq_file, "file_id", None):
+        return f"{acq_file.file_id}_v{acq_file.version}"
+    return None
+
+
+class FileCache:
+    """
+    Caches files on disk with least recently used eviction.
+
+    Cached files are read and linked while the cache lock is held, so a file evicted
+    by another thread remains available to those already reading it.
+
+    Args:
+        cache_dir (str): The directory holding the cached files. Created if needed.
+        max_bytes (int, optional): Maximum number of bytes held in the cache.
+            Defaults to MAX_CACHE_BYTES.
+    """
+
+    def __init__(self, cache_dir, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = str(cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> size, least recently used first
+        self._entries = OrderedDict()
+        self.bytes_cached = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _lookup(self, acq_file):
+        """Return the path of a cached file, marking it most recently used."""
+        key = cache_key(acq_file)
+        if key is None or key not in self._entries:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return self._path(key)
+
+    def read(self, acq_file):
+        """
+        Return the contents of a cached file.
+
+        Args:
+            acq_file (flywheel.FileEntry): The file to read
+
+        Returns:
+            bytes: The contents of the file, or None if it is not cached
+        """
+        with self._lock:
+            path = self._lookup(acq_file)
+            if path is None:
+                return None
+            # An open file can still be read after it is evicted
+            fp = open(path, "rb")
+        with fp:
+            return fp.read()
+
+    def fetch(self, acq_file, dest_path):
+        """
+        Place a copy of a cached file at dest_path.
+
+        Args:
+            acq_file (flywheel.FileEntry): The file to fetch
+            dest_path (str): The path to place the file at
+
+        Returns:
+            bool: True if the file was cached and placed at dest_path
+        """
+        with self._lock:
+            path = self._lookup(acq_file)
+            if path is None:
+                return False
+            try:
+                os.link(path, dest_path)
+                return True
+            except OSError:
+                # Linking is not supported across all file systems
+                fp = open(path, "rb")
+        with fp, open(dest_path, "wb") as dest_fp:
+            shutil.copyfileobj(fp, dest_fp)
+        return True
+
+    def put(self, acq_file, contents):
+        """
+        Add a file to the cache, evicting the least recently used files as needed.
+
+        Files larger than the cache, and files without a key, are not cached.
+
+        Args:
+            acq_file (flywheel.FileEntry): The file to cache
+            contents (bytes/str): The contents of the file or the path of a local copy
+        """
+        key = cache_key(acq_file)
+        if key is None:
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=".")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                if isinstance(contents, bytes):
+                    fp.write(contents)
+                else:
+                    with open(contents, "rb") as src_fp:
+                        shutil.copyfileobj(src_fp, fp)
+            size = os.path.getsize(tmp_path)
+            if size > self.max_bytes:
+                log.debug("%s is larger than the file cache.", acq_file.name)
+                return
+            with self._lock:
+                if key in self._entries:
+                    return
+                while self._entries and self.bytes_cached + size > self.max_bytes:
+                    evicted_key, evicted_size = self._entries.popitem(last=False)
+                    os.remove(self._path(evicted_key))
+                    self.bytes_cached -= evicted_size
+                    self.evictions += 1
+                os.replace(tmp_path, self._path(key))
+                self._entries[key] = size
+                self.bytes_cached += size
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def clear(self):
+        """Remove all files from the cache."""
+        with self._lock:
+            for key in self._entries:
+                os.remove(self._path(key))
+            self._entries.clear()
+            self.bytes_cached = 0
+
+    def log_summary(self):
+        """Log the hits, misses, and evictions of the cache."""
+        log.info(
+            "File cache: %i hits, %i misses, %i evictions, %i files (%i bytes) cached.",
+            self.hits,
+            self.misses,
+            self.evictions,
+            len(self._entries),
+            self.bytes_cached,
+        )
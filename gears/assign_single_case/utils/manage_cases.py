@@ -4,6 +4,8 @@ import logging
 import pandas as pd
 
 from .container_operations import export_session, find_or_create_group
+from .info_buffer import InfoWriteBuffer
+from .session_loader import iter_project_sessions
 
 log = logging.getLogger(__name__)
 
@@ -184,7 +186,7 @@ def check_valid_reader(fw_client, reader_id, group_id):
     Checks for the existing reader project for indicated reader_id.
 
     Args:
-        fw_client (flywheel.Client): Flywheel instance client for api calls.
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
         reader_id (str): The email of the reader to validate
         group_id (str): The id of the reader group
 
@@ -195,42 +197,8 @@ def check_valid_reader(fw_client, reader_id, group_id):
         boolean: Returns `True` if reader has assigned project
     """
 
-    group_projects = fw_client.projects.find(f'group="{group_id}"')
-
-    proj_roles = [
-        role.id
-        for role in fw_client.get_all_roles()
-        if role.label in ["read-write", "read-only"]
-    ]
-    
-    # Below is the "original" code, which was modified to the code immediately below it.
-    # List comprehension is faster, but I have expanded it for better logging, AND also
-    # there was a problem with the new flywheel permissions that caused an error with 
-    # the old code.  I am leaving it in for now in case any weird problems arise in the
-    # future, so we can reference the "original" code quickly in case I missed something
-    # 2021-05-18
-    
-    # valid_reader_ids = [
-    #     [
-    #         perm.id
-    #         for perm in proj.permissions
-    #         if set(perm.role_ids).intersection(proj_roles)
-    #     ][0]
-    #     for proj in group_projects
-    # ]
-    #
-    
-    valid_reader_ids = []
-    for proj in group_projects:
-        log.debug(f"searching for permissions in {proj.label}")
-        for perm in proj.permissions:
-            log.debug(f"Found permission: {perm}")
-            role_match = set(perm.role_ids).intersection(proj_roles)
-            log.debug(f"roles match {role_match}")
-            if role_match:
-                valid_reader_ids.extend(perm.id)
-
-    if reader_id in valid_reader_ids:
+    # The reader projects of the group are indexed once per run
+    if reader_id in fw_client.reader_index(group_id):
         return True
 
     raise InvalidReaderError(
@@ -244,7 +212,7 @@ def initialize_dataframes(fw_client, reader_group):
     Initializes pandas DataFrames used to select sessions and reader projects
 
     Args:
-        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        fw_client (ContainerCache): Flywheel Client object wrapped in a ContainerCache
         reader_group (flywheel.Group): The reader group
 
     Returns:
@@ -266,29 +234,16 @@ def initialize_dataframes(fw_client, reader_group):
         dtype="object",
     )
 
-    # Initialize destination projects dataframe
-    # This probably doesn't need a limit since projects aren't going to be in the 1000's
-    for reader_proj in fw_client.projects.iter_find(f'group="{reader_group.id}"'):
-        reader_proj = reader_proj.reload()
-        project_features = reader_proj.info["project_features"]
-        # Valid roles for readers are "read-write" and "read-only"
-        proj_roles = [
-            role.id
-            for role in fw_client.get_all_roles()
-            if role.label in ["read-write", "read-only"]
-        ]
-        reader_id = [
-            perm.id
-            for perm in reader_proj.permissions
-            if set(perm.role_ids).intersection(proj_roles)
-        ][0]
+    # Initialize destination projects dataframe from the indexed reader projects
+    for reader_record in fw_client.reader_index(reader_group.id):
+        reader_proj = fw_client.get(reader_record["id"])
         # Fill the dataframe with project data.
         dest_projects_df.loc[dest_projects_df.shape[0] + 1] = [
-            reader_proj.id,
-            reader_proj.label,
-            reader_id,
-            project_features["assignments"],
-            project_features["max_cases"],
+            reader_record["id"],
+            reader_record["label"],
+            reader_record["reader_id"],
+            reader_record["assignments"],
+            reader_record["max_cases"],
             len(reader_proj.sessions()),
         ]
 
@@ -374,7 +329,15 @@ def assess_completed_status(ohif_viewer, reader_id=None):
     return completed_status, error_msg
 
 
-def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reason):
+def assign_single_case(
+    fw_client,
+    src_session,
+    reader_group_id,
+    reader_id,
+    reason,
+    transfer_engine=None,
+    cleanup_report=None,
+):
     """
     assign_single_case [summary]
 
@@ -384,6 +347,10 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
         reader_group_id (str): The reader group id "readers"
         reader_id (str): The email of the reader to assign/update a single case
         reason (str): The type of assignment/update
+        transfer_engine (TransferEngine, optional): The engine transferring the
+            files of the run. Defaults to None.
+        cleanup_report (CleanupReport, optional): The report of the cleanups of the
+            run. Defaults to None.
 
     Raises:
         InvalidReaderError: Raised when a reader is not found
@@ -401,7 +368,13 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
             dest_projects_df,
             exported_data_df
     """
-    src_project = fw_client.get(src_session.parents["project"]).reload()
+    # Stage the info writes to sessions and projects. Info is tracked as loaded so
+    # that unchanged info is not written.
+    info_buffer = InfoWriteBuffer(fw_client)
+    info_buffer.track(src_session)
+
+    src_project = fw_client.get(src_session.parents["project"])
+    info_buffer.track(src_project)
 
     # Grab project-level features, if it does not exist, set defaults
     project_features = (
@@ -430,7 +403,8 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
     try:
         indx = dest_projects_df[dest_projects_df.reader_id == reader_id].index[0]
         project_id = dest_projects_df.id[indx]
-        reader_proj = fw_client.get(project_id).reload()
+        reader_proj = fw_client.get(project_id)
+        info_buffer.track(reader_proj)
     except Exception as e:
         log.error(
             "The reader (%s) was not found in this project. Ensure you are entering a "
@@ -504,7 +478,11 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
         try:
             # export the session to the reader project
             dest_session, _exported_data, _created_data = export_session(
-                fw_client, src_session, fw_client.get(project_id)
+                fw_client,
+                src_session,
+                reader_proj,
+                transfer_engine=transfer_engine,
+                cleanup_report=cleanup_report,
             )
 
             exported_data.extend(_exported_data)
@@ -565,7 +543,8 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
 
             _reader_id = reader_id.replace(".", "_")
 
-            dest_session = fw_client.get(assignment["session_id"]).reload()
+            dest_session = fw_client.get(assignment["session_id"])
+            info_buffer.track(dest_session)
             if assess_completed_status(dest_session.info.get("ohifViewer"), _reader_id)[
                 0
             ]:
@@ -607,15 +586,17 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
         dest_ohifViewer["read"][_reader_id]["readOnly"] = False
         dest_ohifViewer["read"][_reader_id]["notes"].update(temp_dict)
 
-        dest_session.update_info({"ohifViewer": dest_ohifViewer})
+        info_buffer.update_info(dest_session, {"ohifViewer": dest_ohifViewer})
 
     # Record updates to the source session
     session_info = {"session_features": session_features}
-    src_session.update_info(session_info)
+    info_buffer.update_info(src_session, session_info)
 
     # Iterate through sessions to record system state of Assigned Sessions
-    for tmp_session in src_project.sessions():
-        tmp_session = tmp_session.reload()
+    for tmp_session in iter_project_sessions(fw_client, src_project.id):
+        # The update to the source session has not been written yet
+        info_buffer.track(tmp_session)
+        tmp_session = info_buffer.apply_pending(tmp_session)
         session_features = set_session_features(tmp_session, 3)
         # always record the state in the dataframe.
         session_features["id"] = tmp_session.id
@@ -645,9 +626,9 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
         session_info = {"session_features": session_features}
 
         # Restore the session_features to the source session
-        tmp_session.update_info(session_info)
+        info_buffer.update_info(tmp_session, session_info)
 
-    src_project.update_info({"project_features": project_features})
+    info_buffer.update_info(src_project, {"project_features": project_features})
 
     # update reader project from updates to the dataframe
     project_info = {
@@ -657,7 +638,11 @@ def assign_single_case(fw_client, src_session, reader_group_id, reader_id, reaso
         }
     }
 
-    reader_proj.update_info(project_info)
+    info_buffer.update_info(reader_proj, project_info)
+
+    # All info writes are merged per container and made together
+    info_buffer.flush()
+    info_buffer.log_summary()
 
     # Create a DataFrame from exported_data and then export
     exported_data_df = pd.DataFrame(data=exported_data)
@@ -0,0 +1,72 @@
+"""
+Bulk loading of the sessions of a project.
+
+Session finders return sessions without their "Custom Information" (info). Calling
+`session.reload()` on each session to retrieve it is a round trip per session. The
+functions here retrieve the sessions of a project, with their info and subject, in
+pages instead.
+
+An incremental run selects the sessions to load by id. The sessions are then listed
+without their info, and only the sessions selected are reloaded.
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+# Number of sessions retrieved with each request
+SESSION_PAGE_SIZE = 100
+
+
+def iter_project_sessions(
+    fw_client, project_id, page_size=SESSION_PAGE_SIZE, select=None
+):
+    """
+    Yield the sessions of a project with their info and subject populated.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        project_id (str): The id of the project to retrieve sessions from
+        page_size (int, optional): The number of sessions retrieved with each request.
+            Defaults to SESSION_PAGE_SIZE.
+        select (callable, optional): Returns whether to load a session, given its id.
+            Defaults to None, loading every session.
+
+    Yields:
+        flywheel.Session: A session with its info and subject populated
+    """
+    sessions = fw_client.sessions.iter_find(
+        f"project={project_id}", limit=page_size, include_all_info=select is None
+    )
+    n_sessions = 0
+    n_loaded = 0
+    for session in sessions:
+        n_sessions += 1
+        if select is not None:
+            if not select(session.id):
+                continue
+            session = fw_client.reload(session)
+        # Fallback for a session returned without info
+        elif session.info is None:
+            session = fw_client.reload(session)
+        n_loaded += 1
+        yield session
+
+    log.debug(
+        "Loaded %i of %i sessions from project %s.", n_loaded, n_sessions, project_id
+    )
+
+
+def load_project_sessions(fw_client, project_id, page_size=SESSION_PAGE_SIZE):
+    """
+    Return the sessions of a project with their info and subject populated.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+        project_id (str): The id of the project to retrieve sessions from
+        page_size (int, optional): The number of sessions retrieved with each request.
+            Defaults to SESSION_PAGE_SIZE.
+
+    Returns:
+        list: The sessions (flywheel.Session) of the project
+    """
+    return list(iter_project_sessions(fw_client, project_id, page_size))
@@ -5,12 +5,14 @@ import os
 
 from flywheel_gear_toolkit import GearToolkitContext
 
+from utils.api_profiler import ApiProfiler
 from utils.check_jobs import (
     DuplicateJobError,
     InsufficientPermissionsError,
     check_for_duplicate_execution,
     verify_user_permissions,
 )
+from utils.container_cache import ContainerCache
 from utils.manage_cases import (
     InvalidGroupError,
     MissingDICOMTagError,
@@ -25,8 +27,14 @@ log.setLevel("DEBUG")
 
 
 def main(context):
+    # Requests to the instance are profiled only when requested
+    api_profiler = None
+    if context.config.get("Profile API Calls"):
+        api_profiler = ApiProfiler()
+        api_profiler.install(context.client)
+
     try:
-        fw_client = context.client
+        fw_client = ContainerCache(context.client)
 
         verify_user_permissions(fw_client, context)
         check_for_duplicate_execution(fw_client)
@@ -36,6 +44,7 @@ def main(context):
         source_project = fw_client.get_project(analysis.parents["project"])
         reader_group_id = source_project.group
         copyroi = context.config["Display Reads In Main Project"]
+        export_lengths = context.config.get("Export Length Measurements", False)
 
         # TODO: Make sure this doesn't mess other things up
         # If gear is run within the Readers group, error and exit
@@ -45,12 +54,12 @@ def main(context):
         #     )
 
         # Check for projects in the reader group
-        group = fw_client.get(reader_group_id).reload()
+        group = fw_client.get(reader_group_id)
         if len(group.projects.find("label=~Reader [0-9][0-9]?[0-9]?")) == 0:
 
             # For Legacy check for "Readers" groups
             reader_group_id = "readers"
-            group = fw_client.get(reader_group_id).reload()
+            group = fw_client.get(reader_group_id)
 
             log.debug("Looking for legacy group 'Readers'")
 
@@ -60,7 +69,7 @@ def main(context):
                 )
 
         source_sessions_df, case_assessment_df = gather_case_data_from_readers(
-            fw_client, source_project, copyroi
+            fw_client, source_project, copyroi, export_lengths
         )
 
         progress_report = generate_summary_report(fw_client, case_assessment_df)
@@ -98,6 +107,8 @@ def main(context):
                 "`assign-readers` and `assign-cases` gears with valid configuration."
             )
 
+        fw_client.log_summary()
+
     except (
         DuplicateJobError,
         InsufficientPermissionsError,
@@ -118,6 +129,9 @@ def main(context):
             "Error executing gather-cases-data.",
         )
         return 1
+    finally:
+        if api_profiler:
+            api_profiler.write_reports(context.output_dir)
 
     log.info("gather-cases-data completed Successfully!")
     return 0
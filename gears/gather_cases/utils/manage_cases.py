@@ -1,13 +1,15 @@
 import logging
 import codecs
-from ast import literal_eval as leval
-from pathlib import Path
 import json
 
 from flywheel import ApiException
 import numpy as np
 import pandas as pd
-import requests
+
+from .info_buffer import InfoWriteBuffer
+from .series_tags import SeriesTagCache
+from .session_loader import iter_project_sessions
+from .wado_client import WadoClient
 
 log = logging.getLogger(__name__)
 
@@ -27,6 +29,29 @@ CASE_ASSESSMENT_REC = {
     "completed_timestamp": None,
 }
 
+# Columns of the geometry table of Length measurements
+GEOMETRY_COLUMNS = [
+    "location",
+    "length",
+    "study",
+    "series",
+    "instance",
+    "seriesDescription",
+    "voxel_start_i",
+    "voxel_start_j",
+    "voxel_start_k",
+    "voxel_end_i",
+    "voxel_end_j",
+    "voxel_end_k",
+    "wcs_start_x",
+    "wcs_start_y",
+    "wcs_start_z",
+    "wcs_end_x",
+    "wcs_end_y",
+    "wcs_end_z",
+    "ijk_to_WCS",
+]
+
 
 OHIF_VIEWER_REC = {"measurements": {}, "read": {}}
 
@@ -136,27 +161,10 @@ def io_proxy_wado(
     Returns:
         dict/list: A dictionary for dicom tags or a list of dictionaries with dicom tags
     """
-    base_url = Path(api_key.split(":")[0])
-    base_url /= "io-proxy/wado"
-    base_url /= "projects/" + project_id
-    if study:
-        base_url /= "studies/" + study
-    if series:
-        base_url /= "series/" + series
-        base_url /= "instances"
-    if instance:
-        base_url /= instance
-        base_url /= "tags"
-    base_url = "https://" + str(base_url)
-
-    headers = {
-        "Authorization": api_key_prefix + " " + api_key,
-        "accept": "application/json",
-    }
-
-    req = requests.get(base_url, headers=headers)
+    base_url = "https://" + api_key.split(":")[0]
 
-    return leval(req.text)
+    with WadoClient(base_url, api_key, api_key_prefix) as wado_client:
+        return wado_client.get(project_id, study, series, instance)
 
 
 def change_world_coordinate_system(WCS):
@@ -226,110 +234,164 @@ def create_ijk_to_WCS_matrix(WCS, ImageOrientation, ImagePosition, PixelSpacing)
     return ijk_WCS_matrix
 
 
-def io_proxy_acquire_coords(fw_client, project_id, Length):
+def acquire_length_geometry(project_id, Lengths, tag_cache, WCS="LPS"):
     """
-    Acquires coordinates and conversion matrix from dicom tags in io-proxy
+    Acquires voxel and world coordinates for a list of Length measurements
+
+    The ijk-to-WCS matrix is created once per series (and slice geometry) and the start
+    and end handles of all measurements on that series are transformed by a single
+    matrix multiplication.
 
     Args:
-        fw_client (flywheel.Client): The active flywheel client
         project_id (str): The project id to inquire dicom tags for
-        Length (dict): The ohif-derived json from a single measurement
+        Lengths (list): The ohif-derived json from each Length measurement
+        tag_cache (SeriesTagCache): Cache of the DICOM tags of measured series
+        WCS (str, optional): Three letter string identifying coordinate system.
+            Defaults to "LPS".
+
+    Raises:
+        MissingDICOMTagError: Raised if a series is missing a required tag.
 
     Returns:
-        tuple: start/stop coordinates in voxel/WCS-space plus conversion matrix
+        pandas.DataFrame: One row of geometry for each measurement with the columns
+            of GEOMETRY_COLUMNS
     """
-    # This project requests coordinates in "LPS"-world coordinates
-    WCS = "LPS"
-    host = fw_client._fw.api_client.configuration.host[:-8]
-    api_key_prefix = fw_client._fw.api_client.configuration.api_key_prefix[
-        "Authorization"
-    ]
-    api_key_hash = fw_client._fw.api_client.configuration.api_key["Authorization"]
-    api_key = ":".join([host.split("//")[1], api_key_hash])
-
-    voxel_start = np.ones((4, 1))
-    voxel_end = np.ones((4, 1))
-    wcs_start = np.zeros((4, 1))
-    wcs_end = np.zeros((4, 1))
+    # Each measurement has a start (even) and end (odd) row of homogeneous coordinates
+    voxels = np.ones((2 * len(Lengths), 4))
+    # (study, series, orientation, spacing) -> ijk_WCS_matrix and rows to transform
+    matrices = {}
+    rows = {}
+    records = []
 
-    study, series, instance = Length["imagePath"].split("$$$")[:3]
+    for m, Length in enumerate(Lengths):
+        study, series, instance = Length["imagePath"].split("$$$")[:3]
 
-    instances = io_proxy_wado(api_key, api_key_prefix, project_id, study, series)
-    N = len(instances)
-    # The rest of the tags come from the measured slice
-    slice_instance = [i for i in instances if i["00080018"]["Value"][0] == instance][0]
-    # The following is NOT working... finding in instances.
-    # io_proxy_wado(
-    #     api_key, api_key_prefix, project_id, study, series, instance
-    # )
+        series_tags = tag_cache.get(project_id, study, series)
+        N = series_tags.n_instances
+        # The rest of the tags come from the measured slice
+        slice_instance = series_tags.instances[instance]
 
-    try:
-        # (0020, 0032) Image Position (Patient) of three values
-        ImagePosition = {}
-        for j in [1, 2, N]:
-            ImagePosition[j] = np.array(
-                [
-                    i["00200032"]["Value"]
-                    for i in instances
-                    if i["00200013"]["Value"] == [j]
-                ][0]
+        try:
+            # (0020, 0032) Image Position (Patient) of three values
+            ImagePosition = {}
+            for j in [1, 2, N]:
+                ImagePosition[j] = series_tags.positions[j]
+
+            # (0020, 0037) Image Orientation (Patient)
+            ImageOrientation = slice_instance["ImageOrientation"]
+            # (0028, 0030) Pixel Spacing
+            PixelSpacing = slice_instance["PixelSpacing"]
+
+            # (0020, 0013) Instance Number
+            InstanceNumber = slice_instance["InstanceNumber"]
+            # (0008, 103E) Series Description
+            SeriesDescription = slice_instance["SeriesDescription"]
+
+        except Exception as e:
+            log.exception(e)
+            raise MissingDICOMTagError(
+                "One of the following required tags is missing from the DICOM Series:\n"
+                "\t(0008, 103E) Series Description,\n"
+                "\t(0020, 0013) Instance Number,\n"
+                "\t(0028, 0030) Pixel Spacing,\n"
+                "\t(0020, 0037) Image Orientation (Patient),\n"
+                "\t(0020, 0032) Image Position (Patient)\n"
+                "Please replace the DICOM Series with a valid copy."
             )
 
-        # (0020, 0037) Image Orientation (Patient)
-        ImageOrientation = np.array(slice_instance["00200037"]["Value"])
-        # (0028, 0030) Pixel Spacing
-        PixelSpacing = np.array(slice_instance["00280030"]["Value"])
-
-        # (0020, 0013) Instance Number
-        InstanceNumber = slice_instance["00200013"]["Value"][0]
-        # (0008, 103E) Series Description
-        SeriesDescription = slice_instance["0008103E"]["Value"][0]
+        key = (study, series, tuple(ImageOrientation), tuple(PixelSpacing))
+        if key not in matrices:
+            matrices[key] = create_ijk_to_WCS_matrix(
+                WCS, ImageOrientation, ImagePosition, PixelSpacing
+            )
+        rows.setdefault(key, []).extend([2 * m, 2 * m + 1])
 
-    except Exception as e:
-        log.exception(e)
-        raise MissingDICOMTagError(
-            "One of the following required tags is missing from the DICOM Series:\n"
-            "\t(0008, 103E) Series Description,\n"
-            "\t(0020, 0013) Instance Number,\n"
-            "\t(0028, 0030) Pixel Spacing,\n"
-            "\t(0020, 0037) Image Orientation (Patient),\n"
-            "\t(0020, 0032) Image Position (Patient)\n"
-            "Please replace the DICOM Series with a valid copy."
+        voxels[2 * m, :3] = [
+            Length["handles"]["start"]["x"],
+            Length["handles"]["start"]["y"],
+            InstanceNumber,
+        ]
+        voxels[2 * m + 1, :3] = [
+            Length["handles"]["end"]["x"],
+            Length["handles"]["end"]["y"],
+            InstanceNumber,
+        ]
+        records.append(
+            {
+                "location": Length.get("location"),
+                "length": Length.get("length"),
+                "study": study,
+                "series": series,
+                "instance": instance,
+                "seriesDescription": SeriesDescription,
+                "ijk_to_WCS": matrices[key].tolist(),
+            }
         )
 
     # Offsets to turn ohif, one-indexed coordinates to zero and then 1/2-voxel indexed
     # 1/2-voxel indexed makes the center of the origin voxel map to the origin of the
     # patient space.
-    one_index_offset = np.array([1.0, 1.0, 1.0, 0]).reshape((4, 1))
-    half_voxel_offest = np.array([0.5, 0.5, 0.5, 0]).reshape((4, 1))
+    one_index_offset = np.array([1.0, 1.0, 1.0, 0])
+    half_voxel_offest = np.array([0.5, 0.5, 0.5, 0])
     offset = one_index_offset + half_voxel_offest
 
-    voxel_start[:3] = np.array(
-        [
-            Length["handles"]["start"]["x"],
-            Length["handles"]["start"]["y"],
-            InstanceNumber,
-        ]
-    ).reshape((3, 1))
+    wcs = np.zeros(voxels.shape)
+    for key, key_rows in rows.items():
+        wcs[key_rows] = np.matmul(voxels[key_rows] - offset, matrices[key].T)
 
-    voxel_end[:3] = np.array(
-        [Length["handles"]["end"]["x"], Length["handles"]["end"]["y"], InstanceNumber]
-    ).reshape((3, 1))
+    geometry = pd.DataFrame.from_records(records)
+    for name, coords, points in [
+        ("voxel", ["i", "j", "k"], voxels),
+        ("wcs", ["x", "y", "z"], wcs),
+    ]:
+        for end, parity in [("start", 0), ("end", 1)]:
+            for c, coord in enumerate(coords):
+                geometry[f"{name}_{end}_{coord}"] = points[parity::2, c]
 
-    ijk_WCS_matrix = create_ijk_to_WCS_matrix(
-        WCS, ImageOrientation, ImagePosition, PixelSpacing
-    )
+    return geometry.reindex(columns=GEOMETRY_COLUMNS)
+
+
+def io_proxy_acquire_coords(fw_client, project_id, Length, tag_cache=None):
+    """
+    Acquires coordinates and conversion matrix from dicom tags in io-proxy
+
+    Args:
+        fw_client (flywheel.Client): The active flywheel client
+        project_id (str): The project id to inquire dicom tags for
+        Length (dict): The ohif-derived json from a single measurement
+        tag_cache (SeriesTagCache, optional): Cache of the DICOM tags of series
+            shared between measurements. If not provided, the series is requested
+            with a client created from fw_client. Defaults to None.
+
+    Returns:
+        tuple: start/stop coordinates in voxel/WCS-space plus conversion matrix
+    """
+    if tag_cache is None:
+        tag_cache = SeriesTagCache(WadoClient.from_client(fw_client))
+
+    # This project requests coordinates in "LPS"-world coordinates
+    geometry = acquire_length_geometry(project_id, [Length], tag_cache, WCS="LPS")
+
+    return geometry_coords(geometry.iloc[0])
+
+
+def geometry_coords(row):
+    """
+    Return the coordinates and conversion matrix of a row of a geometry table
 
-    wcs_start = np.matmul(ijk_WCS_matrix, voxel_start - offset)
-    wcs_end = np.matmul(ijk_WCS_matrix, voxel_end - offset)
+    Args:
+        row (pandas.Series): A row of a table from `acquire_length_geometry`
 
+    Returns:
+        tuple: start/stop coordinates in voxel/WCS-space plus conversion matrix
+    """
     return (
-        voxel_start.reshape((4,))[:3],
-        voxel_end.reshape((4,))[:3],
-        wcs_start.reshape((4,))[:3],
-        wcs_end.reshape((4,))[:3],
-        ijk_WCS_matrix.tolist(),
-        SeriesDescription,
+        row[["voxel_start_i", "voxel_start_j", "voxel_start_k"]].to_numpy(float),
+        row[["voxel_end_i", "voxel_end_j", "voxel_end_k"]].to_numpy(float),
+        row[["wcs_start_x", "wcs_start_y", "wcs_start_z"]].to_numpy(float),
+        row[["wcs_end_x", "wcs_end_y", "wcs_end_z"]].to_numpy(float),
+        row["ijk_to_WCS"],
+        row["seriesDescription"],
     )
 
 
@@ -372,7 +434,7 @@ def assess_completed_status(ohif_viewer, user_data):
     return completed_status, error_msg
 
 
-def copy_rois_to_source(fw_client, session):
+def copy_rois_to_source(fw_client, session, info_buffer=None):
     """
     Copy reader OHIF reads into the source session's "OhifViewer" namespace so that the
     reads render and are visible.  `fill_session_attributes()` must be run  before this,
@@ -385,6 +447,8 @@ def copy_rois_to_source(fw_client, session):
         fw_client (flywheel.Client): The active flywheel client
         session (flywheel.Session): The flywheel session object being queried for
             completion status
+        info_buffer (InfoWriteBuffer, optional): Buffer to stage the info writes in.
+            If not provided, the writes are made before returning. Defaults to None.
 
     Returns:
         dict: Session attributes to populate an output dataframe
@@ -511,12 +575,16 @@ def copy_rois_to_source(fw_client, session):
                                 f"Reader ID {reader_id} already has a read in session {session.id} that does not match."
                             )
 
-    session.update_info({"ohifViewer": ohif_viewer})
+    if info_buffer:
+        info_buffer.update_info(session, {"ohifViewer": ohif_viewer})
+    else:
+        session.update_info({"ohifViewer": ohif_viewer})
+        fw_client.invalidate(session.id)
 
     return
 
 
-def fill_session_attributes(fw_client, project_features, session):
+def fill_session_attributes(fw_client, project_features, session, info_buffer=None):
     """
     This function updates the metadata on the
     source session to include any completed reads/measurements from the assigned cases.
@@ -528,10 +596,15 @@ def fill_session_attributes(fw_client, project_features, session):
             source project
         session (flywheel.Session): The source flywheel session object being queried for
             completion status
+        info_buffer (InfoWriteBuffer, optional): Buffer to stage the info writes in.
+            If not provided, the writes are made before returning. Defaults to None.
 
     Returns:
         dict: Session attributes to populate an output dataframe
     """
+    flush_on_return = info_buffer is None
+    if flush_on_return:
+        info_buffer = InfoWriteBuffer(fw_client)
 
     # Each session has a set of features: case_coverage and assignments
     # each assignment consists of {project_id:<uid>, session_id:<uid>,
@@ -576,7 +649,7 @@ def fill_session_attributes(fw_client, project_features, session):
             )
             continue
 
-        assigned_session = assigned_session.reload()
+        info_buffer.track(assigned_session)
         assigned_session_info = assigned_session.info
 
         user_data = []
@@ -616,9 +689,11 @@ def fill_session_attributes(fw_client, project_features, session):
                 assignment["status"] = "Completed"
                 session_attributes["completed"] += 1
                 ohif_viewer["read"][reader_id]["readOnly"] = True
-                assigned_session.update_info({"ohifViewer": ohif_viewer})
+                info_buffer.update_info(assigned_session, {"ohifViewer": ohif_viewer})
 
-    session.update_info({"session_features": session_features})
+    info_buffer.update_info(session, {"session_features": session_features})
+    if flush_on_return:
+        info_buffer.flush()
     # additional data to put into the project_features["case_states"]
     session_features["id"] = session.id
     session_features["label"] = session.label
@@ -637,7 +712,9 @@ def fill_session_attributes(fw_client, project_features, session):
     return session_attributes
 
 
-def fill_reader_case_data(fw_client, project_features, session):
+def fill_reader_case_data(
+    fw_client, project_features, session, tag_cache=None, export_lengths=False
+):
     """
     Acquire the status and data from each assigned case
 
@@ -647,6 +724,10 @@ def fill_reader_case_data(fw_client, project_features, session):
         fw_client (flywheel.Client): The active flywheel client
         project_features (dict): Valid features for the Master Project.
         session (flywheel.Session): Flywheel session with case assignments
+        tag_cache (SeriesTagCache, optional): Cache of the DICOM tags of measured
+            series. Defaults to None.
+        export_lengths (bool, optional): Export the coordinates of Length
+            measurements. Defaults to False.
 
     Returns:
         list: List of assignment status for each assignment in a session
@@ -744,10 +825,17 @@ def fill_reader_case_data(fw_client, project_features, session):
 
             if ohif_viewer.get("measurements") and not error_msg:
                 try:
-                    # Eliminating this for now, Doesn't work without the required
-                    # Dicom Tags
-                    if False:  # ohif_viewer["measurements"].get("Length"):
-                        for Length in ohif_viewer["measurements"]["Length"]:
+                    # Requires the DICOM tags of the measured series in io-proxy
+                    if export_lengths and ohif_viewer["measurements"].get("Length"):
+                        if tag_cache is None:
+                            tag_cache = SeriesTagCache(
+                                WadoClient.from_client(fw_client)
+                            )
+                        Lengths = ohif_viewer["measurements"]["Length"]
+                        geometry = acquire_length_geometry(
+                            assignment["project_id"], Lengths, tag_cache
+                        )
+                        for Length, (_, row) in zip(Lengths, geometry.iterrows()):
                             prefix = Length["location"].lower().replace(" - ", "_")
                             case_assignment_status[prefix + "_Length"] = Length[
                                 "length"
@@ -759,9 +847,7 @@ def fill_reader_case_data(fw_client, project_features, session):
                                 wcs_end,
                                 ijk_WCS_matrix,
                                 seriesDescription,
-                            ) = io_proxy_acquire_coords(
-                                fw_client, assignment["project_id"], Length
-                            )
+                            ) = geometry_coords(row)
                             case_assignment_status[
                                 prefix + "_seriesDescription"
                             ] = seriesDescription
@@ -792,14 +878,18 @@ def fill_reader_case_data(fw_client, project_features, session):
                     )
 
                     case_assignment_status["completed"] = completed_status
-                    case_assignment_status["additionalNotes"] += error_msg
+                    case_assignment_status["additionalNotes"] = (
+                        case_assignment_status.get("additionalNotes") or ""
+                    ) + error_msg
 
         case_assignments.append(case_assignment_status)
 
     return case_assignments
 
 
-def gather_case_data_from_readers(fw_client, source_project, copyroi=False):
+def gather_case_data_from_readers(
+    fw_client, source_project, copyroi=False, export_lengths=False
+):
     """
     Gather case assessments from the distributed session assignments
 
@@ -816,13 +906,19 @@ def gather_case_data_from_readers(fw_client, source_project, copyroi=False):
         source_project (flywheel.Project): The source project for all sessions
         copyroi (bool): True to render reader ROI's so that they are visible in the
         source project, False to only copy them as metadata (not visible in OHIF viewer)
+        export_lengths (bool): True to export the voxel and world coordinates of Length
+        measurements
 
     Returns:
         tuple: a pair of pandas.DataFrame reporting on the state of each session in
             the project and the assessment status from each reader
     """
 
-    source_project = source_project.reload()
+    # Info writes are merged per container, unchanged info is not written
+    info_buffer = InfoWriteBuffer(fw_client)
+
+    source_project = fw_client.reload(source_project)
+    info_buffer.track(source_project)
     # Grab project-level features, if it does not exist, set defaults
     project_features = (
         source_project.info["project_features"]
@@ -830,8 +926,6 @@ def gather_case_data_from_readers(fw_client, source_project, copyroi=False):
         else {"case_coverage": 3, "case_states": []}
     )
 
-
-
     # Create a DataFrame to represent the states of each session and assignments
     source_sessions_df = pd.DataFrame(
         columns=[
@@ -851,21 +945,28 @@ def gather_case_data_from_readers(fw_client, source_project, copyroi=False):
     # Create a DataFrame to record the state of each assessment by a reader
     case_assessment_df = pd.DataFrame(columns=CASE_ASSESSMENT_REC.keys())
 
-    src_sessions = fw_client.sessions.iter_find(f'project={source_projec.id}', limit=100)
+    # DICOM tags of measured series are requested once per run
+    tag_cache = None
+    if export_lengths:
+        tag_cache = SeriesTagCache(WadoClient.from_client(fw_client))
+
+    # Sessions are loaded in pages with their info and subject
+    src_sessions = iter_project_sessions(fw_client, source_project.id)
 
     # for each session found
     for session in src_sessions:
         log.info("Gathering completion data for session %s", session.label)
-        # Reload to capture all metadata
-        session = session.reload()
+        info_buffer.track(session)
         session_attributes = fill_session_attributes(
-            fw_client, project_features, session
+            fw_client, project_features, session, info_buffer
         )
         source_sessions_df = source_sessions_df.append(
             session_attributes, ignore_index=True
         )
 
-        case_assignments = fill_reader_case_data(fw_client, project_features, session)
+        case_assignments = fill_reader_case_data(
+            fw_client, project_features, session, tag_cache, export_lengths
+        )
 
         if case_assignments:
             case_assessment_df = case_assessment_df.append(
@@ -873,9 +974,17 @@ def gather_case_data_from_readers(fw_client, source_project, copyroi=False):
             )
 
         if copyroi:
-            copy_rois_to_source(fw_client, session)
+            copy_rois_to_source(fw_client, session, info_buffer)
+
+        # The merged info writes of each session are made as it is gathered
+        info_buffer.flush()
 
-    source_project.update_info({"project_features": project_features})
+    info_buffer.update_info(source_project, {"project_features": project_features})
+    info_buffer.flush()
+    info_buffer.log_summary()
+    if tag_cache is not None:
+        tag_cache.log_summary()
+        tag_cache.wado_client.close()
 
     return source_sessions_df, case_assessment_df
 
@@ -0,0 +1,80 @@
+"""
+A run-scoped registry of the Flywheel roles on an instance.
+
+Roles are retrieved once on first use and are served from memory for the remainder of
+the gear run.
+"""
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+# Valid roles for readers are "read-write" and "read-only"
+READER_ROLES = ["read-write", "read-only"]
+
+
+class RoleRegistry:
+    """
+    Loads the roles of a Flywheel instance once and serves their ids by label.
+
+    Args:
+        fw_client (flywheel.Client): Flywheel Client object instantiated on instance
+    """
+
+    def __init__(self, fw_client):
+        self._fw_client = fw_client
+        self._roles = None
+        self._lock = threading.Lock()
+
+    @property
+    def roles(self):
+        """list: All roles (flywheel.RoleOutput) defined on the instance."""
+        with self._lock:
+            if self._roles is None:
+                self._roles = list(self._fw_client.get_all_roles())
+                log.debug("Loaded %i roles from instance.", len(self._roles))
+        return self._roles
+
+    def role_ids(self, role_labels):
+        """
+        Return the ids of the roles with the given labels.
+
+        Args:
+            role_labels (list): Role labels (e.g. ["read-write", "read-only"])
+
+        Returns:
+            set: The ids of the matching roles
+        """
+        return {role.id for role in self.roles if role.label in role_labels}
+
+    def role_id(self, role_label):
+        """
+        Return the id of the role with the given label.
+
+        Args:
+            role_label (str): A role label (e.g. "read-write")
+
+        Returns:
+            str: The id of the role, `None` if no role has that label
+        """
+        return next((role.id for role in self.roles if role.label == role_label), None)
+
+    @property
+    def reader_role_ids(self):
+        """set: The ids of the roles that identify a reader on a reader project."""
+        return self.role_ids(READER_ROLES)
+
+    @property
+    def read_write_id(self):
+        """str: The id of the "read-write" role."""
+        return self.role_id("read-write")
+
+    @property
+    def read_only_id(self):
+        """str: The id of the "read-only" role."""
+        return self.role_id("read-only")
+
+    @property
+    def admin_id(self):
+        """str: The id of the "admin" role."""
+        return self.role_id("admin")
@@ -0,0 +1,134 @@
+"""
+A per-run cache of the DICOM tags of the series measured by readers.
+
+Each Length measurement references an instance of a DICOM series. The tags of every
+instance of the series are needed to locate the measurement in world coordinates. The
+series are requested from the io-proxy once and indexed for lookups by Instance Number
+and SOPInstanceUID.
+"""
+import logging
+import threading
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+# (0008, 0018) SOP Instance UID
+SOP_INSTANCE_UID = "00080018"
+# (0008, 103E) Series Description
+SERIES_DESCRIPTION = "0008103E"
+# (0020, 0013) Instance Number
+INSTANCE_NUMBER = "00200013"
+# (0020, 0032) Image Position (Patient)
+IMAGE_POSITION = "00200032"
+# (0020, 0037) Image Orientation (Patient)
+IMAGE_ORIENTATION = "00200037"
+# (0028, 0030) Pixel Spacing
+PIXEL_SPACING = "00280030"
+
+
+def _tag_value(instance, tag):
+    """Return the "Value" of a tag of a DICOMweb JSON instance, or None."""
+    return instance.get(tag, {}).get("Value")
+
+
+class SeriesTags:
+    """
+    The tags of the instances of a DICOM series, indexed for constant time lookups.
+
+    Attributes:
+        n_instances (int): The number of instances in the series
+        positions (dict): Instance Number -> Image Position (Patient) (np.array)
+        instances (dict): SOPInstanceUID -> dict of the "ImageOrientation",
+            "PixelSpacing", "InstanceNumber", and "SeriesDescription" of the instance.
+            Tags missing from the instance are absent from its dict.
+
+    Args:
+        instances (list): The DICOMweb JSON tags of each instance of the series
+    """
+
+    def __init__(self, instances):
+        self.n_instances = len(instances)
+        self.positions = {}
+        self.instances = {}
+
+        for instance in instances:
+            instance_number = _tag_value(instance, INSTANCE_NUMBER)
+            position = _tag_value(instance, IMAGE_POSITION)
+            if instance_number and position:
+                # The first instance with an Instance Number is retained
+                self.positions.setdefault(instance_number[0], np.array(position))
+
+            sop_instance_uid = _tag_value(instance, SOP_INSTANCE_UID)
+            if not sop_instance_uid:
+                continue
+            record = {}
+            for key, tag in [
+                ("ImageOrientation", IMAGE_ORIENTATION),
+                ("PixelSpacing", PIXEL_SPACING),
+            ]:
+                value = _tag_value(instance, tag)
+                if value is not None:
+                    record[key] = np.array(value)
+            for key, tag in [
+                ("InstanceNumber", INSTANCE_NUMBER),
+                ("SeriesDescription", SERIES_DESCRIPTION),
+            ]:
+                value = _tag_value(instance, tag)
+                if value:
+                    record[key] = value[0]
+            self.instances.setdefault(sop_instance_uid[0], record)
+
+
+class SeriesTagCache:
+    """
+    Caches the indexed tags of DICOM series requested from the io-proxy.
+
+    Series are keyed by (project_id, study, series). Each series is requested once per
+    cache.
+
+    Args:
+        wado_client (WadoClient): Client for io-proxy requests
+    """
+
+    def __init__(self, wado_client):
+        self.wado_client = wado_client
+        self._lock = threading.Lock()
+        self._series = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._series)
+
+    def get(self, project_id, study, series):
+        """
+        Return the indexed tags of a series, requesting them if not cached.
+
+        Args:
+            project_id (str): Project ID of the series
+            study (str): DICOM StudyUID
+            series (str): DICOM SeriesUID
+
+        Returns:
+            SeriesTags: The indexed tags of the instances of the series
+        """
+        key = (project_id, study, series)
+        with self._lock:
+            series_tags = self._series.get(key)
+            if series_tags:
+                self.hits += 1
+                return series_tags
+            self.misses += 1
+
+        series_tags = SeriesTags(self.wado_client.get(project_id, study, series))
+        with self._lock:
+            return self._series.setdefault(key, series_tags)
+
+    def log_summary(self):
+        """Log the number of series requested and cache hits."""
+        log.info(
+            "DICOM series tags: %i series requested, %i cache hits.",
+            self.misses,
+            self.hits,
+        )
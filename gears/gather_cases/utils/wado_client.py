@@ -0,0 +1,174 @@
+"""
+A client for the DICOMweb (WADO) endpoints of the Flywheel io-proxy.
+
+See https://{instance}/io-proxy/docs#/ for the io-proxy api.
+"""
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+log = logging.getLogger(__name__)
+
+# (connect, read) timeouts in seconds for each request
+WADO_TIMEOUT = (10, 120)
+# Number of retries of a failed request and the backoff factor between them
+WADO_RETRIES = 5
+WADO_BACKOFF_FACTOR = 0.5
+# Responses with these status codes are retried
+WADO_RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Number of keep-alive connections held open to the io-proxy
+WADO_POOL_SIZE = 10
+
+
+class WadoRequestError(Exception):
+    """
+    Exception raised when a request to the io-proxy fails after all retries.
+
+    Args:
+        message (str): A description of the failed request
+    """
+
+    def __init__(self, message):
+        Exception.__init__(self)
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+class WadoClient:
+    """
+    Makes requests to the io-proxy WADO api over a pool of keep-alive connections.
+
+    Failed connections and responses with a status in WADO_RETRY_STATUSES are retried
+    with exponential backoff. Responses are decoded as JSON.
+
+    Args:
+        base_url (str): The url of the instance (e.g. "https://my.flywheel.io")
+        api_key (str): Full instance api-key
+        api_key_prefix (str): Type of user (e.g. 'scitran-user')
+        timeout (tuple, optional): (connect, read) timeouts in seconds.
+            Defaults to WADO_TIMEOUT.
+        retries (int, optional): Number of retries of a failed request.
+            Defaults to WADO_RETRIES.
+        backoff_factor (float, optional): Backoff factor between retries.
+            Defaults to WADO_BACKOFF_FACTOR.
+        pool_size (int, optional): Number of keep-alive connections.
+            Defaults to WADO_POOL_SIZE.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        api_key,
+        api_key_prefix,
+        timeout=WADO_TIMEOUT,
+        retries=WADO_RETRIES,
+        backoff_factor=WADO_BACKOFF_FACTOR,
+        pool_size=WADO_POOL_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/") + "/io-proxy/wado"
+        self.timeout = timeout
+        self.request_count = 0
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=WADO_RETRY_STATUSES,
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Authorization": api_key_prefix + " " + api_key,
+                "accept": "application/json",
+            }
+        )
+
+    @classmethod
+    def from_client(cls, fw_client, **kwargs):
+        """
+        Create a WadoClient with the host and credentials of a Flywheel client.
+
+        Args:
+            fw_client (flywheel.Client): The active flywheel client
+            **kwargs: Additional keyword arguments for WadoClient
+
+        Returns:
+            WadoClient: A client for the io-proxy of the same instance
+        """
+        configuration = fw_client._fw.api_client.configuration
+        host = configuration.host[:-8]
+        api_key_prefix = configuration.api_key_prefix["Authorization"]
+        api_key_hash = configuration.api_key["Authorization"]
+        api_key = ":".join([host.split("//")[1], api_key_hash])
+
+        return cls(
+            "https://" + host.split("//")[1], api_key, api_key_prefix, **kwargs
+        )
+
+    def url(self, project_id, study=None, series=None, instance=None):
+        """
+        Return the io-proxy url for a project, study, series, or instance.
+
+        Args:
+            project_id (str): Project ID to inquire
+            study (str, optional): DICOM StudyUID. Defaults to None.
+            series (str, optional): DICOM SeriesUID. Defaults to None.
+            instance (str, optional): DICOM InstanceUID. Defaults to None.
+
+        Returns:
+            str: The url of the request
+        """
+        url = f"{self.base_url}/projects/{project_id}"
+        if study:
+            url += f"/studies/{study}"
+        if series:
+            url += f"/series/{series}/instances"
+        if instance:
+            url += f"/{instance}/tags"
+        return url
+
+    def get(self, project_id, study=None, series=None, instance=None):
+        """
+        Request the DICOM tags of a project, study, series, or instance.
+
+        Args:
+            project_id (str): Project ID to inquire
+            study (str, optional): DICOM StudyUID. Defaults to None.
+            series (str, optional): DICOM SeriesUID. Defaults to None.
+            instance (str, optional): DICOM InstanceUID. Defaults to None.
+
+        Raises:
+            WadoRequestError: Raised if the request fails or is not valid JSON.
+
+        Returns:
+            dict/list: A dictionary for dicom tags or a list of dictionaries with dicom
+                tags
+        """
+        url = self.url(project_id, study, series, instance)
+        self.request_count += 1
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise WadoRequestError(f"io-proxy request to {url} failed: {e}")
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
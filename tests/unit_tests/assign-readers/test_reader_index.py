@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import flywheel
+
+from gears.assign_readers.utils.container_cache import ContainerCache
+from tests.unit_tests.stand_in_client import StandInClient
+
+
+def create_reader_group(n_readers=3):
+    stand_in = StandInClient()
+    stand_in.roles = [
+        SimpleNamespace(id="role-rw", label="read-write"),
+        SimpleNamespace(id="role-ro", label="read-only"),
+    ]
+    group = stand_in.add_group("readers", "Readers")
+    for i in range(1, n_readers + 1):
+        group.add_project(
+            {
+                "label": f"Reader {i}",
+                "info": {
+                    "project_features": {
+                        "assignments": [{"source_session": "s", "dest_session": "d"}]
+                        * i,
+                        "max_cases": 10 * i,
+                        "reader": {"id": f"reader{i}@site.org"},
+                    }
+                },
+            }
+        )
+    # A legacy reader project identifies the reader by permission only
+    group.add_project(
+        {
+            "label": f"Reader {n_readers + 1}",
+            "info": {"project_features": {"assignments": [], "max_cases": 5}},
+            "permissions": [
+                flywheel.RolesRoleAssignment(id="legacy@site.org", role_ids=["role-ro"])
+            ],
+        }
+    )
+    # Neither an initialized project nor a reader project
+    group.add_project({"label": "Reader 20"})
+    group.add_project({"label": "Templates"})
+    stand_in.calls.clear()
+
+    return stand_in, ContainerCache(stand_in)
+
+
+def test_reader_index_lists_projects_once():
+    stand_in, fw_client = create_reader_group()
+
+    for _ in range(5):
+        reader_index = fw_client.reader_index("readers")
+        assert "reader2@site.org" in reader_index
+        assert "unknown@site.org" not in reader_index
+
+    assert stand_in.calls["projects.find"] == 1
+    assert len(reader_index) == 4
+
+
+def test_reader_index_records():
+    _, fw_client = create_reader_group()
+    reader_index = fw_client.reader_index("readers")
+
+    record = reader_index.get("reader3@site.org")
+
+    assert record["label"] == "Reader 3"
+    assert record["max_cases"] == 30
+    assert record["num_assignments"] == 3
+    assert reader_index.get_project("reader3@site.org").id == record["id"]
+    assert reader_index.get_project("unknown@site.org") is None
+
+
+def test_reader_index_legacy_reader():
+    _, fw_client = create_reader_group()
+    reader_index = fw_client.reader_index("readers")
+
+    project = reader_index.get_project("legacy@site.org")
+
+    assert project.info["project_features"]["reader"] == {"id": "legacy@site.org"}
+
+
+def test_reader_index_add_reader():
+    stand_in, fw_client = create_reader_group()
+    reader_index = fw_client.reader_index("readers")
+    assert reader_index.next_reader_number() == 21
+
+    group = stand_in.containers["readers"]
+    new_project = group.add_project(
+        {
+            "label": "Reader 21",
+            "info": {
+                "project_features": {
+                    "assignments": [],
+                    "max_cases": 7,
+                    "reader": {"id": "new@site.org"},
+                }
+            },
+        }
+    )
+    reader_index.add(new_project, "new@site.org")
+
+    assert reader_index.get("new@site.org")["max_cases"] == 7
+    assert reader_index.next_reader_number() == 22
+    assert stand_in.calls["projects.find"] == 1
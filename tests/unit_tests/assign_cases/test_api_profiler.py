@@ -0,0 +1,100 @@
+import json
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from gears.assign_cases.utils.api_profiler import PROFILE_COLUMNS, ApiProfiler
+
+
+class StandInApiClient:
+    """Makes requests the way the swagger-generated ApiClient does."""
+
+    def call_api(self, resource_path, method, path_params=None, body=None, **kwargs):
+        url = resource_path.format(**(path_params or {}))
+        response = self.request(method, url, body=body)
+        if response.status >= 400:
+            raise RuntimeError(response.status)
+        return response.data
+
+    def request(self, method, url, query_params=None, headers=None, body=None):
+        if url.endswith("missing"):
+            return SimpleNamespace(status=404, data=b"")
+        return SimpleNamespace(status=200, data=b'{"_id": "' + url.encode() + b'"}')
+
+
+class StandInSessionsApi:
+    def __init__(self, api_client):
+        self.api_client = api_client
+
+    def get_session(self, session_id):
+        return self.get_session_with_http_info(session_id)
+
+    def get_session_with_http_info(self, session_id):
+        return self.api_client.call_api(
+            "/sessions/{SessionId}", "GET", path_params={"SessionId": session_id}
+        )
+
+    def modify_session_info(self, session_id, body):
+        return self.modify_session_info_with_http_info(session_id, body)
+
+    def modify_session_info_with_http_info(self, session_id, body):
+        return self.api_client.call_api(
+            "/sessions/{SessionId}/info",
+            "POST",
+            path_params={"SessionId": session_id},
+            body=body,
+        )
+
+
+def create_client():
+    api_client = StandInApiClient()
+    return SimpleNamespace(
+        _fw=SimpleNamespace(api_client=api_client),
+        sessions_api=StandInSessionsApi(api_client),
+    )
+
+
+def test_requests_are_recorded_per_sdk_method(tmp_path):
+    fw_client = create_client()
+    api_profiler = ApiProfiler()
+    api_profiler.install(fw_client)
+
+    for i in range(5):
+        fw_client.sessions_api.get_session(f"s{i}")
+    fw_client.sessions_api.modify_session_info("s1", '{"set": {}}')
+    with pytest.raises(RuntimeError):
+        fw_client.sessions_api.get_session("missing")
+
+    summary_df = api_profiler.summary()
+    assert list(summary_df.columns) == PROFILE_COLUMNS
+    stats = summary_df.set_index("sdk_method")
+    assert stats.loc["get_session", "endpoint"] == "GET /sessions/{SessionId}"
+    assert stats.loc["get_session", "count"] == 6
+    assert stats.loc["get_session", "errors"] == 1
+    response_size = len(b'{"_id": "/sessions/s0"}')
+    assert stats.loc["get_session", "bytes_received"] == 5 * response_size
+    assert stats.loc["modify_session_info", "count"] == 1
+    assert stats.loc["modify_session_info", "bytes_sent"] == len('{"set": {}}')
+    assert (stats["p50_seconds"] <= stats["p99_seconds"]).all()
+
+    api_profiler.write_reports(tmp_path)
+
+    csv_df = pd.read_csv(tmp_path / "api_profile.csv")
+    assert set(csv_df["sdk_method"]) == {"get_session", "modify_session_info"}
+    with open(tmp_path / "api_profile.json") as fp:
+        profile = json.load(fp)
+    assert profile["total_requests"] == 7
+    assert sum(profile["histograms"]["get_session GET /sessions/{SessionId}"]) == 6
+
+
+def test_uninstall_restores_api_client():
+    fw_client = create_client()
+    api_profiler = ApiProfiler()
+    api_profiler.install(fw_client)
+    api_profiler.uninstall()
+
+    fw_client.sessions_api.get_session("s0")
+
+    assert "call_api" not in vars(fw_client._fw.api_client)
+    assert api_profiler.summary().empty
@@ -0,0 +1,191 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from gears.assign_cases.utils.assignment_planner import (
+    AssignmentPlan,
+    plan_assignments,
+)
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.export_journal import ExportJournal
+from gears.assign_cases.utils.manage_cases import execute_plan
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def reader_projects(n_readers, max_cases):
+    return pd.DataFrame(
+        {
+            "id": [f"project-{i}" for i in range(n_readers)],
+            "label": [f"Reader {i + 1}" for i in range(n_readers)],
+            "reader_id": [f"reader-{i}@flywheel.io" for i in range(n_readers)],
+            "assignments": [[] for _ in range(n_readers)],
+            "max_cases": [max_cases] * n_readers,
+            "num_assignments": [0] * n_readers,
+        }
+    )
+
+
+def unassigned_sessions(n_sessions, case_coverage=3):
+    return [
+        (
+            SimpleNamespace(
+                id=f"session-{i}", label=f"session-{i}", parents={"subject": f"{i}"}
+            ),
+            {"case_coverage": case_coverage, "assignments": [], "assigned_count": 0},
+        )
+        for i in range(n_sessions)
+    ]
+
+
+def test_plan_is_complete_and_balanced():
+    np.random.seed(3)
+    dest_projects_df = reader_projects(200, 80)
+
+    start = time.perf_counter()
+    plan = plan_assignments(unassigned_sessions(5000), dest_projects_df)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1
+    assert len(plan) == 5000
+    for entry in plan:
+        assert len(set(entry["project_ids"])) == 3
+    assignment_plan_df = plan.to_dataframe()
+    assert assignment_plan_df.shape[0] == 15000
+    assert set(assignment_plan_df.project_id.value_counts()) == {75}
+    # Planning does not record assignments in the dataframe
+    assert dest_projects_df.num_assignments.sum() == 0
+
+
+def test_plan_respects_reader_capacity():
+    np.random.seed(3)
+    plan = plan_assignments(unassigned_sessions(20), reader_projects(4, 10))
+
+    counts = plan.to_dataframe().project_id.value_counts()
+    assert plan.num_assignments == 40
+    assert set(counts) == {10}
+
+
+def test_flow_solver_plan_covers_uneven_readers():
+    np.random.seed(3)
+    dest_projects_df = reader_projects(4, 10)
+    dest_projects_df["max_cases"] = [30, 10, 10, 10]
+
+    plan = plan_assignments(unassigned_sessions(30, 2), dest_projects_df, solver="flow")
+
+    assert all(len(set(entry["project_ids"])) == 2 for entry in plan)
+    assert plan.to_dataframe().project_id.value_counts()["project-0"] == 30
+
+
+def test_pending_exports_are_planned_to_the_same_readers():
+    for solver in ["greedy", "flow"]:
+        np.random.seed(3)
+        sessions = unassigned_sessions(3)
+        journal = ExportJournal(None)
+        journal.record_session("session-1", "project-4", "dest-session")
+
+        plan = plan_assignments(
+            sessions, reader_projects(6, 10), journal=journal, solver=solver
+        )
+
+        # The rest of the coverage is selected from the other readers
+        project_ids = plan.entries[1]["project_ids"]
+        assert project_ids[0] == "project-4"
+        assert len(set(project_ids)) == 3
+        assert plan.entries[1]["resumed"]
+        assert not plan.entries[0]["resumed"]
+
+
+def test_recorded_pending_exports_are_not_planned_again():
+    np.random.seed(3)
+    sessions = unassigned_sessions(1, 2)
+    sessions[0][1]["assignments"].append({"project_id": "project-4"})
+    sessions[0][1]["assigned_count"] = 1
+    journal = ExportJournal(None)
+    journal.record_session("session-0", "project-4", "dest-session")
+
+    plan = plan_assignments(sessions, reader_projects(6, 10), journal=journal)
+
+    (project_id,) = plan.entries[0]["project_ids"]
+    assert project_id != "project-4"
+    assert not plan.entries[0]["resumed"]
+    assert not journal.pending_projects("session-0")
+
+
+def test_execute_plan_exports_each_session():
+    np.random.seed(3)
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 2, 1)
+    group = stand_in.get(reader_project.parents["group"])
+    projects = [reader_project] + [
+        group.add_project({"label": f"Reader {i}"}) for i in range(2, 4)
+    ]
+    subject = source_session.subject
+    second_session = subject.add_session({"label": "session-2"})
+    second_session.add_acquisition({"label": "acquisition-0"}).add_file(
+        "file.dcm", b"contents"
+    )
+    dest_projects_df = pd.DataFrame(
+        {
+            "id": [p.id for p in projects],
+            "label": [p.label for p in projects],
+            "reader_id": ["a", "b", "c"],
+            "max_cases": [2, 2, 2],
+            "num_assignments": [0, 0, 0],
+        }
+    )
+    features = {"case_coverage": 2, "assignments": [], "assigned_count": 0}
+    plan = plan_assignments(
+        [(source_session, dict(features)), (second_session, dict(features))],
+        dest_projects_df,
+    )
+
+    results = list(execute_plan(ContainerCache(stand_in), plan))
+
+    assert [entry["session"] for entry, _ in results] == [
+        source_session,
+        second_session,
+    ]
+    for entry, exports in results:
+        assert len(exports) == 2
+        for (dest_session, _, _), project_id in zip(exports, entry["project_ids"]):
+            assert dest_session.parents["project"] == project_id
+            assert dest_session.label == entry["session"].label
+    # Both sessions share one subject in each reader project they were exported to
+    for project in projects:
+        subjects = [
+            c
+            for c in stand_in.containers.values()
+            if c.container_type == "subject" and c.parents["project"] == project.id
+        ]
+        assert len(subjects) <= 1
+
+
+def test_execute_plan_yields_results_in_plan_order():
+    dest_projects_df = reader_projects(2, 10)
+    plan = AssignmentPlan(dest_projects_df)
+    # The sessions of subject "a" are not next to each other in the plan
+    for label, subject_id in [("0", "a"), ("1", "b"), ("2", "a"), ("3", "c")]:
+        session = SimpleNamespace(id=label, label=label, parents={"subject": subject_id})
+        plan.add(session, {}, [])
+
+    results = list(execute_plan(None, plan))
+
+    assert [entry["session"].id for entry, _ in results] == ["0", "1", "2", "3"]
+
+
+def test_same_seed_reproduces_the_plan():
+    for solver in ["greedy", "flow"]:
+        plans = [
+            plan_assignments(
+                unassigned_sessions(50),
+                reader_projects(10, 20),
+                solver=solver,
+                rng=np.random.default_rng(seed),
+            ).to_dataframe()
+            for seed in [7, 7, 8]
+        ]
+
+        pd.testing.assert_frame_equal(plans[0], plans[1])
+        assert not plans[0].equals(plans[2])
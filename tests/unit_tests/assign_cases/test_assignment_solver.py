@@ -0,0 +1,104 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from gears.assign_cases.utils.assignment_solver import solve_assignments
+from gears.assign_cases.utils.reader_selector import ReaderSelector
+
+
+def reader_projects(max_cases, num_assignments=None):
+    n_readers = len(max_cases)
+    return pd.DataFrame(
+        {
+            "id": [f"project-{i}" for i in range(n_readers)],
+            "max_cases": max_cases,
+            "num_assignments": num_assignments or [0] * n_readers,
+        }
+    )
+
+
+def unassigned(n_sessions, case_coverage=3):
+    return [
+        {"case_coverage": case_coverage, "assignments": [], "assigned_count": 0}
+        for _ in range(n_sessions)
+    ]
+
+
+def check_assignments(assignments, session_features, dest_projects_df):
+    loads = dict(zip(dest_projects_df.id, dest_projects_df.num_assignments))
+    for project_ids, features in zip(assignments, session_features):
+        assigned = {a["project_id"] for a in features["assignments"]}
+        # Readers are distinct, and not already assigned the session
+        assert len(set(project_ids)) == len(project_ids)
+        assert not assigned.intersection(project_ids)
+        assert len(project_ids) + len(assigned) <= features["case_coverage"]
+        for project_id in project_ids:
+            loads[project_id] += 1
+    for project_id, max_cases in zip(dest_projects_df.id, dest_projects_df.max_cases):
+        assert loads[project_id] <= max_cases
+    return loads
+
+
+def test_uneven_capacity_covers_every_session():
+    np.random.seed(5)
+    # One reader can take every session, the others few of them
+    dest_projects_df = reader_projects([30, 10, 10, 10])
+    session_features = unassigned(30, case_coverage=2)
+
+    # Least-loaded greedy selection strands sessions below case_coverage
+    selector = ReaderSelector(dest_projects_df)
+    greedy_count = 0
+    for features in session_features:
+        selected = selector.select(features)
+        greedy_count += len(selected)
+        for project_id in selected:
+            selector.record_assignment(project_id)
+    assert greedy_count < 60
+
+    assignments = solve_assignments(session_features, dest_projects_df)
+
+    check_assignments(assignments, session_features, dest_projects_df)
+    assert all(len(project_ids) == 2 for project_ids in assignments)
+
+
+def test_loads_are_balanced():
+    np.random.seed(5)
+    dest_projects_df = reader_projects([50] * 6, [0, 0, 4, 4, 8, 8])
+    session_features = unassigned(20)
+    session_features[0]["assignments"] = [{"project_id": "project-0"}]
+
+    assignments = solve_assignments(session_features, dest_projects_df)
+
+    loads = check_assignments(assignments, session_features, dest_projects_df)
+    assert sum(len(project_ids) for project_ids in assignments) == 59
+    # The least loaded readers are filled up to the others first
+    assert max(loads.values()) - min(loads.values()) <= 1
+
+
+def test_planned_assignments_count_against_capacity():
+    dest_projects_df = reader_projects([2, 2, 2])
+    assignments = solve_assignments(
+        unassigned(3, case_coverage=2), dest_projects_df, planned={"project-0": 2}
+    )
+
+    assert "project-0" not in sum(assignments, [])
+    assert sum(len(project_ids) for project_ids in assignments) == 4
+
+
+def test_large_assignment_is_solved_quickly():
+    np.random.seed(5)
+    max_cases = [60 + (i % 5) * 10 for i in range(200)]
+    dest_projects_df = reader_projects(max_cases)
+    session_features = unassigned(5000)
+    # Some sessions have been assigned in an earlier run
+    for i, features in enumerate(session_features[:50]):
+        features["assignments"] = [{"project_id": f"project-{i % 200}"}]
+
+    start = time.perf_counter()
+    assignments = solve_assignments(session_features, dest_projects_df)
+    elapsed = time.perf_counter() - start
+
+    check_assignments(assignments, session_features, dest_projects_df)
+    assert sum(len(project_ids) for project_ids in assignments) == 15000 - 50
+    assert elapsed < 10
@@ -0,0 +1,66 @@
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.container_operations import (
+    CleanupReport,
+    _cleanup,
+    define_created,
+)
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def create_containers(stand_in, n_sessions, n_acquisitions):
+    _, reader_project = create_source_session(stand_in, 1, 1)
+    subject = reader_project.add_subject({"code": "subject-1"})
+    created_data = [define_created(subject)]
+    for i in range(n_sessions):
+        session = subject.add_session({"label": f"session-{i}"})
+        created_data.append(define_created(session))
+        for j in range(n_acquisitions):
+            acquisition = session.add_acquisition({"label": f"acquisition-{j}"})
+            created_data.append(define_created(acquisition))
+    stand_in.calls.clear()
+    return created_data
+
+
+def test_cleanup_is_ordered_by_level():
+    stand_in = StandInClient()
+    created_data = create_containers(stand_in, 2, 3)
+    fw_client = ContainerCache(stand_in)
+
+    records = _cleanup(fw_client, created_data)
+
+    assert [x["container"] for x in records] == ["acquisition"] * 6 + [
+        "session"
+    ] * 2 + ["subject"]
+    assert all(x["status"] == "deleted" for x in records)
+    for created in created_data:
+        assert created["id"] not in stand_in.containers
+
+
+def test_cleanup_continues_past_failures():
+    stand_in = StandInClient()
+    created_data = create_containers(stand_in, 2, 2)
+    fw_client = ContainerCache(stand_in)
+    failing_id = created_data[2]["id"]
+    delete_acquisition = stand_in.delete_acquisition
+
+    def fail_once(acquisition_id):
+        if acquisition_id == failing_id:
+            raise RuntimeError("delete failed")
+        delete_acquisition(acquisition_id)
+
+    stand_in.delete_acquisition = fail_once
+    cleanup_report = CleanupReport()
+
+    records = _cleanup(fw_client, created_data, cleanup_report=cleanup_report)
+    # The cleanups of a run are added to the same report
+    _cleanup(fw_client, [created_data[2]], cleanup_report=cleanup_report)
+
+    failed = [x for x in records if x["status"] == "failed"]
+    assert [x["id"] for x in failed] == [failing_id]
+    assert failed[0]["error"] == "delete failed"
+    # Every other container is deleted
+    assert len([x for x in records if x["status"] == "deleted"]) == 6
+
+    report_df = cleanup_report.report()
+    assert report_df.shape[0] == 8
+    assert list(report_df[report_df.id == failing_id].status) == ["failed", "failed"]
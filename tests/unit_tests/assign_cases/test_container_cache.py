@@ -0,0 +1,52 @@
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.container_operations import export_session
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def test_repeated_gets_are_served_from_cache():
+    stand_in = StandInClient()
+    session, _ = create_source_session(stand_in)
+    fw_client = ContainerCache(stand_in)
+
+    for _ in range(5):
+        assert fw_client.get(session.id) is session
+        assert fw_client.get_session(session.id) is session
+
+    assert stand_in.calls["get"] == 1
+    assert fw_client.hits == 9
+    assert fw_client.misses == 1
+
+
+def test_invalidate_forces_retrieval():
+    stand_in = StandInClient()
+    session, _ = create_source_session(stand_in)
+    fw_client = ContainerCache(stand_in)
+
+    fw_client.get(session.id)
+    fw_client.invalidate(session.id)
+    fw_client.reload(session)
+
+    assert stand_in.calls["get"] == 2
+
+
+def test_export_session_lookups():
+    n_acquisitions = 4
+    stand_in = StandInClient()
+    session, reader_project = create_source_session(
+        stand_in, n_acquisitions=n_acquisitions
+    )
+    fw_client = ContainerCache(stand_in)
+
+    dest_session, exported_data, created_data = export_session(
+        fw_client, session, reader_project
+    )
+
+    # subject, session, and one export record per acquisition
+    assert len(exported_data) == 2 + n_acquisitions
+    assert len(created_data) == 2 + n_acquisitions
+    assert len(dest_session.acquisitions()) == n_acquisitions
+
+    # Projects, subjects, and sessions are only retrieved once, each acquisition is
+    # retrieved once and once after each file upload.
+    assert fw_client.misses <= 5 + n_acquisitions * 3
+    assert fw_client.hits > fw_client.misses
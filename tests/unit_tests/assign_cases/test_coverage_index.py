@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from gears.assign_cases.utils.coverage_index import CoverageIndex
+
+
+def reader_projects(max_cases, assignments):
+    return pd.DataFrame(
+        {
+            "id": [f"project-{i}" for i in range(len(max_cases))],
+            "assignments": [
+                [{"source_session": s, "dest_session": f"d-{s}"} for s in sessions]
+                for sessions in assignments
+            ],
+            "max_cases": max_cases,
+            "num_assignments": [len(sessions) for sessions in assignments],
+        }
+    )
+
+
+def case_state(session_id, assigned, case_coverage=2):
+    return {"id": session_id, "assigned": assigned, "case_coverage": case_coverage}
+
+
+def test_covered_sessions_are_skipped():
+    dest_projects_df = reader_projects([5, 5, 5], [["a", "b"], ["a"], []])
+    index = CoverageIndex(
+        [case_state("a", 2), case_state("b", 1), case_state("c", 3, 4)],
+        dest_projects_df,
+    )
+
+    assert index.is_covered("a")
+    assert not index.needs_assignment("a")
+    assert index.needs_assignment("b")
+    assert index.needs_assignment("c")
+    # New sessions have no recorded case state
+    assert not index.is_covered("new")
+    assert index.needs_assignment("new")
+
+
+def test_sessions_without_reader_capacity_are_skipped():
+    # Only project-1 has capacity, and already holds session "b"
+    dest_projects_df = reader_projects([1, 2, np.nan], [["a"], ["b"], []])
+    index = CoverageIndex([case_state("a", 1), case_state("b", 1)], dest_projects_df)
+
+    assert index.needs_assignment("a")
+    assert not index.needs_assignment("b")
+
+
+def test_index_from_project_case_states():
+    project = SimpleNamespace(
+        label="Master Project",
+        info={"project_features": {"case_states": [case_state("a", 2)]}},
+    )
+    index = CoverageIndex.from_project(project, reader_projects([2], [[]]))
+
+    assert len(index) == 1
+    assert index.case_states == [case_state("a", 2)]
+    assert not index.needs_assignment("a")
+
+    empty = CoverageIndex.from_project(
+        SimpleNamespace(label="New Project", info={}), reader_projects([2], [[]])
+    )
+    assert len(empty) == 0
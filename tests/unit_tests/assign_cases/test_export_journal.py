@@ -0,0 +1,138 @@
+import json
+
+import pytest
+
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.container_operations import export_session
+from gears.assign_cases.utils.export_journal import JOURNAL_FILE, ExportJournal
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def containers_of(stand_in, container_type, project):
+    return [
+        c
+        for c in stand_in.containers.values()
+        if c.container_type == container_type and c.parents["project"] == project.id
+    ]
+
+
+def test_interrupted_export_is_resumed(tmp_path):
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 4, 2)
+    fw_client = ContainerCache(stand_in)
+    journal = ExportJournal(fw_client, output_dir=tmp_path)
+
+    # The run is killed partway through the export
+    def interrupt(*args):
+        raise KeyboardInterrupt()
+
+    failing_file = source_session.acquisitions()[2].files[1]
+    download, read = failing_file.download, failing_file.read
+    failing_file.download = interrupt
+    failing_file.read = interrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        export_session(
+            fw_client, source_session, reader_project, max_workers=1, journal=journal
+        )
+
+    # The containers of the interrupted export are kept to be resumed
+    assert len(containers_of(stand_in, "session", reader_project)) == 1
+    assert len(containers_of(stand_in, "acquisition", reader_project)) == 4
+    entry = journal.entry(source_session.id, reader_project.id)
+    assert entry["status"] == "exporting"
+    assert sum(len(a["files"]) for a in entry["acquisitions"].values()) == 7
+
+    failing_file.download, failing_file.read = download, read
+    stand_in.calls.clear()
+    dest_session, exported_data, created_data = export_session(
+        fw_client, source_session, reader_project, max_workers=1, journal=journal
+    )
+
+    # Only the missing file is exported, to the containers of the earlier run
+    assert stand_in.calls["upload_file"] == 1
+    assert not created_data
+    assert len(containers_of(stand_in, "session", reader_project)) == 1
+    assert len(containers_of(stand_in, "acquisition", reader_project)) == 4
+    assert [x["container"] for x in exported_data] == ["subject", "session"] + [
+        "acquisition"
+    ] * 4
+    dest_acquisitions = {a.label: a for a in dest_session.acquisitions()}
+    for source_acquisition in source_session.acquisitions():
+        dest_acquisition = dest_acquisitions[source_acquisition.label]
+        for source_file in source_acquisition.files:
+            dest_file = dest_acquisition.get_file(source_file.name)
+            assert dest_file.contents == source_file.contents
+    assert journal.entry(source_session.id, reader_project.id)["status"] == "exported"
+
+
+def test_failed_export_is_cleaned_up():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 2, 2)
+    fw_client = ContainerCache(stand_in)
+    journal = ExportJournal(fw_client)
+
+    def fail(*args):
+        raise RuntimeError("download failed")
+
+    failing_file = source_session.acquisitions()[1].files[1]
+    failing_file.download = fail
+    failing_file.read = fail
+
+    with pytest.raises(RuntimeError):
+        export_session(
+            fw_client, source_session, reader_project, max_workers=1, journal=journal
+        )
+
+    # Readers are not left with a partial session, nor is it resumed
+    assert not containers_of(stand_in, "subject", reader_project)
+    assert not containers_of(stand_in, "session", reader_project)
+    assert not containers_of(stand_in, "acquisition", reader_project)
+    assert journal.entry(source_session.id, reader_project.id) is None
+
+
+def test_removed_session_is_exported_again():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 2, 2)
+    fw_client = ContainerCache(stand_in)
+    journal = ExportJournal(fw_client)
+    journal.record_session(source_session.id, reader_project.id, "removed-session")
+
+    dest_session, _, created_data = export_session(
+        fw_client, source_session, reader_project, journal=journal
+    )
+
+    assert [x["container"] for x in created_data] == ["subject", "session"] + [
+        "acquisition"
+    ] * 2
+    entry = journal.entry(source_session.id, reader_project.id)
+    assert entry["session"] == dest_session.id
+
+
+def test_checkpoint_round_trip(tmp_path):
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, 1)
+    fw_client = ContainerCache(stand_in)
+    project = stand_in.get(source_session.parents["project"])
+    journal = ExportJournal.load(fw_client, project, tmp_path)
+    assert len(journal) == 0
+
+    journal.record_session(source_session.id, reader_project.id, "dest-session")
+    journal.record_file(source_session.id, reader_project.id, "acq", "file.dcm")
+    # Checkpoints are throttled unless forced
+    journal.checkpoint()
+    assert journal.checkpoints == 0
+    journal.checkpoint(force=True)
+    assert journal.checkpoints == 1
+    # An unchanged journal is not checkpointed again
+    journal.checkpoint(force=True)
+    assert journal.checkpoints == 1
+
+    with open(tmp_path / JOURNAL_FILE) as fp:
+        assert json.load(fp) == journal.entries
+    loaded = ExportJournal.load(fw_client, project)
+    assert loaded.entries == journal.entries
+    assert loaded.pending_projects(source_session.id) == [reader_project.id]
+
+    loaded.remove(source_session.id)
+    assert not loaded.pending_projects(source_session.id)
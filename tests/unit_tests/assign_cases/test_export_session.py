@@ -0,0 +1,144 @@
+import pytest
+
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.container_operations import (
+    export_session,
+    export_session_to_projects,
+)
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def containers_of(stand_in, container_type, project):
+    return [
+        c
+        for c in stand_in.containers.values()
+        if c.container_type == container_type and c.parents["project"] == project.id
+    ]
+
+
+@pytest.mark.parametrize("max_workers", [1, 4])
+def test_export_session(max_workers):
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 8, 2)
+    fw_client = ContainerCache(stand_in)
+
+    dest_session, exported_data, created_data = export_session(
+        fw_client, source_session, reader_project, max_workers=max_workers
+    )
+    # The acquisitions of the source session are found once
+    assert stand_in.calls["acquisitions.find"] == 1
+
+    source_labels = [a.label for a in source_session.acquisitions()]
+    # Records are in the order of the source acquisitions
+    assert [x["container"] for x in exported_data[:2]] == ["subject", "session"]
+    assert [x["name"] for x in exported_data[2:]] == source_labels
+    assert [x["container"] for x in created_data] == ["subject", "session"] + [
+        "acquisition"
+    ] * 8
+
+    dest_acquisitions = {a.label: a for a in dest_session.acquisitions()}
+    for source_acquisition in source_session.acquisitions():
+        dest_acquisition = dest_acquisitions[source_acquisition.label]
+        for source_file in source_acquisition.files:
+            dest_file = dest_acquisition.get_file(source_file.name)
+            assert dest_file.contents == source_file.contents
+            assert dest_file.classification == source_file.classification
+            assert dest_file.info == source_file.info
+
+
+def test_failed_export_is_cleaned_up():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 8, 2)
+    fw_client = ContainerCache(stand_in)
+
+    def fail(*args):
+        raise RuntimeError("download failed")
+
+    source_session.acquisitions()[3].files[1].download = fail
+    source_session.acquisitions()[3].files[1].read = fail
+
+    with pytest.raises(RuntimeError):
+        export_session(fw_client, source_session, reader_project, max_workers=4)
+
+    # Every container created by any of the workers is removed
+    for container_type in ["subject", "session", "acquisition"]:
+        assert not containers_of(stand_in, container_type, reader_project)
+
+
+def test_export_session_to_projects():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 4, 2)
+    group = stand_in.get(reader_project.parents["group"])
+    reader_projects = [reader_project] + [
+        group.add_project({"label": f"Reader {i}"}) for i in range(2, 4)
+    ]
+    stand_in.calls.clear()
+    fw_client = ContainerCache(stand_in)
+
+    exports = export_session_to_projects(fw_client, source_session, reader_projects)
+
+    # Each source file is downloaded once and uploaded to each reader project
+    assert stand_in.calls["download_file"] == 8
+    assert stand_in.calls["upload_file"] == 3 * 8
+    source_labels = [a.label for a in source_session.acquisitions()]
+    for dest_session, exported_data, created_data in exports:
+        assert [x["name"] for x in exported_data[2:]] == source_labels
+        assert [x["container"] for x in created_data] == ["subject", "session"] + [
+            "acquisition"
+        ] * 4
+        dest_acquisitions = {a.label: a for a in dest_session.acquisitions()}
+        for source_acquisition in source_session.acquisitions():
+            dest_acquisition = dest_acquisitions[source_acquisition.label]
+            for source_file in source_acquisition.files:
+                dest_file = dest_acquisition.get_file(source_file.name)
+                assert dest_file.contents == source_file.contents
+                assert dest_file.info == source_file.info
+
+
+def test_failed_project_export_is_isolated():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 4, 2)
+    group = stand_in.get(reader_project.parents["group"])
+    failing_project = group.add_project({"label": "Reader 2"})
+    fw_client = ContainerCache(stand_in)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("upload failed")
+
+    # Uploads to the acquisitions of the failing project fail
+    add_acquisition = type(source_session).add_acquisition
+
+    def add_failing_acquisition(session, metadata):
+        acquisition = add_acquisition(session, metadata)
+        if session.parents["project"] == failing_project.id:
+            acquisition.upload_file = fail
+        return acquisition
+
+    type(source_session).add_acquisition = add_failing_acquisition
+    try:
+        exports = export_session_to_projects(
+            fw_client, source_session, [reader_project, failing_project]
+        )
+    finally:
+        type(source_session).add_acquisition = add_acquisition
+
+    dest_session, _, _ = exports[0]
+    assert len(dest_session.acquisitions()) == 4
+    assert isinstance(exports[1], RuntimeError)
+    # The containers created in the failing project are removed
+    for container_type in ["subject", "session", "acquisition"]:
+        assert not containers_of(stand_in, container_type, failing_project)
+
+
+def test_tags_are_created_with_containers():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 3, 1)
+    fw_client = ContainerCache(stand_in)
+
+    dest_session, _, _ = export_session(fw_client, source_session, reader_project)
+
+    # Tags are part of the creation of each container, not added one at a time
+    assert stand_in.calls["add_tag"] == 0
+    assert dest_session.tags == source_session.tags
+    for dest_acquisition in dest_session.acquisitions():
+        assert dest_acquisition.tags == ["series"]
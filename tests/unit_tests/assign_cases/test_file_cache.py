@@ -0,0 +1,90 @@
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.file_cache import FileCache, cache_key
+from gears.assign_cases.utils.transfer_engine import TransferEngine
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def create_file(file_id, version=1, file_hash=None):
+    return SimpleNamespace(
+        name=f"{file_id}.dcm", file_id=file_id, version=version, hash=file_hash
+    )
+
+
+def test_cache_key():
+    assert cache_key(create_file("f1", 2)) == "f1_v2"
+    assert cache_key(create_file("f1", 2, "v0-sha384-abc")) == "v0-sha384-abc"
+    assert cache_key(create_file(None)) is None
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    file_cache = FileCache(tmp_path / "file_cache", max_bytes=3 * 64)
+    files = [create_file(f"f{i}") for i in range(4)]
+    for acq_file in files[:3]:
+        file_cache.put(acq_file, bytes([int(acq_file.file_id[1])]) * 64)
+
+    # f0 is used, leaving f1 as the least recently used file
+    assert file_cache.read(files[0]) == bytes([0]) * 64
+    file_cache.put(files[3], bytes([3]) * 64)
+
+    assert file_cache.read(files[1]) is None
+    assert file_cache.read(files[3]) == bytes([3]) * 64
+    dest_path = str(tmp_path / "fetched.dcm")
+    assert file_cache.fetch(files[2], dest_path)
+    with open(dest_path, "rb") as fp:
+        assert fp.read() == bytes([2]) * 64
+
+    assert (file_cache.hits, file_cache.misses, file_cache.evictions) == (3, 1, 1)
+    assert len(file_cache) == 3
+    assert file_cache.bytes_cached == 3 * 64
+
+    # A new version of a file is a different entry
+    assert file_cache.read(create_file("f0", version=2)) is None
+
+    file_cache.clear()
+    assert os.listdir(tmp_path / "file_cache") == []
+
+
+def test_files_larger_than_the_cache_are_not_cached(tmp_path):
+    file_cache = FileCache(tmp_path, max_bytes=32)
+    file_cache.put(create_file("f0"), b"0" * 64)
+
+    assert len(file_cache) == 0
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("memory_threshold", [1024, 0])
+def test_exported_files_are_served_from_the_cache(tmp_path, memory_threshold):
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, 4)
+    source_acquisition = source_session.acquisitions()[0]
+    dest_subject = reader_project.add_subject({"code": "subject-1"})
+    dest_acquisitions = [
+        dest_subject.add_session({"label": f"session-{i}"}).add_acquisition(
+            {"label": source_acquisition.label}
+        )
+        for i in range(2)
+    ]
+    stand_in.calls.clear()
+
+    file_cache = FileCache(tmp_path / "file_cache")
+    transfer_engine = TransferEngine(
+        ContainerCache(stand_in),
+        memory_threshold=memory_threshold,
+        file_cache=file_cache,
+    )
+    first = transfer_engine.transfer_files(source_acquisition, dest_acquisitions[0])
+    second = transfer_engine.transfer_files(source_acquisition, dest_acquisitions[1])
+
+    # The second export of the files does not download them
+    assert stand_in.calls["download_file"] == 4
+    assert not any(t["cached"] for t in first)
+    assert all(t["cached"] for t in second)
+    assert (file_cache.hits, file_cache.misses) == (4, 4)
+    for acq_file in source_acquisition.files:
+        dest_file = dest_acquisitions[1].get_file(acq_file.name)
+        assert dest_file.contents == acq_file.contents
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gears.assign_cases.utils.reader_selector import ReaderSelector
+
+DATA_ROOT = Path(__file__).parents[2] / "data"
+
+
+def select_with_dataframe(session_features, dest_projects_df):
+    """The selection by dataframe filtering the ReaderSelector replaces."""
+    avail_case_coverage = session_features["case_coverage"] - len(
+        session_features["assignments"]
+    )
+    readers_proj_assigned = [a["project_id"] for a in session_features["assignments"]]
+    df_temp = dest_projects_df[
+        (dest_projects_df.num_assignments == np.min(dest_projects_df.num_assignments))
+        & (dest_projects_df.num_assignments < dest_projects_df.max_cases)
+        & ~dest_projects_df.id.isin(readers_proj_assigned)
+    ]
+    assign_reader_projs = list(
+        np.random.choice(
+            df_temp.id, min(avail_case_coverage, df_temp.shape[0]), replace=False
+        )
+    )
+    if df_temp.shape[0] < avail_case_coverage:
+        df_temp_len = df_temp.shape[0]
+        df_temp = dest_projects_df[
+            ~dest_projects_df.id.isin(readers_proj_assigned + assign_reader_projs)
+            & (dest_projects_df.num_assignments < dest_projects_df.max_cases)
+        ]
+        assign_reader_projs.extend(
+            np.random.choice(
+                df_temp.id,
+                min(avail_case_coverage - df_temp_len, df_temp.shape[0]),
+                replace=False,
+            )
+        )
+    return assign_reader_projs
+
+
+def reader_projects():
+    dest_projects_df = pd.read_csv(
+        DATA_ROOT / "assign_cases/unit_test_csv" / "reader_project_case_data.csv"
+    )
+    # Readers with differing capacity, some already assigned sessions
+    dest_projects_df["max_cases"] = [20 + 5 * (i % 3) for i in dest_projects_df.index]
+    dest_projects_df["num_assignments"] = [i % 4 for i in dest_projects_df.index]
+    return dest_projects_df
+
+
+def test_selection_matches_dataframe_selection():
+    dest_projects_df = reader_projects()
+    reference_df = dest_projects_df.copy()
+    selector = ReaderSelector(dest_projects_df)
+
+    for session in range(150):
+        session_features = {"case_coverage": 3, "assignments": []}
+        np.random.seed(session)
+        expected = select_with_dataframe(session_features, reference_df)
+        np.random.seed(session)
+        selected = selector.select(session_features)
+
+        assert selected == expected
+        for project_id in selected:
+            reference_df.loc[reference_df.id == project_id, "num_assignments"] += 1
+            selector.record_assignment(project_id)
+
+    for project_id, num_assignments in zip(reference_df.id, reference_df.num_assignments):
+        assert selector.num_assignments(project_id) == num_assignments
+    # Readers never exceed their max_cases
+    assert all(reference_df.num_assignments <= reference_df.max_cases)
+
+
+def test_assigned_readers_are_not_selected_again():
+    dest_projects_df = reader_projects()
+    selector = ReaderSelector(dest_projects_df)
+    assigned = list(dest_projects_df.id[:2])
+    session_features = {
+        "case_coverage": 3,
+        "assignments": [{"project_id": project_id} for project_id in assigned],
+    }
+
+    np.random.seed(1)
+    selected = selector.select(session_features)
+
+    assert len(selected) == 1
+    assert selected[0] not in assigned
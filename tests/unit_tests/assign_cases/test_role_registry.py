@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import flywheel
+
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.manage_cases import find_readers_in_projects
+from tests.unit_tests.stand_in_client import StandInClient
+
+ROLES = [
+    SimpleNamespace(id="role-admin", label="admin"),
+    SimpleNamespace(id="role-rw", label="read-write"),
+    SimpleNamespace(id="role-ro", label="read-only"),
+]
+
+
+def create_client():
+    stand_in = StandInClient()
+    stand_in.roles = ROLES
+    return stand_in, ContainerCache(stand_in)
+
+
+def test_roles_are_loaded_once():
+    stand_in, fw_client = create_client()
+
+    for _ in range(10):
+        assert fw_client.roles.reader_role_ids == {"role-rw", "role-ro"}
+        assert fw_client.roles.read_write_id == "role-rw"
+        assert fw_client.roles.admin_id == "role-admin"
+        assert len(fw_client.get_all_roles()) == 3
+
+    assert stand_in.calls["get_all_roles"] == 1
+
+
+def test_unknown_role_label():
+    _, fw_client = create_client()
+
+    assert fw_client.roles.role_id("no-such-role") is None
+    assert fw_client.roles.role_ids(["no-such-role"]) == set()
+
+
+def test_find_readers_with_registry_roles():
+    _, fw_client = create_client()
+    project = flywheel.Project(
+        label="Reader 1",
+        info={"project_features": {}},
+        permissions=[
+            flywheel.RolesRoleAssignment(id="admin@site.org", role_ids=["role-admin"]),
+            flywheel.RolesRoleAssignment(id="reader@site.org", role_ids=["role-rw"]),
+        ],
+    )
+    project.update_info = lambda info: None
+
+    reader_ids = find_readers_in_projects(project, fw_client.roles.reader_role_ids)
+
+    assert reader_ids == ["reader@site.org"]
@@ -53,6 +53,35 @@ def test_reader_assigned_shift():
     ]
 
 
+def readme_distribution():
+    """
+    Return the reader projects and cases of the distribution outlined in README.
+
+    520 cases are assigned across 13 readers, each case to three readers and each
+    reader up to 120 cases (13 x 120 = 3 x 520 = 1560).
+    """
+    dest_projects_df = pd.DataFrame(
+        {
+            "id": [str(bson.ObjectId()) for _ in range(13)],
+            "label": [f"Reader {i + 1}" for i in range(13)],
+            "reader_id": [f"reader{i + 1}@flywheel.io" for i in range(13)],
+            "assignments": ["[]"] * 13,
+            "max_cases": [120] * 13,
+            "num_assignments": [0] * 13,
+        }
+    )
+    source_sessions_df = pd.DataFrame(
+        {
+            "id": [str(bson.ObjectId()) for _ in range(520)],
+            "label": [f"case-{i + 1}" for i in range(520)],
+            "assignments": ["[]"] * 520,
+            "assigned_count": [0] * 520,
+            "case_coverage": [3] * 520,
+        }
+    )
+    return dest_projects_df, source_sessions_df
+
+
 def case_df_to_session_features(case):
     return {
         "case_coverage": case.case_coverage,
@@ -61,13 +90,13 @@ def case_df_to_session_features(case):
     }
 
 
-def assign_cases_to_readers(dest_projects_df, source_sessions_df):
+def assign_cases_to_readers(dest_projects_df, source_sessions_df, rng=None):
     for sess_indx in source_sessions_df.index:
         session_features = case_df_to_session_features(
             source_sessions_df.loc[sess_indx]
         )
         assign_reader_projs = select_readers_without_replacement(
-            session_features, dest_projects_df
+            session_features, dest_projects_df, rng=rng
         )
         for project_id in assign_reader_projs:
             proj_indx = dest_projects_df[dest_projects_df.id == project_id].index[0]
@@ -108,14 +137,10 @@ def test_single_master_single_distribution():
 
     1. Single Master Project with Single Distribution.
     """
-    dest_projects_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "reader_project_case_data.csv"
-    )
-    source_sessions_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "master_project_case_data.csv"
-    )
+    dest_projects_df, source_sessions_df = readme_distribution()
+    rng = np.random.default_rng(3141592653)
 
-    assign_cases_to_readers(dest_projects_df, source_sessions_df)
+    assign_cases_to_readers(dest_projects_df, source_sessions_df, rng=rng)
 
     assert dest_projects_df["num_assignments"].sum() == 1560
     assert source_sessions_df["assigned_count"].sum() == 1560
@@ -129,15 +154,10 @@ def test_single_master_multi_distributions():
 
     2. Single Master Project with Multiple Distributions.
     """
-    dest_projects_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "reader_project_case_data.csv"
-    )
-    source_sessions_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "master_project_case_data.csv"
-    )
+    dest_projects_df, source_sessions_df = readme_distribution()
 
     max_cases = 0
-    np.random.seed(3231)
+    rng = np.random.default_rng(3231)
     for i in range(7):
         max_cases += 20
         max_cases = min(max_cases, 120)
@@ -145,7 +165,7 @@ def test_single_master_multi_distributions():
         for indx in dest_projects_df.index:
             dest_projects_df.loc[indx, "max_cases"] = max_cases
 
-        assign_cases_to_readers(dest_projects_df, source_sessions_df)
+        assign_cases_to_readers(dest_projects_df, source_sessions_df, rng=rng)
 
         if dest_projects_df["num_assignments"].sum() == 1560:
             break
@@ -162,14 +182,9 @@ def test_multi_master_multi_distributions():
 
     3. Multiple Masters Projects with Multiple Distributions.
     """
-    dest_projects_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "reader_project_case_data.csv"
-    )
-    source_sessions_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "master_project_case_data.csv"
-    )
+    dest_projects_df, source_sessions_df = readme_distribution()
 
-    np.random.seed(2)
+    rng = np.random.default_rng(2)
     batch_start = 0
     for i in range(7):
         if i % 2 == 0:
@@ -181,7 +196,7 @@ def test_multi_master_multi_distributions():
 
         batch_df = source_sessions_df.iloc[batch_start:max_end, :].copy()
 
-        assign_cases_to_readers(dest_projects_df, batch_df)
+        assign_cases_to_readers(dest_projects_df, batch_df, rng=rng)
 
         batch_start += batch_size
         assert batch_df["assigned_count"].unique() == [3]
@@ -200,14 +215,9 @@ def test_multi_master_multi_distributions_w_mixed_max_cases():
     A. max_cases across readers and
     B. having two readers start 1 cycle late
     """
-    dest_projects_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "reader_project_case_data.csv"
-    )
-    source_sessions_df = pd.read_csv(
-        DATA_ROOT / "assign_cases/unit_test_csv" / "master_project_case_data.csv"
-    )
+    dest_projects_df, source_sessions_df = readme_distribution()
 
-    np.random.seed(2)
+    rng = np.random.default_rng(2)
     batch_start = 0
     max_cases = 0
     late_readers = [11, 12]
@@ -230,7 +240,7 @@ def test_multi_master_multi_distributions_w_mixed_max_cases():
 
         batch_df = source_sessions_df.iloc[batch_start:max_end, :]
 
-        assign_cases_to_readers(dest_projects_df, batch_df)
+        assign_cases_to_readers(dest_projects_df, batch_df, rng=rng)
 
         batch_start += batch_size
 
@@ -0,0 +1,60 @@
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.session_loader import (
+    iter_project_sessions,
+    load_project_sessions,
+)
+from tests.unit_tests.stand_in_client import StandInClient
+
+
+def create_master_project(n_sessions):
+    stand_in = StandInClient()
+    group = stand_in.add_group("master")
+    project = group.add_project({"label": "Master Project"})
+    subject = project.add_subject({"code": "subject-1", "label": "subject-1"})
+    for i in range(n_sessions):
+        subject.add_session(
+            {"label": f"session-{i}", "info": {"session_features": {"index": i}}}
+        )
+    stand_in.calls.clear()
+
+    return stand_in, project
+
+
+def test_sessions_loaded_in_pages():
+    stand_in, project = create_master_project(250)
+
+    sessions = load_project_sessions(stand_in, project.id, page_size=100)
+
+    assert len(sessions) == 250
+    assert [s.info["session_features"]["index"] for s in sessions] == list(range(250))
+    assert all(s.subject.label == "subject-1" for s in sessions)
+    # Three pages and no reload per session
+    assert stand_in.calls["sessions.find"] == 3
+    assert stand_in.calls["get"] == 0
+
+
+def test_session_without_info_is_reloaded():
+    stand_in, project = create_master_project(3)
+    session = stand_in.sessions.find_first()
+    session.info = None
+    stand_in.calls.clear()
+
+    sessions = list(iter_project_sessions(ContainerCache(stand_in), project.id))
+
+    assert len(sessions) == 3
+    assert stand_in.calls["get"] == 1
+
+
+def test_only_selected_sessions_are_reloaded():
+    stand_in, project = create_master_project(250)
+    selected = {s.id for s in stand_in.sessions.find()[::50]}
+    stand_in.calls.clear()
+
+    sessions = list(
+        iter_project_sessions(
+            ContainerCache(stand_in), project.id, select=selected.__contains__
+        )
+    )
+
+    assert {s.id for s in sessions} == selected
+    assert stand_in.calls["get"] == len(selected)
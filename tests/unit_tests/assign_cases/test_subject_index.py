@@ -0,0 +1,96 @@
+import flywheel
+import pytest
+
+from gears.assign_cases.utils import subject_index
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.container_operations import (
+    _cleanup,
+    export_or_find_subject,
+)
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def add_sessions(stand_in, n_subjects):
+    master = next(
+        c for c in stand_in.containers.values() if c.get("label") == "Master Project"
+    )
+    sessions = []
+    for i in range(n_subjects):
+        subject = master.add_subject({"code": f"subject-{i + 2}"})
+        sessions.append(subject.add_session({"label": f"session-{i + 2}"}))
+    stand_in.calls.clear()
+    return sessions
+
+
+def test_subjects_are_indexed_once():
+    stand_in = StandInClient()
+    _, reader_project = create_source_session(stand_in, 1, 1)
+    sessions = add_sessions(stand_in, 5)
+    fw_client = ContainerCache(stand_in)
+
+    for session in sessions + sessions:
+        dest_subject, _, _ = export_or_find_subject(
+            fw_client, session.subject, reader_project
+        )
+        assert dest_subject.code == session.subject.code
+
+    # The subjects of the project are listed once, and each subject created once
+    assert stand_in.calls["subjects.find"] == 1
+    assert stand_in.calls["add_subject"] == 5
+    assert len(fw_client.subject_index(reader_project)) == 5
+
+
+def test_create_conflict_finds_existing_subject(monkeypatch):
+    monkeypatch.setattr(subject_index, "CREATE_CONFLICT_BACKOFF", 0)
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, 1)
+    fw_client = ContainerCache(stand_in)
+    fw_client.subject_index(reader_project)
+
+    # Another job creates the subject after the project has been indexed
+    reader_project.add_subject({"code": source_session.subject.code})
+
+    dest_subject, subj_export, created_container = export_or_find_subject(
+        fw_client, source_session.subject, reader_project
+    )
+
+    assert dest_subject.code == source_session.subject.code
+    assert subj_export["status"] == "used existing"
+    assert created_container is None
+
+
+def test_create_failure_is_raised_after_bounded_attempts(monkeypatch):
+    monkeypatch.setattr(subject_index, "CREATE_CONFLICT_BACKOFF", 0)
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, 1)
+    fw_client = ContainerCache(stand_in)
+
+    def fail(metadata):
+        raise flywheel.ApiException(status=500, reason="Server Error")
+
+    reader_project.add_subject = fail
+    stand_in.calls.clear()
+    with pytest.raises(flywheel.ApiException):
+        export_or_find_subject(fw_client, source_session.subject, reader_project)
+
+    # The initial listing and one lookup per attempt
+    assert (
+        stand_in.calls["subjects.find"] == 1 + subject_index.CREATE_CONFLICT_ATTEMPTS
+    )
+
+
+def test_deleted_subject_is_removed_from_index():
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, 1)
+    fw_client = ContainerCache(stand_in)
+
+    _, _, created_container = export_or_find_subject(
+        fw_client, source_session.subject, reader_project
+    )
+    _cleanup(fw_client, [created_container])
+
+    assert source_session.subject.code not in fw_client.subject_index(reader_project)
+    _, subj_export, _ = export_or_find_subject(
+        fw_client, source_session.subject, reader_project
+    )
+    assert subj_export["status"] == "created"
@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+
+import pytest
+
+from gears.assign_cases.utils.container_cache import ContainerCache
+from gears.assign_cases.utils.transfer_engine import (
+    TRANSFER_RECORD_TEMPLATE,
+    TransferBudgetExceededError,
+    TransferEngine,
+    TransferUploadError,
+)
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+
+def create_acquisitions(n_files):
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, n_files)
+    source_acquisition = source_session.acquisitions()[0]
+    dest_subject = reader_project.add_subject({"code": "subject-1"})
+    dest_acquisition = dest_subject.add_session({"label": "session-1"}).add_acquisition(
+        {"label": source_acquisition.label}
+    )
+    return stand_in, source_acquisition, dest_acquisition
+
+
+def test_downloads_are_bounded():
+    stand_in, source_acquisition, dest_acquisition = create_acquisitions(12)
+    lock = threading.Lock()
+    active = {"now": 0, "max": 0}
+
+    for acq_file in source_acquisition.files:
+        read = acq_file.read
+
+        def slow_read(read=read):
+            with lock:
+                active["now"] += 1
+                active["max"] = max(active["max"], active["now"])
+            time.sleep(0.02)
+            contents = read()
+            with lock:
+                active["now"] -= 1
+            return contents
+
+        acq_file.read = slow_read
+
+    progress = []
+    transfer_engine = TransferEngine(
+        ContainerCache(stand_in),
+        max_downloads=3,
+        max_uploads=2,
+        progress_callback=progress.append,
+    )
+    transfers = transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+    assert 1 < active["max"] <= 3
+    assert [t["file"] for t in transfers] == [f.name for f in source_acquisition.files]
+    assert len(progress) == 12
+    assert all(t["status"] == "transferred" for t in transfers)
+    assert all(t["size"] == 64 and t["attempts"] == 1 for t in transfers)
+    for acq_file in source_acquisition.files:
+        dest_file = dest_acquisition.get_file(acq_file.name)
+        assert dest_file.contents == acq_file.contents
+        assert dest_file.modality == "MR"
+
+    report_df = transfer_engine.report()
+    assert list(report_df.columns) == list(TRANSFER_RECORD_TEMPLATE.keys())
+    assert len(report_df) == 12
+
+
+def test_byte_budget_is_enforced():
+    stand_in, source_acquisition, dest_acquisition = create_acquisitions(4)
+    transfer_engine = TransferEngine(ContainerCache(stand_in), byte_budget=3 * 64)
+
+    with pytest.raises(TransferBudgetExceededError):
+        transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+    # The transfers within the budget are completed
+    assert len(dest_acquisition.files) == 3
+    assert transfer_engine.bytes_reserved == 3 * 64
+
+
+def test_small_files_are_held_in_memory():
+    stand_in, source_acquisition, dest_acquisition = create_acquisitions(6)
+    transfer_engine = TransferEngine(ContainerCache(stand_in), max_memory_bytes=6 * 64)
+
+    transfers = transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+    assert not any(t["spooled"] for t in transfers)
+    assert all(t["memory_bytes"] == 64 for t in transfers)
+    assert 0 < transfer_engine.peak_memory_bytes <= 6 * 64
+    assert transfer_engine.peak_disk_bytes == 0
+    assert transfer_engine.memory_in_use == 0
+    for acq_file in source_acquisition.files:
+        assert dest_acquisition.get_file(acq_file.name).contents == acq_file.contents
+
+
+def test_large_files_are_spooled_to_unique_paths():
+    stand_in, source_acquisition, dest_acquisition = create_acquisitions(4)
+    spooled_paths = []
+    for acq_file in source_acquisition.files:
+        download = acq_file.download
+
+        def record_download(dest_file, download=download):
+            spooled_paths.append(dest_file)
+            download(dest_file)
+
+        acq_file.download = record_download
+
+    transfer_engine = TransferEngine(ContainerCache(stand_in), memory_threshold=32)
+    transfers = transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+    assert all(t["spooled"] and t["disk_bytes"] == 64 for t in transfers)
+    assert transfer_engine.peak_memory_bytes == 0
+    assert 0 < transfer_engine.peak_disk_bytes <= 4 * 64
+    assert transfer_engine.disk_in_use == 0
+    # Every file has its own spool directory and each is removed
+    assert len({os.path.dirname(p) for p in spooled_paths}) == 4
+    assert not any(os.path.exists(p) for p in spooled_paths)
+    for acq_file in source_acquisition.files:
+        assert dest_acquisition.get_file(acq_file.name).contents == acq_file.contents
+
+
+def test_metadata_is_uploaded_with_the_file():
+    stand_in, source_acquisition, dest_acquisition = create_acquisitions(3)
+    source_acquisition.files[0].modality = None
+    source_acquisition.files[0].name = "report.mriqc.qa.html"
+    stand_in.calls.clear()
+
+    transfer_engine = TransferEngine(ContainerCache(stand_in))
+    transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+    # One upload per file, with no separate metadata updates or file listings
+    assert stand_in.calls["upload_file"] == 3
+    assert stand_in.calls["update_file"] == 0
+    # Only the source acquisition and its parents are retrieved
+    assert stand_in.calls["get"] == 4
+    dest_file = dest_acquisition.get_file("report.mriqc.qa.html")
+    assert dest_file.modality == "MR"
+    for acq_file in source_acquisition.files[1:]:
+        dest_file = dest_acquisition.get_file(acq_file.name)
+        assert dest_file.modality == acq_file.modality
+        assert dest_file.type == acq_file.type
+        assert dest_file.classification == acq_file.classification
+        assert dest_file.info == acq_file.info
+
+
+def test_unconfirmed_upload_is_retried():
+    stand_in, source_acquisition, dest_acquisition = create_acquisitions(1)
+    dest_acquisition.upload_file = lambda file, **kwargs: []
+
+    transfer_engine = TransferEngine(ContainerCache(stand_in))
+    with pytest.raises(TransferUploadError):
+        transfer_engine.transfer_files(source_acquisition, dest_acquisition)
+
+    transfer = transfer_engine.transfers[0]
+    assert transfer["status"] == "failed"
+    assert not transfer["uploaded"]
+    assert transfer["attempts"] == 5
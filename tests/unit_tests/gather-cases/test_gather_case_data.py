@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from gears.gather_cases.utils import manage_cases
+from gears.gather_cases.utils.container_cache import ContainerCache
+from gears.gather_cases.utils.manage_cases import (
+    fill_reader_case_data,
+    gather_case_data_from_readers,
+)
+from gears.gather_cases.utils.series_tags import SeriesTagCache
+from tests.unit_tests.stand_in_client import StandInClient
+
+
+class StandInWadoClient:
+    def get(self, project_id, study=None, series=None, instance=None):
+        return [
+            {
+                "00080018": {"Value": [f"se.{i}"]},
+                "0008103E": {"Value": ["COR PD"]},
+                "00200013": {"Value": [i]},
+                "00200032": {"Value": [-10.0, -20.0, 2.5 * (i - 1)]},
+                "00200037": {"Value": [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]},
+                "00280030": {"Value": [0.5, 0.5]},
+            }
+            for i in range(1, 4)
+        ]
+
+
+def create_master_project(n_sessions, lengths=None):
+    """Return a master project with sessions each assigned to and read by a reader."""
+    stand_in = StandInClient()
+    group = stand_in.add_group("readers")
+    master_project = group.add_project({"label": "Master Project"})
+    master_project.add_file(
+        "ohif_config.json", json.dumps({"questions": [{"key": "tear"}]}).encode()
+    )
+    reader_project = group.add_project({"label": "Reader 1"})
+    reader_subject = reader_project.add_subject({"code": "subject-1"})
+    master_subject = master_project.add_subject({"code": "subject-1"})
+    sessions = []
+    for i in range(n_sessions):
+        ohif_viewer = {
+            "read": {
+                "reader@flywheel_io": {"notes": {"tear": "full"}, "date": "2021-05-18"}
+            }
+        }
+        if lengths:
+            ohif_viewer["measurements"] = {"Length": lengths}
+        reader_session = reader_subject.add_session(
+            {"label": f"session-{i}", "info": {"ohifViewer": ohif_viewer}}
+        )
+        assignment = {
+            "project_id": reader_project.id,
+            "reader_id": "reader@flywheel.io",
+            "session_id": reader_session.id,
+            "status": "Assigned",
+        }
+        session_features = {
+            "case_coverage": 1,
+            "assignments": [assignment],
+            "assigned_count": 1,
+        }
+        sessions.append(
+            master_subject.add_session(
+                {"label": f"session-{i}", "info": {"session_features": session_features}}
+            )
+        )
+    stand_in.calls.clear()
+
+    return stand_in, master_project, sessions
+
+
+def test_malformed_length_marks_case_incomplete():
+    # The measurement is missing its handles
+    lengths = [
+        {
+            "location": "Supraspinatus - Tear",
+            "length": 4.2,
+            "imagePath": "st$$$se$$$se.2$$$0",
+            "seriesInstanceUid": "se",
+        }
+    ]
+    stand_in, _, (session,) = create_master_project(1, lengths)
+
+    (case_assignment_status,) = fill_reader_case_data(
+        ContainerCache(stand_in),
+        {"case_coverage": 1},
+        session,
+        tag_cache=SeriesTagCache(StandInWadoClient()),
+        export_lengths=True,
+    )
+
+    assert not case_assignment_status["completed"]
+    assert case_assignment_status["additionalNotes"].startswith("ERROR")
+    assert case_assignment_status["tear"] == "full"
+
+
+def test_gather_writes_each_session_once():
+    stand_in, master_project, sessions = create_master_project(3)
+
+    source_sessions_df, _ = gather_case_data_from_readers(
+        ContainerCache(stand_in), master_project
+    )
+
+    assert list(source_sessions_df.completed) == [1, 1, 1]
+    # A merged write to each session and its reader session, and the project
+    assert stand_in.calls["update_info"] == 7
+    # Sessions are loaded in a page, not reloaded one at a time
+    assert stand_in.calls["sessions.find"] == 1
+    for session in sessions:
+        (assignment,) = session.info["session_features"]["assignments"]
+        assert assignment["status"] == "Completed"
+
+    # Nothing has changed since, so nothing is written again
+    stand_in.calls.clear()
+    gather_case_data_from_readers(ContainerCache(stand_in), master_project)
+    assert stand_in.calls["update_info"] == 0
+
+
+def test_sessions_gathered_before_an_error_are_written(monkeypatch):
+    stand_in, master_project, sessions = create_master_project(3)
+    fill = manage_cases.fill_reader_case_data
+
+    def fail_on_last_session(fw_client, project_features, session, *args):
+        if session.id == sessions[-1].id:
+            raise RuntimeError("gather failed")
+        return fill(fw_client, project_features, session, *args)
+
+    monkeypatch.setattr(manage_cases, "fill_reader_case_data", fail_on_last_session)
+
+    with pytest.raises(RuntimeError):
+        gather_case_data_from_readers(ContainerCache(stand_in), master_project)
+
+    # The sessions gathered before the error and their reader sessions are written
+    assert stand_in.calls["update_info"] == 4
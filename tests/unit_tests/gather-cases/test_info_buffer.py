@@ -0,0 +1,120 @@
+import copy
+
+import pytest
+
+from gears.gather_cases.utils.container_cache import ContainerCache
+from gears.gather_cases.utils.info_buffer import InfoWriteBuffer, canonical_hash
+from tests.unit_tests.stand_in_client import StandInClient
+
+
+def create_sessions(n_sessions):
+    stand_in = StandInClient()
+    project = stand_in.add_group("master").add_project({"label": "Master Project"})
+    subject = project.add_subject({"code": "subject-1"})
+    sessions = [
+        subject.add_session({"label": f"session-{i}", "info": {"other": i}})
+        for i in range(n_sessions)
+    ]
+    stand_in.calls.clear()
+
+    return stand_in, ContainerCache(stand_in), sessions
+
+
+def test_writes_to_container_are_merged():
+    stand_in, fw_client, sessions = create_sessions(3)
+    info_buffer = InfoWriteBuffer(fw_client)
+
+    for session in sessions:
+        info_buffer.update_info(session, {"session_features": {"assigned_count": 1}})
+        info_buffer.update_info(session, {"ohifViewer": {"read": {}}})
+        info_buffer.update_info(session, {"session_features": {"assigned_count": 2}})
+
+    assert stand_in.calls["update_info"] == 0
+    assert len(info_buffer) == 3
+
+    assert info_buffer.flush() == 3
+
+    assert stand_in.calls["update_info"] == 3
+    assert info_buffer.saved_writes == 6
+    for i, session in enumerate(sessions):
+        assert session.info == {
+            "other": i,
+            "session_features": {"assigned_count": 2},
+            "ohifViewer": {"read": {}},
+        }
+
+
+def test_staged_writes_are_visible_before_flush():
+    stand_in, fw_client, sessions = create_sessions(1)
+    info_buffer = InfoWriteBuffer(fw_client)
+    session_features = {"assignments": ["a"]}
+
+    info_buffer.update_info(sessions[0], {"session_features": session_features})
+    # Later changes to the staged value are not written
+    session_features["assignments"].append("b")
+
+    assert sessions[0].info["session_features"] == {"assignments": ["a"]}
+
+    retrieved = copy.copy(sessions[0])
+    retrieved.info = {"other": 0}
+    info_buffer.apply_pending(retrieved)
+    assert retrieved.info["session_features"] == {"assignments": ["a"]}
+
+
+def test_flush_attempts_all_writes_before_raising():
+    stand_in, fw_client, sessions = create_sessions(4)
+    info_buffer = InfoWriteBuffer(fw_client, max_workers=2)
+
+    def fail(info):
+        raise RuntimeError("write failed")
+
+    sessions[1].update_info = fail
+    for session in sessions:
+        info_buffer.update_info(session, {"session_features": {}})
+
+    with pytest.raises(RuntimeError):
+        info_buffer.flush()
+
+    assert stand_in.calls["update_info"] == 3
+    assert info_buffer.performed_writes == 3
+    assert info_buffer.failed_writes == 1
+    assert len(info_buffer) == 0
+
+
+def test_canonical_hash_ignores_key_order():
+    assert canonical_hash({"a": 1, "b": [1, {"c": 2, "d": 3}]}) == canonical_hash(
+        {"b": [1, {"d": 3, "c": 2}], "a": 1}
+    )
+    assert canonical_hash({"a": 1}) != canonical_hash({"a": 2})
+
+
+def test_unchanged_info_is_not_written():
+    stand_in, fw_client, sessions = create_sessions(4)
+    for session in sessions:
+        session.info["session_features"] = {"assignments": [{"status": "Assigned"}]}
+    info_buffer = InfoWriteBuffer(fw_client)
+
+    for session in sessions:
+        info_buffer.track(session)
+        # Modified in place after it was loaded
+        session_features = session.info["session_features"]
+        if session is sessions[0]:
+            session_features["assignments"][0]["status"] = "Completed"
+        info_buffer.update_info(
+            session,
+            {"session_features": session_features, "other": session.info["other"]},
+        )
+
+    info_buffer.flush()
+
+    # Only the first session changed, and only its session_features are written
+    assert stand_in.calls["update_info"] == 1
+    assert info_buffer.performed_writes == 1
+    assert info_buffer.skipped_writes == 3
+
+    # Written values are recorded, writing them again is skipped
+    session_features = sessions[0].info["session_features"]
+    info_buffer.update_info(sessions[0], {"session_features": session_features})
+    info_buffer.flush()
+    assert stand_in.calls["update_info"] == 1
+    assert info_buffer.skipped_writes == 4
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from gears.gather_cases.utils.manage_cases import (
+    GEOMETRY_COLUMNS,
+    MissingDICOMTagError,
+    acquire_length_geometry,
+    create_ijk_to_WCS_matrix,
+    io_proxy_acquire_coords,
+)
+from gears.gather_cases.utils.series_tags import SeriesTagCache
+
+
+def create_instances(n_instances, study="st", series="se"):
+    return [
+        {
+            "00080018": {"Value": [f"{series}.{i}"]},
+            "0008103E": {"Value": ["COR PD"]},
+            "00200013": {"Value": [i]},
+            "00200032": {"Value": [-10.0, -20.0, 2.5 * (i - 1)]},
+            "00200037": {"Value": [1.0, 0.0, 0.0, 0.0, 1.0, 0.0]},
+            "00280030": {"Value": [0.5, 0.5]},
+        }
+        # Instances are not returned in order
+        for i in reversed(range(1, n_instances + 1))
+    ]
+
+
+class StandInWadoClient:
+    def __init__(self, instances):
+        self.instances = instances
+        self.request_count = 0
+
+    def get(self, project_id, study=None, series=None, instance=None):
+        self.request_count += 1
+        if isinstance(self.instances, dict):
+            return self.instances[series]
+        return self.instances
+
+
+def create_length(instance, start, end, series="se"):
+    return {
+        "location": "Supraspinatus - Tear",
+        "length": 4.2,
+        "imagePath": f"st$$${series}$$${instance}$$$0",
+        "handles": {
+            "start": {"x": start[0], "y": start[1]},
+            "end": {"x": end[0], "y": end[1]},
+        },
+    }
+
+
+def test_series_requested_once():
+    wado_client = StandInWadoClient(create_instances(20))
+    tag_cache = SeriesTagCache(wado_client)
+    lengths = [
+        create_length("se.3", (10, 20), (30, 40)),
+        create_length("se.7", (1, 2), (3, 4)),
+        create_length("se.3", (0, 0), (5, 5)),
+    ]
+
+    results = [
+        io_proxy_acquire_coords(None, "p1", length, tag_cache=tag_cache)
+        for length in lengths
+    ]
+
+    assert wado_client.request_count == 1
+    assert tag_cache.misses == 1
+    assert tag_cache.hits == 2
+
+    voxel_start, voxel_end, wcs_start, wcs_end, _, description = results[0]
+    assert description == "COR PD"
+    np.testing.assert_array_equal(voxel_start, [10, 20, 3])
+    np.testing.assert_array_equal(voxel_end, [30, 40, 3])
+    # Half-voxel, one-indexed offsets in LPS
+    np.testing.assert_allclose(wcs_start, [-10.0 + 0.5 * 8.5, -20.0 + 0.5 * 18.5, 3.75])
+    np.testing.assert_allclose(wcs_end, [-10.0 + 0.5 * 28.5, -20.0 + 0.5 * 38.5, 3.75])
+
+
+def test_missing_tags_raise():
+    instances = create_instances(5)
+    for instance in instances:
+        del instance["00280030"]
+    tag_cache = SeriesTagCache(StandInWadoClient(instances))
+
+    with pytest.raises(MissingDICOMTagError):
+        io_proxy_acquire_coords(
+            None, "p1", create_length("se.2", (0, 0), (1, 1)), tag_cache=tag_cache
+        )
+
+
+def test_geometry_of_measurements_in_series():
+    instances = create_instances(20, series="se")
+    oblique = create_instances(12, series="ob")
+    for i, instance in enumerate(oblique):
+        instance["00200037"]["Value"] = [0.0, 1.0, 0.0, 0.0, 0.0, -1.0]
+        instance["00200032"]["Value"] = [1.2 * i, 3.0, 4.0]
+    wado_client = StandInWadoClient({"se": instances, "ob": oblique})
+    tag_cache = SeriesTagCache(wado_client)
+    lengths = [
+        create_length("se.3", (10, 20), (30, 40)),
+        create_length("ob.5", (1, 2), (3, 4), series="ob"),
+        create_length("se.9", (0, 0), (5, 5)),
+    ]
+
+    geometry = acquire_length_geometry("p1", lengths, tag_cache)
+
+    assert list(geometry.columns) == GEOMETRY_COLUMNS
+    assert len(geometry) == 3
+    assert list(geometry["series"]) == ["se", "ob", "se"]
+    assert wado_client.request_count == 2
+
+    # Each row matches a single measurement transformed on its own
+    for length, (_, row) in zip(lengths, geometry.iterrows()):
+        voxel_start, voxel_end, wcs_start, wcs_end, matrix, _ = (
+            io_proxy_acquire_coords(None, "p1", length, tag_cache=tag_cache)
+        )
+        np.testing.assert_allclose(
+            row[["wcs_start_x", "wcs_start_y", "wcs_start_z"]].to_numpy(float),
+            wcs_start,
+        )
+        np.testing.assert_allclose(
+            row[["wcs_end_x", "wcs_end_y", "wcs_end_z"]].to_numpy(float), wcs_end
+        )
+        assert row["ijk_to_WCS"] == matrix
+
+        series_tags = tag_cache.get("p1", row["study"], row["series"])
+        n = series_tags.n_instances
+        ijk_WCS_matrix = create_ijk_to_WCS_matrix(
+            "LPS",
+            series_tags.instances[row["instance"]]["ImageOrientation"],
+            {j: series_tags.positions[j] for j in [1, 2, n]},
+            series_tags.instances[row["instance"]]["PixelSpacing"],
+        )
+        voxel = np.append(voxel_end - 1.5, 1.0)
+        np.testing.assert_allclose(np.matmul(ijk_WCS_matrix, voxel)[:3], wcs_end)
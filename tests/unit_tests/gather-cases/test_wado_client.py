@@ -0,0 +1,113 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from gears.gather_cases.utils.wado_client import WadoClient, WadoRequestError
+
+INSTANCES = [
+    {"00200013": {"Value": [1]}, "00080018": {"Value": ["1.2.3"]}, "flag": True},
+    {"00200013": {"Value": [2]}, "00080018": {"Value": ["1.2.4"]}, "flag": None},
+]
+
+
+class WadoStub(BaseHTTPRequestHandler):
+    """Serves INSTANCES after failing the first `failures` requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.client_address, dict(self.headers)))
+        if server.failures:
+            server.failures -= 1
+            status, body = 503, b"unavailable"
+        elif server.invalid:
+            status, body = 200, b"<html></html>"
+        else:
+            status, body = 200, json.dumps(INSTANCES).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = HTTPServer(("127.0.0.1", 0), WadoStub)
+    server.requests = []
+    server.failures = 0
+    server.invalid = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_client(server, **kwargs):
+    host, port = server.server_address
+    kwargs.setdefault("backoff_factor", 0)
+    return WadoClient(
+        f"http://{host}:{port}", "localhost:key", "scitran-user", **kwargs
+    )
+
+
+def test_url():
+    wado_client = WadoClient("https://my.flywheel.io/", "key", "scitran-user")
+
+    assert wado_client.url("p1") == (
+        "https://my.flywheel.io/io-proxy/wado/projects/p1"
+    )
+    assert wado_client.url("p1", "st", "se", "in") == (
+        "https://my.flywheel.io/io-proxy/wado/projects/p1"
+        "/studies/st/series/se/instances/in/tags"
+    )
+
+
+def test_json_response_is_decoded(server):
+    with create_client(server) as wado_client:
+        instances = wado_client.get("p1", "st", "se")
+
+    assert instances == INSTANCES
+    path, _, headers = server.requests[0]
+    assert path == "/io-proxy/wado/projects/p1/studies/st/series/se/instances"
+    assert headers["Authorization"] == "scitran-user localhost:key"
+
+
+def test_connections_are_reused(server):
+    with create_client(server) as wado_client:
+        for _ in range(3):
+            wado_client.get("p1", "st", "se")
+
+    assert len(server.requests) == 3
+    assert len({client_address for _, client_address, _ in server.requests}) == 1
+
+
+def test_unavailable_is_retried(server):
+    server.failures = 2
+    with create_client(server, retries=3) as wado_client:
+        assert wado_client.get("p1", "st", "se") == INSTANCES
+
+    assert len(server.requests) == 3
+
+
+def test_failure_after_retries_raises(server):
+    server.failures = 5
+    with create_client(server, retries=1) as wado_client:
+        with pytest.raises(WadoRequestError):
+            wado_client.get("p1", "st", "se")
+
+    assert len(server.requests) == 2
+
+
+def test_invalid_json_raises(server):
+    server.invalid = True
+    with create_client(server) as wado_client:
+        with pytest.raises(WadoRequestError):
+            wado_client.get("p1")
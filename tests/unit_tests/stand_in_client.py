@@ -0,0 +1,339 @@
+"""
+A local stand-in for the Flywheel client.
+
+This allows the container and file operations of the gears to be exercised without a
+connection to an active Flywheel instance. Every method that would make a round trip to
+the instance is counted in `StandInClient.calls`.
+"""
+import collections
+import copy
+import os
+import re
+import threading
+
+import bson
+import flywheel
+
+
+class StandInFinder:
+    """Minimal finder supporting the equality filters used by the gears."""
+
+    def __init__(self, client, name, items):
+        self._client = client
+        self._name = name
+        self._items = items
+
+    def _filter(self, filter_str):
+        items = self._items()
+        if not filter_str:
+            return items
+        for term in filter_str.split(","):
+            if "=~" in term:
+                key, pattern = term.split("=~", 1)
+                items = [x for x in items if re.match(pattern, str(x.get(key)))]
+            else:
+                key, value = term.split("=", 1)
+                key = "id" if key == "_id" else key
+                value = value.strip('"')
+                items = [x for x in items if str(x.get(key)) == value]
+        return items
+
+    def __call__(self):
+        self._client.record(f"{self._name}.find")
+        return self._items()
+
+    def find(self, filter_str=None, **kwargs):
+        self._client.record(f"{self._name}.find")
+        return self._filter(filter_str)
+
+    def find_first(self, filter_str=None, **kwargs):
+        self._client.record(f"{self._name}.find")
+        found = self._filter(filter_str)
+        return found[0] if found else None
+
+    def iter_find(self, filter_str=None, limit=250, **kwargs):
+        found = self._filter(filter_str)
+        for start in range(0, max(len(found), 1), limit):
+            self._client.record(f"{self._name}.find")
+            for item in found[start : start + limit]:
+                yield item
+
+
+class StandInFile:
+    def __init__(self, client, parent, name, contents=b"", **kwargs):
+        self._client = client
+        self.parent = parent
+        self.name = name
+        self.contents = contents
+        self.file_id = str(bson.ObjectId())
+        self.version = 1
+        self.hash = None
+        self.size = len(contents)
+        self.modality = kwargs.get("modality")
+        self.type = kwargs.get("type")
+        self.classification = kwargs.get("classification", {})
+        self.info = kwargs.get("info", {})
+
+    def download(self, dest_file):
+        self._client.record("download_file")
+        with open(dest_file, "wb") as fp:
+            fp.write(self.contents)
+
+    def read(self):
+        self._client.record("download_file")
+        return self.contents
+
+
+class StandInContainer:
+    container_type = None
+
+    def __init__(self, client, **fields):
+        self._client = client
+        self.id = str(bson.ObjectId())
+        self.label = None
+        self.info = {}
+        self.tags = []
+        self.files = []
+        self.parents = {}
+        self.permissions = []
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def reload(self):
+        self._client.record("get")
+        return self
+
+    def update_info(self, info):
+        self._client.record("update_info")
+        self.info.update(copy.deepcopy(info))
+
+    def add_tag(self, tag):
+        self._client.record("add_tag")
+        self.tags.append(tag)
+
+    def add_file(self, name, contents=b"", **kwargs):
+        fl = StandInFile(self._client, self, name, contents, **kwargs)
+        self.files.append(fl)
+        return fl
+
+    def get_file(self, name):
+        return next((fl for fl in self.files if fl.name == name), None)
+
+    def read_file(self, name):
+        return self.get_file(name).read()
+
+    def download_file(self, name, dest_file):
+        self.get_file(name).download(dest_file)
+
+    def upload_file(self, file, **kwargs):
+        self._client.record("upload_file")
+        if isinstance(file, str):
+            name = os.path.basename(file)
+            with open(file, "rb") as fp:
+                contents = fp.read()
+        else:
+            # A flywheel.FileSpec
+            name = file.name
+            contents = file.contents.read()
+        metadata = copy.deepcopy(kwargs.get("metadata") or {})
+        metadata.pop("name", None)
+        # Files may be uploaded to a container concurrently
+        with self._client.lock:
+            self.files = [fl for fl in self.files if fl.name != name]
+            self.add_file(name, contents, **metadata)
+        return [{"name": name, "size": len(contents), **metadata}]
+
+    def update_file(self, name, **kwargs):
+        self._client.record("update_file")
+        fl = self.get_file(name)
+        for key, value in kwargs.items():
+            setattr(fl, key, value)
+
+    def update_file_classification(self, name, classification):
+        self._client.record("update_file")
+        self.get_file(name).classification = classification
+
+    def update_file_info(self, name, info):
+        self._client.record("update_file")
+        self.get_file(name).info.update(info)
+
+    def _children(self, container_type):
+        return [
+            c
+            for c in self._client.containers.values()
+            if c.container_type == container_type
+            and c.parents.get(self.container_type) == self.id
+        ]
+
+    def _add_child(self, cls, metadata):
+        self._client.record(f"add_{cls.container_type}")
+        parents = dict(self.parents)
+        parents[self.container_type] = self.id
+        return self._client.add(cls(self._client, parents=parents, **metadata))
+
+
+class StandInGroup(StandInContainer):
+    container_type = "group"
+
+    def add_project(self, metadata):
+        return self._add_child(StandInProject, metadata)
+
+
+class StandInProject(StandInContainer):
+    container_type = "project"
+
+    @property
+    def group(self):
+        return self.parents["group"]
+
+    @property
+    def subjects(self):
+        return StandInFinder(self._client, "subjects", lambda: self._children("subject"))
+
+    def sessions(self):
+        self._client.record("sessions.find")
+        return self._children("session")
+
+    def add_subject(self, metadata):
+        # Subject codes are unique within a project
+        if any(s.code == metadata.get("code") for s in self._children("subject")):
+            self._client.record("add_subject")
+            raise flywheel.ApiException(status=409, reason="Conflict")
+        return self._add_child(StandInSubject, metadata)
+
+
+class StandInSubject(StandInContainer):
+    container_type = "subject"
+
+    def add_session(self, metadata):
+        return self._add_child(StandInSession, metadata)
+
+
+class StandInSession(StandInContainer):
+    container_type = "session"
+
+    @property
+    def project(self):
+        return self.parents["project"]
+
+    @property
+    def subject(self):
+        return self._client.containers[self.parents["subject"]]
+
+    def acquisitions(self):
+        self._client.record("acquisitions.find")
+        return self._children("acquisition")
+
+    def add_acquisition(self, metadata):
+        return self._add_child(StandInAcquisition, metadata)
+
+
+class StandInAcquisition(StandInContainer):
+    container_type = "acquisition"
+
+
+class StandInClient:
+    """
+    Stand-in for `flywheel.Client` holding an in-memory hierarchy of containers.
+
+    Attributes:
+        calls (collections.Counter): The number of round trips made per method
+        containers (dict): Every container on the stand-in instance, by id
+    """
+
+    def __init__(self):
+        self.calls = collections.Counter()
+        self.containers = {}
+        self.roles = []
+        self.lock = threading.Lock()
+
+    def record(self, method):
+        self.calls[method] += 1
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def add(self, container):
+        self.containers[container.id] = container
+        return container
+
+    def add_group(self, group_id, label=None):
+        return self.add(StandInGroup(self, id=group_id, label=label or group_id))
+
+    def get(self, container_id):
+        self.record("get")
+        if container_id not in self.containers:
+            raise flywheel.ApiException(status=404, reason="Not Found")
+        return self.containers[container_id]
+
+    get_group = get_project = get_subject = get_session = get_acquisition = get
+
+    def get_all_roles(self):
+        self.record("get_all_roles")
+        return self.roles
+
+    def _finder(self, name, container_type):
+        return StandInFinder(
+            self,
+            name,
+            lambda: [
+                c for c in self.containers.values() if c.container_type == container_type
+            ],
+        )
+
+    @property
+    def groups(self):
+        return self._finder("groups", "group")
+
+    @property
+    def projects(self):
+        return self._finder("projects", "project")
+
+    @property
+    def sessions(self):
+        return self._finder("sessions", "session")
+
+    def _delete(self, container_id):
+        self.record("delete")
+        self.containers.pop(container_id)
+
+    delete_acquisition = delete_session = delete_subject = _delete
+
+
+def create_source_session(fw_client, n_acquisitions=3, n_files=2):
+    """
+    Populate a stand-in client with a master project holding a single session.
+
+    Args:
+        fw_client (StandInClient): The stand-in client to populate
+        n_acquisitions (int, optional): Acquisitions in the session. Defaults to 3.
+        n_files (int, optional): Files in each acquisition. Defaults to 2.
+
+    Returns:
+        tuple: The source session and a destination (reader) project
+    """
+    group = fw_client.add_group("readers", "Readers")
+    master = group.add_project({"label": "Master Project"})
+    reader_project = group.add_project({"label": "Reader 1"})
+    subject = master.add_subject({"code": "subject-1", "label": "subject-1"})
+    session = subject.add_session({"label": "session-1", "tags": ["mri"]})
+    for i in range(n_acquisitions):
+        acquisition = session.add_acquisition(
+            {"label": f"acquisition-{i}", "tags": ["series"]}
+        )
+        for j in range(n_files):
+            acquisition.add_file(
+                f"file-{i}-{j}.dicom.zip",
+                os.urandom(64),
+                modality="MR",
+                type="dicom",
+                classification={"Intent": ["Structural"]},
+                info={"index": j},
+            )
+    fw_client.calls.clear()
+
+    return session, reader_project
@@ -0,0 +1,130 @@
+"""
+Each assign gear has its own container_operations. The exports, subject index, and
+cleanup of each copy are tested against the stand-in client.
+"""
+import importlib
+import threading
+
+import pytest
+
+from tests.unit_tests.stand_in_client import StandInClient, create_source_session
+
+GEARS = ["assign_batch_cases", "assign_cases", "assign_readers", "assign_single_case"]
+
+
+def gear_utils(gear):
+    container_cache = importlib.import_module(f"gears.{gear}.utils.container_cache")
+    container_operations = importlib.import_module(
+        f"gears.{gear}.utils.container_operations"
+    )
+    return container_cache.ContainerCache, container_operations
+
+
+def containers_of(stand_in, container_type, project):
+    return [
+        c
+        for c in stand_in.containers.values()
+        if c.container_type == container_type and c.parents["project"] == project.id
+    ]
+
+
+@pytest.mark.parametrize("gear", GEARS)
+def test_subject_is_created_once(gear):
+    ContainerCache, container_operations = gear_utils(gear)
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 1, 1)
+    fw_client = ContainerCache(stand_in)
+
+    _, first_export, created_container = container_operations.export_or_find_subject(
+        fw_client, source_session.subject, reader_project
+    )
+    _, second_export, _ = container_operations.export_or_find_subject(
+        fw_client, source_session.subject, reader_project
+    )
+
+    assert first_export["status"] == "created"
+    assert created_container["new"]
+    assert second_export["status"] == "used existing"
+    assert stand_in.calls["add_subject"] == 1
+    # The subjects of the project are listed once
+    assert stand_in.calls["subjects.find"] == 1
+
+
+@pytest.mark.parametrize("gear", GEARS)
+def test_session_is_exported_with_tags(gear):
+    ContainerCache, container_operations = gear_utils(gear)
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 2, 2)
+
+    dest_session, _, created_data = container_operations.export_session(
+        ContainerCache(stand_in), source_session, reader_project
+    )
+
+    assert dest_session.tags == ["mri"]
+    dest_acquisitions = containers_of(stand_in, "acquisition", reader_project)
+    assert [a.tags for a in dest_acquisitions] == [["series"], ["series"]]
+    assert stand_in.calls["add_tag"] == 0
+    assert [x["container"] for x in created_data] == ["subject", "session"] + [
+        "acquisition"
+    ] * 2
+
+
+@pytest.mark.parametrize("gear", GEARS)
+def test_failed_export_is_cleaned_up_and_reported(gear):
+    ContainerCache, container_operations = gear_utils(gear)
+    stand_in = StandInClient()
+    source_session, reader_project = create_source_session(stand_in, 2, 2)
+
+    def fail(*args):
+        raise RuntimeError("download failed")
+
+    failing_file = source_session.acquisitions()[1].files[1]
+    failing_file.download = fail
+    failing_file.read = fail
+    cleanup_report = container_operations.CleanupReport()
+
+    with pytest.raises(RuntimeError):
+        container_operations.export_session(
+            ContainerCache(stand_in),
+            source_session,
+            reader_project,
+            cleanup_report=cleanup_report,
+        )
+
+    for container_type in ["subject", "session", "acquisition"]:
+        assert not containers_of(stand_in, container_type, reader_project)
+    report_df = cleanup_report.report()
+    assert set(report_df.container) == {"subject", "session", "acquisition"}
+    assert set(report_df.status) == {"deleted"}
+
+
+@pytest.mark.parametrize("gear", ["assign_readers", "assign_single_case"])
+def test_queued_exports_are_cancelled_when_an_export_fails(gear, monkeypatch):
+    ContainerCache, container_operations = gear_utils(gear)
+    stand_in = StandInClient()
+    source_session, _ = create_source_session(stand_in, 3, 1)
+    release = threading.Event()
+    started = []
+
+    def export_acquisition(
+        fw_client, source_acquisition, dest_session, created_data, transfer_engine
+    ):
+        started.append(source_acquisition.label)
+        if source_acquisition.label == "acquisition-1":
+            raise RuntimeError("export failed")
+        # The first export is still running when the second fails
+        release.wait(5)
+        return None, {"label": source_acquisition.label}, None
+
+    monkeypatch.setattr(container_operations, "export_acquisition", export_acquisition)
+    acquisitions = source_session.acquisitions()
+    timer = threading.Timer(0.5, release.set)
+    timer.start()
+
+    with pytest.raises(RuntimeError):
+        container_operations._export_acquisitions(
+            ContainerCache(stand_in), acquisitions, None, [], max_workers=2
+        )
+    timer.cancel()
+
+    assert sorted(started) == ["acquisition-0", "acquisition-1"]
@@ -0,0 +1,37 @@
+"""
+Each gear ships its own copy of the utils it shares with the other gears. The copies of
+a shared module must be identical, so that a change to one is made to all of them.
+"""
+from pathlib import Path
+
+import pytest
+
+GEARS_ROOT = Path(__file__).parents[2] / "gears"
+
+# Modules copied unchanged into every gear that uses them
+SHARED_MODULES = [
+    "api_profiler.py",
+    "check_jobs.py",
+    "container_cache.py",
+    "export_journal.py",
+    "file_cache.py",
+    "info_buffer.py",
+    "reader_index.py",
+    "role_registry.py",
+    "session_loader.py",
+    "subject_index.py",
+    "transfer_engine.py",
+]
+
+
+@pytest.mark.parametrize("module", SHARED_MODULES)
+def test_shared_module_copies_are_identical(module):
+    copies = {
+        path.parents[1].name: path.read_bytes()
+        for path in sorted(GEARS_ROOT.glob(f"*/utils/{module}"))
+    }
+    assert len(copies) > 1
+
+    reference_gear, reference = next(iter(copies.items()))
+    differing = [gear for gear, contents in copies.items() if contents != reference]
+    assert not differing, f"{module} of {differing} differs from {reference_gear}"